@@ -23,8 +23,6 @@ Blend skin and color properties based on human ethnic values
 """
 
 import material
-import image
-import image_operations
 import numpy as np
 from getpath import getSysDataPath
 
@@ -41,9 +39,9 @@ class EthnicSkinBlender(object):
     """
     def __init__(self, human):
         self.human = human
-        self.skinCache = { 'caucasian' : image.Image(getSysDataPath('litspheres/skinmat_caucasian.png')),
-                           'african'   : image.Image(getSysDataPath('litspheres/skinmat_african.png')),
-                           'asian'     : image.Image(getSysDataPath('litspheres/skinmat_asian.png')) }
+        # The litsphere images are only loaded when a texture is requested,
+        # the diffuse color does not need them (e.g. when exporting headless)
+        self.skinCache = None
         self._previousEthnicState = [0, 0, 0]
 
         self._litsphereTexture = None
@@ -66,19 +64,28 @@ class EthnicSkinBlender(object):
 
     def getLitsphereTexture(self):
         self.checkUpdate()
+        if self._litsphereTexture is None:
+            self._litsphereTexture = self.blendLitsphereTexture()
         return self._litsphereTexture
 
     def getDiffuseColor(self):
         self.checkUpdate()
         return self._diffuseColor
 
-    def update(self):
+    def blendLitsphereTexture(self):
+        import image
+        import image_operations
+
+        if self.skinCache is None:
+            self.skinCache = { 'caucasian' : image.Image(getSysDataPath('litspheres/skinmat_caucasian.png')),
+                               'african'   : image.Image(getSysDataPath('litspheres/skinmat_african.png')),
+                               'asian'     : image.Image(getSysDataPath('litspheres/skinmat_asian.png')) }
+
         caucasianWeight = self.human.getCaucasian()
         africanWeight   = self.human.getAfrican()
         asianWeight     = self.human.getAsian()
         blends = []
 
-        # Set litsphere texture
         if caucasianWeight > 0:
             blends.append( ('caucasian', caucasianWeight) )
         if africanWeight > 0:
@@ -96,11 +103,18 @@ class EthnicSkinBlender(object):
 
         # Set parameter so the image can be referenced when material is written to file (and texture can be cached)
         img.sourcePath = getSysDataPath("litspheres/adaptive_skin_tone.png")
-        self._litsphereTexture = img
+        return img
+
+    def update(self):
+        caucasianWeight = self.human.getCaucasian()
+        africanWeight   = self.human.getAfrican()
+        asianWeight     = self.human.getAsian()
+
+        # Litsphere texture is blended again when next requested
+        self._litsphereTexture = None
 
         # Set diffuse color
         diffuse = asianWeight     * asianColor   + \
                   africanWeight   * africanColor + \
                   caucasianWeight * caucasianColor
         self._diffuseColor = material.Color(diffuse)
-
@@ -0,0 +1,441 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Loading MHM files and exporting the resulting humans without Qt or OpenGL,
+for generating large numbers of models in batch (see batch.py).
+
+The Engine class takes the role of the GUI application: it creates the
+basemesh and the modifiers of the modelling tabs, and registers the load
+handlers for the MHM properties that do not depend on the GUI (modifiers,
+measurements, skin material and skeleton). Exports use the same exporter
+modules, and exportutils.collect.setupMeshes(), as the export tab.
+Properties of libraries that are tied to the GUI (proxies, clothes, poses,
+expressions) are not loaded.
+
+processFiles() fans the jobs out over a pool of worker processes, each of
+which keeps a single human that is reused for all files it processes. The
+basemesh and the compiled targets are written once to a SharedStore, which
+the workers memory-map read-only, so that they share a single copy of this
+data instead of each loading their own.
+"""
+
+import os
+import sys
+import traceback
+import multiprocessing
+
+from core import G
+import files3d
+import algos3d
+import targets
+import human
+import humanmodifier
+import modifierfeatures
+import material
+from exportutils.config import Config
+from getpath import getSysDataPath, getSysPath, getPath, findFile
+import log
+
+# Exporter module and function per file format, relative to the plugins folder
+exporters = {
+    'obj': ('9_export_obj.mh2obj', 'exportObj'),
+    'dae': ('9_export_collada.mh2collada', 'exportCollada'),
+    'fbx': ('9_export_fbx.mh2fbx', 'exportFbx'),
+    'glb': ('9_export_gltf.mh2gltf', 'exportGltf'),
+    }
+
+# Config options per file format, the same as the defaults of the export tab
+exportOptions = {
+    'obj': dict(
+        useRelPaths = True,
+        useNormals = False),
+    'dae': dict(
+        useRelPaths = True,
+        useNormals = True,
+        expressions = False,
+        useCustomTargets = False,
+        useTPose = False,
+        yUpFaceZ = True,
+        yUpFaceX = False,
+        zUpFaceNegY = False,
+        zUpFaceX = False,
+        localY = True,
+        localX = False,
+        localG = False),
+    'fbx': dict(
+        useRelPaths = False,
+        expressions = False,
+        useCustomTargets = False,
+        useMaterials = True,
+        useTPose = False,
+        yUpFaceZ = True,
+        yUpFaceX = False,
+        zUpFaceNegY = False,
+        zUpFaceX = False,
+        localY = True,
+        localX = False,
+        localG = False),
+    'glb': dict(
+        scale = 0.1,
+        unit = "meter",
+        useRelPaths = True,
+        useNormals = True,
+        expressions = False,
+        useCustomTargets = False,
+        useTPose = False,
+        animations = True,
+        yUpFaceZ = True,
+        yUpFaceX = False,
+        zUpFaceNegY = False,
+        zUpFaceX = False,
+        localY = True,
+        localX = False,
+        localG = False),
+    }
+
+# Rig export options per file format
+rigExportOptions = {
+    'dae': dict(useExpressions = False, useTPose = False),
+    'fbx': dict(useExpressions = False, useTPose = False, useLeftRight = False),
+    'glb': dict(useExpressions = False, useTPose = False),
+    }
+
+class HeadlessApp(object):
+    """
+    Stand-in for the application object (G.app) when running without GUI.
+    Provides the load and save handler registry, settings and progress
+    reporting used by the human and the exporters.
+    """
+
+    def __init__(self):
+        self.selectedHuman = None
+        self.loadHandlers = {}
+        self.saveHandlers = []
+        self.settings = {
+            'units': 'metric',
+            'realtimeUpdates': False,
+            'realtimeNormalUpdates': False,
+            }
+
+    def addLoadHandler(self, keyword, handler):
+        self.loadHandlers[keyword] = handler
+
+    def addSaveHandler(self, handler, priority = None):
+        if priority is None:
+            self.saveHandlers.append(handler)
+        else:
+            self.saveHandlers.insert(priority, handler)
+
+    def progress(self, value, text = None):
+        if text is not None:
+            log.debug('%s (%d%%)', text, value * 100)
+
+    def redraw(self):
+        pass
+
+    def getLanguageString(self, string):
+        return string
+
+class SharedStore(object):
+    """
+    File-backed store of the basemesh arrays and the compiled targets, written
+    once by the process that starts a batch and memory-mapped read-only by
+    its worker processes.
+    When the compiled system target store (see compile_targets.py) exists, it
+    is file-backed already and used as is, only the basemesh is written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meshPath = os.path.join(path, 'base')
+        if self.hasSystemTargets():
+            self.targetsPath = getSysDataPath('targets')
+        else:
+            self.targetsPath = os.path.join(path, 'targets')
+
+    @staticmethod
+    def hasSystemTargets():
+        try:
+            algos3d.TargetStore(getSysDataPath('targets'))
+            return True
+        except Exception:
+            return False
+
+    def _getFiles(self):
+        files = ['%s.%s.npy' % (self.meshPath, name) for name in
+                 ('coord', 'vface', 'nfaces', 'texco', 'fvert', 'group', 'fgstr', 'fgidx')]
+        if self.targetsPath != getSysDataPath('targets'):
+            files += ['%s.index.npy' % self.targetsPath,
+                      '%s.vector.npy' % self.targetsPath,
+                      '%s.faces.npy' % self.targetsPath,
+                      '%s.table.npz' % self.targetsPath]
+        return files
+
+    def _getSources(self):
+        sources = [getSysDataPath("3dobjs/base.obj")]
+        if self.targetsPath != getSysDataPath('targets'):
+            sources += [t.path for t in targets.getTargets().targets]
+        return sources
+
+    def isUpToDate(self):
+        """
+        Whether the store exists and is newer than the basemesh and targets it
+        was written from.
+        """
+        files = self._getFiles()
+        if not all(os.path.isfile(path) for path in files):
+            return False
+        mtime = min(os.path.getmtime(path) for path in files)
+        return all(os.path.getmtime(path) < mtime for path in self._getSources())
+
+    def build(self):
+        """
+        Write the basemesh and, unless the system target store is used, all
+        targets to the store.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        log.message('Writing shared store to %s', self.path)
+        mesh = files3d.loadMesh(getSysDataPath("3dobjs/base.obj"), maxFaces = 5)
+        files3d.saveMappedMesh(mesh, self.meshPath)
+        if self.targetsPath != getSysDataPath('targets'):
+            algos3d.compileTargetStore(self.targetsPath, [t.path for t in targets.getTargets().targets], mesh)
+
+    def attach(self):
+        """
+        Use the targets of the store in this process, and return the basemesh,
+        with its constant arrays mapped from the store.
+        """
+        algos3d.useTargetStore(self.targetsPath)
+        return files3d.loadMappedMesh(getSysDataPath("3dobjs/base.obj"), self.meshPath, maxFaces = 5)
+
+class Engine(object):
+    """
+    A single human, with the modifiers of the modelling tabs attached, that
+    can be loaded from MHM files and exported without GUI.
+    With a SharedStore, the basemesh and targets are mapped from the store.
+    targetCacheSize limits the memory held by loaded targets, in MB (see the
+    targetCacheSize setting), 0 for no limit.
+    """
+
+    def __init__(self, useTargetMatrix = True, store = None, targetCacheSize = 0):
+        if G.app is None:
+            G.app = HeadlessApp()
+        self.app = G.app
+        self.app.settings['targetCacheSize'] = targetCacheSize
+        algos3d.setTargetBufferBudget(targetCacheSize * 1024 * 1024)
+
+        if store:
+            mesh = store.attach()
+        else:
+            mesh = files3d.loadMesh(getSysDataPath("3dobjs/base.obj"), maxFaces = 5)
+        self.human = human.Human(mesh)
+        self.human.useTargetMatrix = useTargetMatrix
+        self.app.selectedHuman = self.human
+
+        self.modifiers = {}
+        for group, features in modifierfeatures.groups:
+            modifiers = modifierfeatures.createModifiers(features)
+            for modifier in modifiers.itervalues():
+                modifier.setHuman(self.human)
+            self.modifiers[group] = modifiers
+            self.app.addLoadHandler(group, self.loadModifier)
+
+        # As set by the macro modelling tab
+        for race in ('African', 'Asian', 'Caucasian'):
+            self.modifiers['macro'][race]._defaultValue = 1.0/3
+
+        self.measureModifiers = {}
+        self.rigOptions = None
+
+        self.app.addLoadHandler('measure', self.loadMeasure)
+        self.app.addLoadHandler('skinMaterial', self.loadSkinMaterial)
+        self.app.addLoadHandler('skeleton', self.loadSkeleton)
+
+    def loadModifier(self, human, values):
+        if values[0] == 'status':
+            return
+
+        modifier = self.modifiers[values[0]].get(values[1], None)
+        if modifier:
+            modifier.setValue(float(values[2]))
+        else:
+            log.warning('Unknown %s modifier %s.', values[0], values[1])
+
+    def getMeasureModifier(self, name):
+        """
+        The modifier of the measurement tab for the measurement with the
+        specified name, created on first use.
+        """
+        if name not in self.measureModifiers:
+            measureDataPath = getSysDataPath("targets/measure/")
+            left = os.path.join(measureDataPath, "measure-%s-decrease.target" % name)
+            right = os.path.join(measureDataPath, "measure-%s-increase.target" % name)
+            if not os.path.isfile(left) or not os.path.isfile(right):
+                modifier = None
+            else:
+                modifier = humanmodifier.Modifier(left, right)
+                modifier.setHuman(self.human)
+            self.measureModifiers[name] = modifier
+        return self.measureModifiers[name]
+
+    def loadMeasure(self, human, values):
+        if values[0] == 'status':
+            return
+
+        modifier = self.getMeasureModifier(values[1])
+        if modifier:
+            modifier.setValue(float(values[2]))
+        else:
+            log.warning('Unknown measure modifier %s.', values[1])
+
+    def loadSkinMaterial(self, human, values):
+        if values[0] == 'status':
+            return
+
+        path = values[1]
+        if not os.path.isfile(path):
+            path = findFile(path, [getPath('data'), getSysDataPath()])
+        if not os.path.isfile(path):
+            log.warning('Could not find material %s for skinMaterial parameter.', values[1])
+            return
+        human.material = material.fromFile(path)
+
+    def loadSkeleton(self, human, values):
+        if values[0] == 'status':
+            if values[1] == 'started':
+                self.rigOptions = None
+            return
+
+        from armature.options import ArmatureOptions
+
+        path = findFile(values[1], [getPath('data/rigs'), getSysDataPath('rigs')])
+        if not os.path.isfile(path):
+            log.warning("Could not load rig %s, file does not exist.", values[1])
+            return
+        self.rigOptions = ArmatureOptions()
+        self.rigOptions.loadPreset(path, None)
+
+    def updateMacroModifiers(self):
+        """
+        Set the targets of all macro modifiers from the current macro
+        variables, as the modelling tabs do after loading a human.
+        """
+        for modifier in self.modifiers['macro'].itervalues():
+            modifier.setValue(modifier.getValue())
+
+    def load(self, filename):
+        """
+        Load the human from an MHM file and apply its targets.
+        """
+        self.human.load(filename, update=False)
+        self.updateMacroModifiers()
+        self.human.applyAllTargets(progressCallback=False)
+
+    def getConfig(self, format):
+        """
+        An export config for the specified file format, with the options of
+        the export tab at their defaults.
+        """
+        config = Config()
+        config.feetOnGround = True
+        for key, value in exportOptions[format].iteritems():
+            setattr(config, key, value)
+        if self.rigOptions and format in rigExportOptions:
+            config.rigOptions = self.rigOptions
+            config.rigOptions.setExportOptions(**rigExportOptions[format])
+        return config
+
+    def export(self, filepath, format = None):
+        """
+        Export the human to filepath, in the specified format (one of the
+        keys of exporters) or else the format matching the file extension.
+        """
+        if format is None:
+            format = os.path.splitext(filepath)[1][1:].lower()
+        if format not in exporters:
+            raise RuntimeError('Unsupported export format %s' % format)
+
+        moduleName, funcName = exporters[format]
+        pluginsPath = getSysPath('plugins')
+        if pluginsPath not in sys.path:
+            sys.path.append(pluginsPath)
+        module = __import__(moduleName, fromlist=[funcName])
+        getattr(module, funcName)(self.human, filepath, self.getConfig(format))
+
+    def process(self, mhmPath, filepath, format = None):
+        self.load(mhmPath)
+        self.export(filepath, format)
+
+
+_engine = None
+
+def _initWorker(useTargetMatrix, store = None, targetCacheSize = 0):
+    global _engine
+    _engine = Engine(useTargetMatrix, store, targetCacheSize)
+
+def _processJob(job):
+    mhmPath, filepath, format = job
+    try:
+        _engine.process(mhmPath, filepath, format)
+    except Exception:
+        log.error('Failed to process %s', mhmPath, exc_info=True)
+        return mhmPath, filepath, traceback.format_exc()
+    return mhmPath, filepath, None
+
+def processFiles(jobs, processes = None, useTargetMatrix = True, storePath = None, targetCacheSize = 0):
+    """
+    Load and export a list of jobs (MHM path, export path, format), with
+    format None to use the extension of the export path.
+    The jobs are distributed over a pool of processes (default one per
+    CPU), each with its own human. With processes = 1 the jobs run in the
+    calling process.
+    The pool shares the basemesh and targets through a SharedStore in the
+    folder storePath (default the cache folder of the user data path),
+    which is written first if it is missing or out of date, and reused by
+    later batches.
+    targetCacheSize limits the memory held by loaded targets in each process,
+    in MB, 0 for no limit.
+    Yields (MHM path, export path, error) per job as it finishes, error being
+    None on success and else the formatted exception.
+    """
+    if processes == 1:
+        _initWorker(useTargetMatrix, targetCacheSize = targetCacheSize)
+        for job in jobs:
+            yield _processJob(job)
+        return
+
+    if storePath is None:
+        storePath = getPath('cache/batch')
+    store = SharedStore(storePath)
+    if not store.isUpToDate():
+        store.build()
+
+    pool = multiprocessing.Pool(processes, _initWorker, (useTargetMatrix, store, targetCacheSize))
+    try:
+        for result in pool.imap_unordered(_processJob, jobs):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -76,6 +76,17 @@ class Human(guicommon.Object):
         self.targetsDetailStack = {}  # All details targets applied, with their values
         self.symmetryModeEnabled = False
 
+        # Optionally apply all targets at once as one sparse matrix product
+        self.useTargetMatrix = False
+        self._targetMatrix = algos3d.TargetMatrix(self.meshData)
+
+        # Target weights as currently applied to the mesh (None if unknown),
+        # used for applying only changed targets in applyChangedTargets()
+        self._appliedTargets = None
+        self._touchedTargets = set()
+        self._incrementalApplies = 0
+        self.maxIncrementalApplies = 100
+
         self.setDefaultValues()
 
         self.bodyZones = ['l-eye','r-eye', 'jaw', 'nose', 'mouth', 'head', 'neck', 'torso', 'hip', 'pelvis', 'r-upperarm', 'l-upperarm', 'r-lowerarm', 'l-lowerarm', 'l-hand',
@@ -880,20 +891,104 @@ class Human(guicommon.Object):
         if progressCallback:
             progressCallback(0.0)
 
-        # First call progressCalback (which often processes events) before resetting mesh
-        # so that mesh is not drawn in its reset state
-        algos3d.resetObj(self.meshData)
+        if self.useTargetMatrix:
+            # Reset mesh and apply all targets in one sparse matrix product
+            self._targetMatrix.apply(self.targetsDetailStack, update=False, calcNormals=False)
+            if progressCallback:
+                progressCallback(0.5)
+        else:
+            # First call progressCalback (which often processes events) before resetting mesh
+            # so that mesh is not drawn in its reset state
+            algos3d.resetObj(self.meshData)
+
+            progressVal = 0.0
+            progressIncr = 0.5 / (len(self.targetsDetailStack) + 1)
 
-        progressVal = 0.0
-        progressIncr = 0.5 / (len(self.targetsDetailStack) + 1)
+            for (targetPath, morphFactor) in self.targetsDetailStack.iteritems():
+                algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
 
-        for (targetPath, morphFactor) in self.targetsDetailStack.iteritems():
-            algos3d.loadTranslationTarget(self.meshData, targetPath, morphFactor, None, 0, 0)
+                progressVal += progressIncr
+                if progressCallback:
+                    progressCallback(progressVal)
 
-            progressVal += progressIncr
-            if progressCallback:
-                progressCallback(progressVal)
+        self._appliedTargets = dict(self.targetsDetailStack)
+        self._touchedTargets = set()
+        self._incrementalApplies = 0
+
+        self._updateAppliedTargets(progressCallback, update)
+
+    def applyChangedTargets(self, progressCallback=None, update=True):
+        """
+        This method applies only the targets whose weight changed since the
+        targets were last applied, by adding (newWeight - oldWeight) * target
+        to the mesh. Normals are only recalculated for the faces affected by
+        these targets.
+
+        Falls back to a full applyAllTargets() when the targets applied to the
+        mesh are unknown, and after maxIncrementalApplies incremental updates
+        to avoid accumulating floating point drift.
+        """
+        if self._appliedTargets is None or \
+           self._incrementalApplies >= self.maxIncrementalApplies:
+            self.applyAllTargets(progressCallback, update)
+            return
+
+        if progressCallback is None:
+            progressCallback = G.app.progress
+
+        if progressCallback:
+            progressCallback(0.0)
+
+        for targetPath in set(self._appliedTargets.keys() + self.targetsDetailStack.keys()):
+            old = self._appliedTargets.get(targetPath, 0.0)
+            new = self.targetsDetailStack.get(targetPath, 0.0)
+            if new != old:
+                algos3d.loadTranslationTarget(self.meshData, targetPath, new - old, None, 0, 0)
+                self._touchedTargets.add(targetPath)
+
+        self._appliedTargets = dict(self.targetsDetailStack)
+        self._incrementalApplies += 1
+
+        # Collect faces affected by all targets changed since the last normal
+        # update, and all vertices of those faces
+        vmask = np.zeros(self.meshData.getVertexCount(), dtype=bool)
+        for targetPath in self._touchedTargets:
+            vmask[algos3d.getTarget(self.meshData, targetPath).verts] = True
+        self._touchedTargets = set()
+        faces = self.meshData.getFacesForVertices(np.argwhere(vmask)[...,0])
+        verts = np.unique(self.meshData.fvert[faces])
+        del vmask
+
+        if progressCallback:
+            progressCallback(0.5)
+
+        self._updateAppliedTargets(progressCallback, update, verts, faces)
+
+    def setAppliedDetail(self, name, value):
+        """
+        Record that the target with specified path is applied to the mesh with
+        the given weight, after it was applied directly with
+        algos3d.loadTranslationTarget (eg. while dragging a slider).
+        """
+        if self._appliedTargets is None:
+            return
+        name = canonicalPath(name)
+        if value:
+            self._appliedTargets[name] = value
+        else:
+            self._appliedTargets.pop(name, None)
+        self._touchedTargets.add(name)
+
+    def invalidateAppliedTargets(self):
+        """
+        Notify that the mesh coordinates were changed by other means than
+        applying targets, so that the next applyChangedTargets() rebuilds the
+        mesh from scratch.
+        """
+        self._appliedTargets = None
+        self._touchedTargets = set()
 
+    def _updateAppliedTargets(self, progressCallback, update, vertsToUpdate=None, facesToUpdate=None):
 
         # Update all verts
         self.getSeedMesh().update()
@@ -908,7 +1003,8 @@ class Human(guicommon.Object):
             if update:
                 self.mesh.update()
         else:
-            self.meshData.calcNormals(1, 1)
+            if vertsToUpdate is None or len(vertsToUpdate):
+                self.meshData.calcNormals(1, 1, vertsToUpdate, facesToUpdate)
             if progressCallback:
                 progressCallback(0.8)
             if update:
@@ -984,6 +1080,7 @@ class Human(guicommon.Object):
                 targetVal = self.targetsDetailStack[target]
                 algos3d.loadTranslationTarget(self.meshData, target, -targetVal, None, 1, 0)
                 del self.targetsDetailStack[target]
+                self.setAppliedDetail(target, 0)
 
         # Apply symm target. For horiz movement the value must be inverted
 
@@ -998,6 +1095,7 @@ class Human(guicommon.Object):
                     targetSym = targetSym.replace('trans-out', 'trans-in')
                 algos3d.loadTranslationTarget(self.meshData, targetSym, targetSymVal, None, 1, 1)
                 self.targetsDetailStack[targetSym] = targetSymVal
+                self.setAppliedDetail(targetSym, targetSymVal)
 
         self.updateProxyMesh()
         if self.isSubdivided():
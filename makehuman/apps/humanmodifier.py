@@ -96,13 +96,13 @@ class DetailAction(guicommon.Action):
     def do(self):
         for (target, value) in self.after.iteritems():
             self.human.setDetail(target, value)
-        self.human.applyAllTargets(G.app.progress, update=self.update)
+        self.human.applyChangedTargets(G.app.progress, update=self.update)
         return True
 
     def undo(self):
         for (target, value) in self.before.iteritems():
             self.human.setDetail(target, value)
-        self.human.applyAllTargets()
+        self.human.applyChangedTargets()
         return True
 
 class ModifierAction(guicommon.Action):
@@ -116,13 +116,13 @@ class ModifierAction(guicommon.Action):
 
     def do(self):
         self.modifier.setValue(self.after)
-        self.human.applyAllTargets(G.app.progress)
+        self.human.applyChangedTargets(G.app.progress)
         self.postAction()
         return True
 
     def undo(self):
         self.modifier.setValue(self.before)
-        self.human.applyAllTargets(G.app.progress)
+        self.human.applyChangedTargets(G.app.progress)
         self.postAction()
         return True
 
@@ -155,10 +155,7 @@ class BaseModifier(object):
         return self.groupName+"/"+self.name
 
     def setValue(self, value, skipDependencies = False):
-        value = self.clampValue(value)
-        factors = self.getFactors(value)
-
-        tWeights = getTargetWeights(self.targets, factors, value)
+        tWeights = self.getTargetWeights(value)
         for tpath, tWeight in tWeights.items():
             self.human.setDetail(tpath, tWeight)
 
@@ -168,6 +165,16 @@ class BaseModifier(object):
         # Update dependent modifiers
         self.propagateUpdate(realtime = False)
 
+    def getTargetWeights(self, value):
+        """
+        The weights of the targets controlled by this modifier when it is set
+        to the specified value, as a dict mapping target paths to weights.
+        Does not change the human.
+        """
+        value = self.clampValue(value)
+        factors = self.getFactors(value)
+        return getTargetWeights(self.targets, factors, value)
+
     def propagateUpdate(self, realtime = False):
         """
         Propagate modifier update to dependent modifiers
@@ -226,6 +233,7 @@ class BaseModifier(object):
             if new == old:
                 continue
             algos3d.loadTranslationTarget(self.human.meshData, target[0], new - old, None, 0, 0)
+            self.human.setAppliedDetail(target[0], new)
 
         if skipUpdate:
             # Used for dependency updates (avoid dependency loops and double updates to human)
@@ -289,21 +297,16 @@ class Modifier(BaseModifier):
                 subp.append(component)
         return subp
 
-    def setValue(self, value, skipDependencies = False):
+    def clampValue(self, value):
+        return max(-1.0, min(1.0, value))
 
-        value = max(-1.0, min(1.0, value))
+    def getTargetWeights(self, value):
+        value = self.clampValue(value)
 
         left = -value if value < 0.0 else 0.0
         right = value if value > 0.0 else 0.0
 
-        self.human.setDetail(self.left, left)
-        self.human.setDetail(self.right, right)
-
-        if skipDependencies:
-            return
-
-        # Update dependent modifiers
-        self.propagateUpdate(realtime = False)
+        return {self.left: left, self.right: right}
 
     def getValue(self):
 
@@ -421,19 +424,10 @@ class GenericModifier(BaseModifier):
             value = max( 0.0, value)
         return value
 
-    def setValue(self, value, skipDependencies = False):
+    def getTargetWeights(self, value):
         value = self.clampValue(value)
         factors = self.getFactors(value)
-
-        tWeights = getTargetWeights(self.targets, factors)
-        for tpath, tWeight in tWeights.items():
-            self.human.setDetail(tpath, tWeight)
-
-        if skipDependencies:
-            return
-
-        # Update dependent modifiers
-        self.propagateUpdate(realtime = False)
+        return getTargetWeights(self.targets, factors)
 
     @staticmethod
     def parseTarget(target):
@@ -517,6 +511,8 @@ class MacroModifier(GenericModifier):
         self.getter = 'get' + self.variable
 
         self.targets = self.findTargets(self.groupName)
+        for target in self.targets:
+            algos3d.pinTarget(target[0])
 
         # log.debug('macro modifier %s.%s(%s): %s', base, name, variable, self.targets)
 
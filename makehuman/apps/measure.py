@@ -0,0 +1,379 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           Marc Flerackers
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Body measurements of the human basemesh, and a solver that finds modifier
+values matching a set of desired measurements.
+
+Measurements are given in cm. Apart from the measures defined by the Ruler,
+'height' refers to the height of the human as returned by Human.getHeightCm().
+"""
+
+__docformat__ = 'restructuredtext'
+
+import numpy as np
+
+import algos3d
+import humanmodifier
+import warpmodifier
+import log
+
+class Ruler:
+
+    """
+  This class contains ...
+  """
+
+    def __init__(self):
+
+    # these are tables of vertex indices for each body measurement of interest
+
+        self.Measures = {}
+        self.Measures['thighcirc'] = [11071,11080,11081,11086,11076,11077,11074,11075,11072,11073,11069,11070,11087,11085,11084,12994,11083,11082,11079,11071]
+        self.Measures['neckcirc'] = [7514,10358,7631,7496,7488,7489,7474,7475,7531,7537,7543,7549,7555,7561,7743,7722,856,1030,1051,850,844,838,832,826,820,756,755,770,769,777,929,3690,804,800,808,801,799,803,7513,7515,7521,7514]
+        self.Measures['neckheight'] = [853,854,855,856,857,858,1496,1491]
+        
+        self.Measures['upperarm']=[8383,8393,8392,8391,8390,8394,8395,8399,10455,10516,8396,8397,8398,8388,8387,8386,10431,8385,8384,8389]
+        self.Measures['wrist']=[10208,10211,10212,10216,10471,10533,10213,10214,10215,10205,10204,10203,10437,10202,10201,10206,10200,10210,10209,10208]
+        self.Measures['frontchest']=[1437,8125]
+        self.Measures['bust']=[8471,8439,8455,8462,8446,8478,8494,8557,8510,8526,8542,10720,10601,10603,10602,10612,10611,10610,10613,10604,10605,10606,3942,3941,3940,3950,3947,3948,3949,3938,3939,3937,4065,1870,1854,1838,1885,1822,1806,1774,1790,1783,1767,1799,]
+        self.Measures['napetowaist']=[1491,4181]
+        self.Measures['waisttohip']=[4121,4341]
+        self.Measures['shoulder'] = [7478,8274]
+        self.Measures['underbust'] = [4088,10750,10744,10724,10725,10748,10722,10640,10642,10641,10651,10650,10649,10652,10643,10644,10645,10646,10647,10648,3988,3987,3986,3985,3984,3983,3982,3992,3989,3990,3991,3980,3981,3979,4067,4098,4073,4072,4094,4100,4082,4088]
+        self.Measures['waist'] = [4121,10760,10757,10777,10776,10779,10780,10778,10781,10771,10773,10772,10775,10774,10814,10834,10816,10817,10818,10819,10820,10821,4181,4180,4179,4178,4177,4176,4175,4196,4173,4131,4132,4129,4130,4128,4138,4135,4137,4136,4133,4134,4108,4113,4118,4121]
+        self.Measures['upperlegheight'] = [10970,11230]
+        self.Measures['lowerlegheight'] = [11225,12820]
+        self.Measures['calf'] = [11339,11336,11353,11351,11350,13008,11349,11348,11345,11337,11344,11346,11347,11352,11342,11343,11340,11341,11338,11339]
+        self.Measures['ankle'] = [11460,11464,11458,11459,11419,11418,12958,12965,12960,12963,12961,12962,12964,12927,13028,12957,11463,11461,11457,11460]
+        self.Measures['upperarmlenght'] = [8274,10037]
+        self.Measures['lowerarmlenght'] = [10040,10548]
+        self.Measures['hips'] = [4341,10968,10969,10971,10970,10967,10928,10927,10925,10926,10923,10924,10868,10875,10861,10862,4228,4227,4226,4242,4234,4294,4293,4296,4295,4297,4298,4342,4345,4346,4344,4343,4361,4341]
+
+        self.compile()
+
+    def compile(self):
+        """
+        Concatenate the edges of all measures (pairs of consecutive vertices
+        of their vertex loops) into one pair of index arrays, with the edges
+        of each measure forming a consecutive segment. Needs to be called
+        again after changing Measures.
+        """
+        self.names = sorted(self.Measures.keys())
+        self._measureIdxs = dict((name, idx) for idx, name in enumerate(self.names))
+
+        loops = [np.asarray(self.Measures[name], dtype=np.uint32) for name in self.names]
+        self.edgeStart = np.concatenate([loop[:-1] for loop in loops])
+        self.edgeEnd = np.concatenate([loop[1:] for loop in loops])
+        edgeCounts = np.array([max(len(loop) - 1, 0) for loop in loops])
+        self.segmentOffsets = np.concatenate([[0], np.cumsum(edgeCounts)[:-1]])
+        self._emptySegments = edgeCounts == 0
+
+    def getEdges(self, measurementname):
+        """
+        The vertex index pairs of the edges of the specified measure, as two
+        arrays.
+        """
+        idx = self._measureIdxs[measurementname]
+        start = self.segmentOffsets[idx]
+        end = start + len(self.Measures[measurementname]) - 1
+        return self.edgeStart[start:end], self.edgeEnd[start:end]
+
+    def getMeasure(self, human, measurementname, mode):
+        coord = human.meshData.coord
+        start, end = self.getEdges(measurementname)
+        vecs = coord[end] - coord[start]
+        measure = np.sqrt(np.sum(vecs * vecs, axis=-1)).sum()
+
+        return float(measure) * self._unitScale(mode)
+
+    def getMeasures(self, human, mode):
+        """
+        All measures of the human, as a dict mapping measurement names to
+        values.
+        """
+        return dict(zip(self.names, self.measureCoords(human.meshData.coord, mode)))
+
+    def measureCoords(self, coords, mode = 'metric'):
+        """
+        Evaluate all measures (in the order of names) for coordinates of the
+        basemesh, in one gather, norm and segmented sum. Coords can be a stack
+        of coordinate arrays of shape (..., nVerts, 3), for example to measure
+        many models at once, the result then has shape (..., nMeasures).
+        """
+        vecs = coords[...,self.edgeEnd,:] - coords[...,self.edgeStart,:]
+        lengths = np.sqrt(np.sum(vecs * vecs, axis=-1))
+        measures = np.add.reduceat(lengths, self.segmentOffsets, axis=-1)
+        measures[...,self._emptySegments] = 0.0
+
+        return measures * self._unitScale(mode)
+
+    def _unitScale(self, mode):
+        if mode == 'metric':
+            return 10.0
+        else:
+            return 10.0 * 0.393700787
+
+
+class MeasurementSolver(object):
+    """
+    Finds the values of a set of modifiers for which the human attains a set
+    of desired measurements.
+
+    The morph of the human is linear in the weights of its targets, so the
+    solver only keeps the offsets of the targets controlled by the modifiers
+    for the vertices that are measured. Measurements for trial modifier
+    values are evaluated on these vertices alone, without applying the
+    targets to the whole mesh. The modifier values are found with a bounded
+    Gauss-Newton iteration (with Levenberg-Marquardt damping), starting from
+    the current modifier values.
+
+    Only modifiers whose target weights do not depend on other modifiers can
+    be solved for, which excludes macro modifiers and warp modifiers. The
+    values of all other modifiers stay as they are.
+    """
+
+    def __init__(self, human, modifiers, ruler = None):
+        for modifier in modifiers:
+            if isinstance(modifier, (humanmodifier.MacroModifier, warpmodifier.WarpModifier)):
+                raise RuntimeError("Cannot solve for the value of %s" % modifier.fullName)
+
+        self.human = human
+        self.modifiers = list(modifiers)
+        self.ruler = ruler or Ruler()
+
+        self.minValues = np.array([m.clampValue(-1e10) for m in self.modifiers])
+        self.maxValues = np.array([m.clampValue(1e10) for m in self.modifiers])
+
+        self._columns = {}
+        for modifier in self.modifiers:
+            for target in modifier.targets:
+                self._columns.setdefault(target[0], len(self._columns))
+
+        # Compiled per set of measurement names
+        self._measurements = None
+        self._verts = None
+        self._offsets = None
+
+    def getValues(self):
+        """
+        The current values of the modifiers, as an array.
+        """
+        return np.array([m.getValue() for m in self.modifiers], dtype=float)
+
+    def getWeightVector(self, values):
+        """
+        The weights of the targets controlled by the modifiers for the
+        specified modifier values, as a vector with one entry per target.
+        """
+        w = np.zeros(len(self._columns), dtype=float)
+        for modifier, value in zip(self.modifiers, values):
+            for tpath, weight in modifier.getTargetWeights(value).iteritems():
+                w[self._columns[tpath]] = weight
+        return w
+
+    def _compile(self, measurements):
+        """
+        Collect the vertices involved in the specified measurements, and the
+        offsets of the targets of the modifiers for these vertices.
+        """
+        if self._measurements == measurements:
+            return
+        mesh = self.human.meshData
+
+        verts = []
+        for name in measurements:
+            if name == 'height':
+                verts.append(mesh.getVerticesForFaceMask(self.human.getFaceMask()))
+            else:
+                verts.append(self.ruler.Measures[name])
+        self._verts = np.unique(np.concatenate(verts)).astype(np.uint32)
+
+        # Index of the measured vertices in self._verts
+        lookup = -np.ones(mesh.getVertexCount(), dtype=np.int32)
+        lookup[self._verts] = np.arange(len(self._verts))
+        self._edges = {}
+        for name in measurements:
+            if name == 'height':
+                continue
+            start, end = self.ruler.getEdges(name)
+            self._edges[name] = (lookup[start], lookup[end])
+
+        self._offsets = np.zeros((len(self._columns), len(self._verts), 3), dtype=np.float32)
+        for tpath, col in self._columns.iteritems():
+            target = algos3d.getTarget(mesh, tpath)
+            tVerts = lookup[target.verts]
+            measured = tVerts >= 0
+            self._offsets[col, tVerts[measured]] = target.data[measured]
+
+        self._measurements = list(measurements)
+
+    def _measure(self, coords):
+        """
+        Evaluate the measurements (in cm) on the measured vertex coordinates.
+        Returns the measurements and their gradients with respect to the
+        vertex coordinates.
+        """
+        measures = np.zeros(len(self._measurements), dtype=float)
+        gradients = np.zeros((len(self._measurements),) + coords.shape, dtype=float)
+        for idx, name in enumerate(self._measurements):
+            if name == 'height':
+                top = np.argmax(coords[:,1])
+                bottom = np.argmin(coords[:,1])
+                measures[idx] = 10 * (coords[top,1] - coords[bottom,1])
+                gradients[idx, top, 1] += 10
+                gradients[idx, bottom, 1] -= 10
+                continue
+
+            start, end = self._edges[name]
+            vecs = coords[end] - coords[start]
+            lengths = np.sqrt(np.sum(vecs * vecs, axis=-1))
+            measures[idx] = 10 * lengths.sum()
+
+            # Zero length edges do not contribute to the gradient
+            units = vecs / np.maximum(lengths, 1e-8)[:,None]
+            for axis in xrange(3):
+                gradients[idx,:,axis] += 10 * np.bincount(end, units[:,axis], minlength=len(coords))
+                gradients[idx,:,axis] -= 10 * np.bincount(start, units[:,axis], minlength=len(coords))
+        return measures, gradients
+
+    def getMeasures(self, measurements, values = None):
+        """
+        Evaluate the specified measurements (in cm) for the specified modifier
+        values, without changing the human. Uses the current modifier values
+        if values is None.
+        """
+        self._compile(measurements)
+        self._setBase()
+        if values is None:
+            values = self.getValues()
+        return dict(zip(measurements, self._measure(self._getCoords(values))[0]))
+
+    def _setBase(self):
+        """
+        Store the current target weights and measured vertex coordinates,
+        relative to which trial modifier values are evaluated. The human mesh
+        is assumed to be up to date with the current modifier values.
+        """
+        self._baseWeights = self.getWeightVector(self.getValues())
+        self._baseCoords = self.human.meshData.coord[self._verts].astype(float)
+
+    def _getCoords(self, values):
+        """
+        Coordinates of the measured vertices for the specified modifier
+        values.
+        """
+        dw = self.getWeightVector(values) - self._baseWeights
+        return self._baseCoords + np.tensordot(dw, self._offsets, axes=1)
+
+    def _getWeightDerivatives(self, values, step = 1e-3):
+        """
+        Derivatives of the target weights with respect to the modifier values,
+        as a (nTargets, nModifiers) array. Target weights are piecewise linear
+        in the modifier values, the derivatives are estimated with (central)
+        differences that stay within the modifier bounds.
+        """
+        result = np.zeros((len(self._columns), len(self.modifiers)), dtype=float)
+        for idx, modifier in enumerate(self.modifiers):
+            lower = max(values[idx] - step, self.minValues[idx])
+            upper = min(values[idx] + step, self.maxValues[idx])
+            lowerValues = values.copy()
+            lowerValues[idx] = lower
+            upperValues = values.copy()
+            upperValues[idx] = upper
+            result[:,idx] = (self.getWeightVector(upperValues) - self.getWeightVector(lowerValues)) / (upper - lower)
+        return result
+
+    def solve(self, goals, maxIterations = 20, tolerance = 0.05, weights = None):
+        """
+        Find modifier values that make the human match the desired
+        measurements in goals, a dict mapping measurement names to values in
+        cm, in the least squares sense. Residuals can be weighted with a dict
+        mapping measurement names to weights.
+        Iterates until all measurements are within tolerance (in cm) of their
+        goals, or until maxIterations is reached.
+        Returns a dict mapping modifier names to the values found. The human
+        is not changed, use apply() to set the values.
+        """
+        if not goals:
+            return dict((m.fullName, m.getValue()) for m in self.modifiers)
+        measurements = sorted(goals.keys())
+        self._compile(measurements)
+        self._setBase()
+
+        goalValues = np.array([goals[name] for name in measurements], dtype=float)
+        if weights:
+            residualWeights = np.array([weights.get(name, 1.0) for name in measurements], dtype=float)
+        else:
+            residualWeights = np.ones(len(measurements), dtype=float)
+
+        values = self.getValues()
+        measures, gradients = self._measure(self._getCoords(values))
+        residuals = goalValues - measures
+        cost = np.sum((residualWeights * residuals) ** 2)
+        damping = 1e-3
+
+        iterations = 0
+        while iterations < maxIterations and np.any(np.abs(residuals) >= tolerance):
+            iterations += 1
+
+            # Jacobian of the measurements with respect to the modifier values
+            jacobian = np.einsum('mvk,tvk->mt', gradients, self._offsets)
+            jacobian = np.dot(jacobian, self._getWeightDerivatives(values))
+            jacobian *= residualWeights[:,None]
+
+            jtj = np.dot(jacobian.T, jacobian)
+            jtr = np.dot(jacobian.T, residualWeights * residuals)
+            diagonal = np.diag(jtj).copy()
+            diagonal[diagonal == 0] = 1.0
+
+            # Increase damping until the step decreases the cost
+            while damping < 1e10:
+                step = np.linalg.solve(jtj + damping * np.diag(diagonal), jtr)
+                newValues = np.clip(values + step, self.minValues, self.maxValues)
+                newMeasures, newGradients = self._measure(self._getCoords(newValues))
+                newResiduals = goalValues - newMeasures
+                newCost = np.sum((residualWeights * newResiduals) ** 2)
+                if newCost < cost:
+                    damping = max(damping / 10, 1e-7)
+                    break
+                damping *= 10
+            else:
+                # Cannot improve any further
+                break
+
+            values = newValues
+            measures, gradients = newMeasures, newGradients
+            residuals, cost = newResiduals, newCost
+
+        log.debug("Solved %d measurements for %d modifiers in %d iterations, max. residual %.3f cm",
+                  len(measurements), len(self.modifiers), iterations, np.abs(residuals).max())
+
+        return dict((m.fullName, value) for m, value in zip(self.modifiers, values))
+
+    def apply(self, values, update = True):
+        """
+        Set the modifier values, as returned by solve(), and apply the changed
+        targets to the human.
+        """
+        for modifier in self.modifiers:
+            if modifier.fullName in values:
+                modifier.setValue(values[modifier.fullName])
+        self.human.applyChangedTargets(progressCallback = False, update = update)
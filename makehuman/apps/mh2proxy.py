@@ -29,10 +29,10 @@ import guicommon
 from core import G
 import getpath
 import log
-from collections import OrderedDict
 
 import material
 import io_json
+from vertexweights import VertexWeights
 
 
 #
@@ -52,90 +52,12 @@ for name in SimpleProxyTypes:
 #
 
 _A7converter = None
-Unit = np.array((1.0,1.0,1.0))
-
-#
-#   class ProxyRefVert:
-#
-
-class ProxyRefVert:
-
-    def __init__(self, parent):
-        self._parent = parent
-
-
-    def fromSingle(self, words, vnum, proxy):
-        self._exact = True
-        v0 = int(words[0])
-        self._verts = (v0,v0,v0)
-        self._weights = (1,0,0)
-        self._offset = np.array((0,0,0), float)
-        self.addProxyVertWeight(proxy, v0, vnum, 1)
-        return self
-
-
-    def fromTriple(self, words, vnum, proxy):
-        self._exact = False
-        v0 = int(words[0])
-        v1 = int(words[1])
-        v2 = int(words[2])
-        w0 = float(words[3])
-        w1 = float(words[4])
-        w2 = float(words[5])
-        if len(words) > 6:
-            d0 = float(words[6])
-            d1 = float(words[7])
-            d2 = float(words[8])
-        else:
-            (d0,d1,d2) = (0,0,0)
-
-        self._verts = (v0,v1,v2)
-        self._weights = (w0,w1,w2)
-        self._offset = np.array((d0,d1,d2), float)
-
-        self.addProxyVertWeight(proxy, v0, vnum, w0)
-        self.addProxyVertWeight(proxy, v1, vnum, w1)
-        self.addProxyVertWeight(proxy, v2, vnum, w2)
-        return self
-
-
-    def addProxyVertWeight(self, proxy, v, pv, w):
-        try:
-            proxy.vertWeights[v].append((pv, w))
-        except KeyError:
-            proxy.vertWeights[v] = [(pv,w)]
-        return
-
-    def getHumanVerts(self):
-        return self._verts
-
-    def getWeights(self):
-        return self._weights
-
-    def getOffset(self):
-        return self._offset
-
-    def getCoord(self, scale):
-        rv0,rv1,rv2 = self._verts
-        v0 = self._parent.coord[rv0]
-        v1 = self._parent.coord[rv1]
-        v2 = self._parent.coord[rv2]
-        w0,w1,w2 = self._weights
-        return (w0*v0 + w1*v1 + w2*v2 + scale*self._offset)
-
-    def getConvertedCoord(self, converter, scale):
-        rv0,rv1,rv2 = self._verts
-        v0 = converter.refVerts[rv0].getCoord(Unit)
-        v1 = converter.refVerts[rv1].getCoord(Unit)
-        v2 = converter.refVerts[rv2].getCoord(Unit)
-        w0,w1,w2 = self._weights
-        return (w0*v0 + w1*v1 + w2*v2 + scale*self._offset)
 
 #
 #    class Proxy
 #
 
-class Proxy:
+class Proxy(object):
     def __init__(self, file, type):
         log.debug("Loading proxy file: %s.", file)
         import makehuman
@@ -152,8 +74,12 @@ class Proxy:
         self.basemesh = makehuman.getBasemeshVersion()
         self.tags = []
 
-        self.vertWeights = {}       # (proxy-vert, weight) list for each parent vert
-        self.refVerts = []
+        # Binding of each proxy vertex to (up to) three basemesh vertices
+        self.ref_vIdxs = np.zeros((0,3), dtype=np.uint32)   # Basemesh vertex indices
+        self.ref_wts = np.zeros((0,3), dtype=np.float32)    # Weights of the basemesh vertices
+        self.offsets = np.zeros((0,3), dtype=np.float32)    # Offset, scaled with the proxy scale
+        self._convertedBinding = None
+        self._vertWeights = None
 
         self.scaleData = [None, None, None]
         self.scale = np.array((1.0,1.0,1.0), float)
@@ -200,6 +126,69 @@ class Proxy:
         return ("<Proxy %s %s %s %s>" % (self.name, self.type, self.file, self.uuid))
 
 
+    def setRefVerts(self, refVerts):
+        """
+        Set the binding of the proxy vertices to the basemesh from a list with
+        a (v0, v1, v2, w0, w1, w2, d0, d1, d2) tuple for each proxy vertex.
+        """
+        refVerts = np.asarray(refVerts, dtype=np.float64).reshape(-1, 9)
+        self.ref_vIdxs = refVerts[:,0:3].astype(np.uint32)
+        self.ref_wts = refVerts[:,3:6].astype(np.float32)
+        self.offsets = refVerts[:,6:9].astype(np.float32)
+        self._convertedBinding = None
+        self._vertWeights = None
+
+
+    @property
+    def vertWeights(self):
+        """
+        (proxy-vert, weight) list for each parent vert.
+        """
+        if self._vertWeights is None:
+            self._vertWeights = {}
+            pverts = np.repeat(np.arange(len(self.ref_vIdxs)), 3).tolist()
+            for v, pv, w in zip(self.ref_vIdxs.ravel().tolist(), pverts, self.ref_wts.ravel().tolist()):
+                if w:
+                    try:
+                        self._vertWeights[v].append((pv, w))
+                    except KeyError:
+                        self._vertWeights[v] = [(pv, w)]
+        return self._vertWeights
+
+
+    def getRefCoords(self, coord, indices = None):
+        """
+        Coordinates of (a subset of) the proxy vertices, bound to basemesh
+        coordinates coord, without scaling the offsets.
+        """
+        if indices is None:
+            indices = np.s_[...]
+        ref_vIdxs = self.ref_vIdxs[indices]
+        ref_wts = self.ref_wts[indices]
+        return (coord[ref_vIdxs] * ref_wts[...,None]).sum(axis=-2) + self.offsets[indices]
+
+
+    def getBinding(self):
+        """
+        Returns the (ref_vIdxs, ref_wts, constant) binding of the proxy
+        vertices directly to the basemesh. For proxies made for an older
+        basemesh, the converter binding is composed with the proxy binding,
+        so that each proxy vertex refers to nine basemesh vertices, and the
+        unscaled converter offsets end up in constant (None otherwise).
+        """
+        converter = self.getConverter()
+        if not converter:
+            return self.ref_vIdxs, self.ref_wts, None
+
+        if self._convertedBinding is None:
+            nVerts = len(self.ref_vIdxs)
+            ref_vIdxs = converter.ref_vIdxs[self.ref_vIdxs]
+            ref_wts = self.ref_wts[:,:,None] * converter.ref_wts[self.ref_vIdxs]
+            constant = (self.ref_wts[:,:,None] * converter.offsets[self.ref_vIdxs]).sum(axis=1)
+            self._convertedBinding = (ref_vIdxs.reshape(nVerts, 9), ref_wts.reshape(nVerts, 9), constant)
+        return self._convertedBinding
+
+
     def getSeedMesh(self):
         human = G.app.selectedHuman
         for proxy,obj in human.getProxiesAndObjects():
@@ -263,11 +252,12 @@ class Proxy:
             self.scale[n] = self.getScale(self.scaleData[n], obj, n)
         self.uniformizeScale()
 
-        converter = self.getConverter()
-        if converter:
-            return [refVert.getConvertedCoord(converter, self.scale) for refVert in self.refVerts]
-        else:
-            return [refVert.getCoord(self.scale) for refVert in self.refVerts]
+        ref_vIdxs, ref_wts, constant = self.getBinding()
+        coord = (obj.coord[ref_vIdxs] * ref_wts[...,None]).sum(axis=1)
+        coord += self.scale.astype(np.float32) * self.offsets
+        if constant is not None:
+            coord += constant
+        return coord
 
 
     def update(self, obj):
@@ -305,8 +295,7 @@ class Proxy:
 
         converter = self.getConverter()
         if converter:
-            co1 = converter.refVerts[vn1].getCoord(Unit)
-            co2 = converter.refVerts[vn2].getCoord(Unit)
+            co1, co2 = converter.getRefCoords(obj.coord, [vn1, vn2])
         else:
             co1 = obj.coord[vn1]
             co2 = obj.coord[vn2]
@@ -317,7 +306,7 @@ class Proxy:
 
     def getWeights(self, rawWeights, amt=None):
         if amt and self.vertexGroups:
-            weights = OrderedDict()
+            weights = VertexWeights()
             for name,data in self.vertexGroups:
                 for bone in amt.bones.values():
                     if bone.origName == name:
@@ -340,43 +329,9 @@ class Proxy:
 
 
     def getWeights1(self, rawWeights):
-        weights = OrderedDict()
         if not rawWeights:
-            return weights
-
-        for key in rawWeights.keys():
-            vgroup = []
-            empty = True
-            for (v,wt) in rawWeights[key]:
-                try:
-                    vlist = self.vertWeights[v]
-                except KeyError:
-                    vlist = []
-                for (pv, w) in vlist:
-                    pw = w*wt
-                    if (pw > 1e-4):
-                        vgroup.append((pv, pw))
-                        empty = False
-            if not empty:
-                weights[key] = self.fixVertexGroup(vgroup)
-        return weights
-
-
-    def fixVertexGroup(self, vgroup):
-        fixedVGroup = []
-        vgroup.sort()
-        pv = -1
-        while vgroup:
-            (pv0, wt0) = vgroup.pop()
-            if pv0 == pv:
-                wt += wt0
-            else:
-                if pv >= 0 and wt > 1e-4:
-                    fixedVGroup.append((pv, wt))
-                (pv, wt) = (pv0, wt0)
-        if pv >= 0 and wt > 1e-4:
-            fixedVGroup.append((pv, wt))
-        return fixedVGroup
+            return VertexWeights()
+        return VertexWeights(rawWeights).transferred(self.ref_vIdxs, self.ref_wts, 1e-4)
 
 
     def getShapes(self, rawShapes, scale):
@@ -418,16 +373,127 @@ doRefVerts = 1
 doWeights = 2
 doDeleteVerts = 3
 
+BINARY_PROXY_VERSION = 1
+
 def readProxyFile(obj, filepath, type="Clothes"):
+    """
+    Load a proxy file (.mhclo or .proxy). A compiled .mhpxy file next to it
+    is used instead of parsing the text file, unless it is out of date.
+    Compiled proxies are only written to the user data path.
+    """
+    mhpxyPath = os.path.splitext(filepath)[0] + '.mhpxy'
+    try:
+        if not os.path.isfile(mhpxyPath):
+            log.debug('compiled proxy missing: %s', mhpxyPath)
+            raise RuntimeError()
+        if os.path.isfile(filepath) and os.path.getmtime(filepath) > os.path.getmtime(mhpxyPath):
+            log.message('compiled proxy out of date: %s', mhpxyPath)
+            raise RuntimeError()
+        return loadBinaryProxy(obj, filepath, mhpxyPath, type)
+    except:
+        result = loadTextProxy(obj, filepath, type)
+        if result is None:
+            return None
+        proxy, header = result
+        if getpath.isSubPath(mhpxyPath, getpath.getPath('')):
+            try:
+                saveBinaryProxy(proxy, header, mhpxyPath)
+            except StandardError:
+                log.notice('unable to save compiled proxy: %s', mhpxyPath, exc_info=True)
+        else:
+            log.debug('Not writing compiled proxies to system paths (%s).', mhpxyPath)
+        return proxy
+
+
+def loadTextProxy(obj, filepath, type="Clothes"):
+    """
+    Parse a proxy text file. Returns the proxy and the lines of the file
+    holding its metadata, or None if the file cannot be read.
+    """
     try:
         fp = open(filepath, "rU")
     except IOError:
         log.error("*** Cannot open %s", filepath)
         return None
 
-    folder = os.path.realpath(os.path.expanduser(os.path.dirname(filepath)))
+    proxy = Proxy(filepath, type)
+    try:
+        header = _readProxyLines(obj, proxy, fp)
+    finally:
+        fp.close()
+    return proxy, header
+
+
+def loadBinaryProxy(obj, filepath, mhpxyPath, type="Clothes"):
+    """
+    Load a compiled proxy. The metadata lines are parsed again, so that file
+    references are resolved relative to the current location of the proxy;
+    vertex bindings, vertex group weights and deleted vertices are read from
+    arrays.
+    """
+    log.debug("Loading compiled proxy %s.", mhpxyPath)
+    npzfile = np.load(mhpxyPath)
+    if int(npzfile['version']) != BINARY_PROXY_VERSION:
+        raise RuntimeError('Compiled proxy %s has an unsupported version.' % mhpxyPath)
 
     proxy = Proxy(filepath, type)
+    _readProxyLines(obj, proxy, npzfile['header'].tolist())
+
+    proxy.ref_vIdxs = npzfile['ref_vIdxs']
+    proxy.ref_wts = npzfile['ref_wts']
+    proxy.offsets = npzfile['offsets']
+
+    proxy.deleteVerts[npzfile['deleteVerts']] = True
+
+    wOffsets = npzfile['weightOffsets'].tolist()
+    wVerts = npzfile['weightVerts'].tolist()
+    wValues = npzfile['weightValues'].tolist()
+    for idx, name in enumerate(npzfile['weightGroups'].tolist()):
+        start, end = wOffsets[idx], wOffsets[idx+1]
+        proxy.weights[name] = zip(wVerts[start:end], wValues[start:end])
+
+    return proxy
+
+
+def saveBinaryProxy(proxy, header, mhpxyPath):
+    """
+    Write a compiled proxy, holding the metadata lines of the proxy file
+    and the parsed data arrays.
+    """
+    weightGroups = []
+    weights = []
+    wOffsets = [0]
+    if proxy.weights:
+        for name, groupWeights in proxy.weights.items():
+            weightGroups.append(name)
+            weights.extend(groupWeights)
+            wOffsets.append(len(weights))
+    if weights:
+        wVerts, wValues = zip(*weights)
+    else:
+        wVerts, wValues = [], []
+
+    with open(mhpxyPath, 'wb') as f:
+        np.savez(f,
+            version = np.array(BINARY_PROXY_VERSION, dtype=np.int32),
+            header = np.array(header, dtype=str),
+            ref_vIdxs = proxy.ref_vIdxs,
+            ref_wts = proxy.ref_wts,
+            offsets = proxy.offsets,
+            deleteVerts = np.flatnonzero(proxy.deleteVerts).astype(np.uint32),
+            weightGroups = np.array(weightGroups, dtype=str),
+            weightOffsets = np.array(wOffsets, dtype=np.uint32),
+            weightVerts = np.array(wVerts, dtype=np.uint32),
+            weightValues = np.array(wValues, dtype=np.float64))
+
+
+def _readProxyLines(obj, proxy, lines):
+    """
+    Parse the lines of a proxy file into proxy. Returns the lines that do
+    not belong to the verts, weights and delete_verts data sections.
+    """
+    folder = os.path.realpath(os.path.expanduser(os.path.dirname(proxy.file)))
+
     proxy.deleteVerts = np.zeros(len(obj.coord), bool)
 
     proxy.z_depth = -1
@@ -435,8 +501,9 @@ def readProxyFile(obj, filepath, type="Clothes"):
     proxy.useProjection = True
     proxy.ignoreOffset = False
     status = 0
-    vnum = 0
-    for line in fp:
+    refVerts = []
+    header = []
+    for line in lines:
         words = line.split()
 
         if len(words) == 0:
@@ -584,18 +651,20 @@ def readProxyFile(obj, filepath, type="Clothes"):
 
 
         elif status == doRefVerts:
-            refVert = ProxyRefVert(obj)
-            proxy.refVerts.append(refVert)
             if len(words) == 1:
-                refVert.fromSingle(words, vnum, proxy)
+                v0 = int(words[0])
+                refVerts.append((v0,v0,v0, 1,0,0, 0,0,0))
+            elif len(words) > 6:
+                refVerts.append(words[:9])
             else:
-                refVert.fromTriple(words, vnum, proxy)
-            vnum += 1
+                refVerts.append(words[:6] + ['0','0','0'])
+            continue
 
         elif status == doWeights:
             v = int(words[0])
             w = float(words[1])
             weights.append((v,w))
+            continue
 
         elif status == doDeleteVerts:
             sequence = False
@@ -611,15 +680,21 @@ def readProxyFile(obj, filepath, type="Clothes"):
                     else:
                         proxy.deleteVerts[v1] = True
                     v0 = v1
+            continue
 
         else:
-            log.warning('Unknown keyword %s found in proxy file %s', key, filepath)
+            log.warning('Unknown keyword %s found in proxy file %s', key, proxy.file)
+            continue
+
+        header.append(line)
+
+    proxy.setRefVerts(refVerts)
 
     if proxy.z_depth == -1:
-        log.warning('Proxy file %s does not specify a Z depth. Using 50.', filepath)
+        log.warning('Proxy file %s does not specify a Z depth. Using 50.', proxy.file)
         proxy.z_depth = 50
 
-    return proxy
+    return header
 
 
 def getFileName(folder, file, suffix):
@@ -72,6 +72,7 @@ class Storage:
             obj.calcNormals()
             obj.update()
             self.coord = None
+            human.invalidateAppliedTargets()
             #debugCoords("restore1")
 
         if self.baseDetails is not None:
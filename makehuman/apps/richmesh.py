@@ -29,7 +29,8 @@ from collections import OrderedDict
 import numpy as np
 import log
 import module3d
-import gui3d
+from core import G
+from vertexweights import VertexWeights
 
 from material import Material, Color
 
@@ -74,7 +75,7 @@ class RichMesh(object):
 
 
     def setVertexGroups(self, weights):
-        self.weights = weights
+        self.weights = VertexWeights(weights)
         self.normalizeVertexWeights()
         self.vertexGroups = OrderedDict()
         for index,name in enumerate(weights):
@@ -159,7 +160,7 @@ class RichMesh(object):
 
     def getMaterial(self):
         if self.type == 'Proxymeshes':
-            return gui3d.app.selectedHuman.material
+            return G.app.selectedHuman.material
         elif self.object:
             return self.object.material
         else:
@@ -174,9 +175,9 @@ class RichMesh(object):
 
 
     def fromData(self, coords, texVerts, faceVerts, faceUvs, weights, shapes, material):
-        for fv in faceVerts:
-            if len(fv) != 4:
-                raise NameError("Mesh %s has non-quad faces and can not be handled by MakeHuman" % self.name)
+        faceVerts = np.asarray(faceVerts)
+        if faceVerts.ndim != 2 or faceVerts.shape[1] != 4:
+            raise NameError("Mesh %s has non-quad faces and can not be handled by MakeHuman" % self.name)
 
         obj = self.object = module3d.Object3D(self.name)
         obj.setCoords(coords)
@@ -205,24 +206,7 @@ class RichMesh(object):
         if not self.weights:
             return
 
-        nverts = len(self.object.coord)
-        sums = np.zeros(nverts, float)
-        for group in self.weights.values():
-            for vn,w in group:
-                sums[vn] += w
-
-        factors = np.zeros(nverts, float)
-        for vn in range(nverts):
-            if sums[vn] > 0.1:
-                factors[vn] = 1.0/sums[vn]
-
-        normWeights = {}
-        for gname,group in self.weights.items():
-            normGroup = normWeights[gname] = []
-            for vn,w in group:
-                normGroup.append((vn,w*factors[vn]))
-
-        self.weights = normWeights
+        self.weights = self.weights.normalized(len(self.object.coord), 0.1)
 
 
     def rescale(self, scale):
@@ -233,6 +217,7 @@ class RichMesh(object):
         newobj.setCoords(scale*obj.coord)
         newobj.setUVs(obj.texco)
         newobj.setFaces(obj.fvert, obj.fuvs)
+        newobj.material = obj.material
         self.object = newobj
         self.object.calcNormals(True, True)
         self.object.update()
@@ -272,8 +257,7 @@ class VertexGroup:
     def __init__(self, name, index, weights):
         self.name = name
         self.index = index
-        self.verts = [data[0] for data in weights]
-        self.weights = [data[1] for data in weights]
+        self.verts, self.weights = weights
 
     def __repr__(self):
         return ("<VertexGroup %s %d %d>" % (self.name, self.index, len(self.verts)))
@@ -55,7 +55,7 @@ class WarpTarget(algos3d.Target):
         self.verts = vertIndices
         self.data = vertData
 
-        self.faces = self.human.meshData.getFacesForVertices(self.verts)
+        self._obj = self.human.meshData
 
     def apply(self, obj, morphFactor, faceGroupToUpdateName=None, update=1, calcNorm=1, scale=[1.0,1.0,1.0]):
         super(WarpTarget, self).apply(obj, morphFactor, faceGroupToUpdateName, update, calcNorm, scale)
@@ -169,6 +169,8 @@ class WarpModifier (humanmodifier.UniversalModifier):
         #    return
 
         target = self.compileWarpTarget()
+        # Warp targets cannot be loaded again, so they must not be evicted
+        algos3d.pinTarget(self.fullName)
         algos3d._targetBuffer[canonicalPath(self.fullName)] = target    # TODO remove direct use of the target buffer?
         self.human.hasWarpTargets = True
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Standalone script to load MHM files and export them, without starting the GUI
+(see apps/headless.py). Run from the makehuman folder:
+
+    python batch.py [-f obj|dae|fbx|glb] [-o folder] [-j processes] [-s folder] [-c MB] file.mhm ...
+
+Each MHM file is exported to a file with the same name in the output folder.
+"""
+
+import sys
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+import os
+import time
+import argparse
+
+import headless
+
+def main():
+    parser = argparse.ArgumentParser(description="Export MHM files without GUI.")
+    parser.add_argument('files', metavar='file.mhm', nargs='+', help="MHM files to export")
+    parser.add_argument('-f', '--format', choices=sorted(headless.exporters.keys()), default='obj',
+                        help="export file format (default obj)")
+    parser.add_argument('-o', '--output', default='.', help="output folder (default current folder)")
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="number of worker processes (default one per CPU)")
+    parser.add_argument('-s', '--store', default=None,
+                        help="folder of the basemesh and targets shared by the worker processes"
+                             " (default the cache folder of the user data path)")
+    parser.add_argument('-c', '--target-cache', type=int, default=0,
+                        help="memory limit for loaded targets per process, in MB (default 0, no limit)")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+
+    jobs = []
+    for path in args.files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        jobs.append((os.path.abspath(path),
+                     os.path.abspath(os.path.join(args.output, '%s.%s' % (name, args.format))),
+                     args.format))
+
+    start = time.time()
+    failed = 0
+    for mhmPath, filepath, error in headless.processFiles(jobs, args.processes, storePath=args.store,
+                                                             targetCacheSize=args.target_cache):
+        if error:
+            failed += 1
+            print "FAILED %s\n%s" % (mhmPath, error)
+        else:
+            print "%s -> %s" % (mhmPath, filepath)
+
+    print "Exported %d of %d files in %.1f s" % (len(jobs) - failed, len(jobs), time.time() - start)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
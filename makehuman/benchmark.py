@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Standalone script to benchmark alternative implementations of performance
+critical algorithms against each other, without starting the GUI.
+Run from the makehuman folder:
+
+    python benchmark.py [benchmark ...]
+
+When no benchmark names are given, all benchmarks are run.
+"""
+
+import sys
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+import time
+import numpy as np
+import files3d
+import algos3d
+import targets
+import skeleton
+import bvh
+import transformations as tm
+from getpath import getSysDataPath
+
+_basemesh = None
+
+def getBaseMesh():
+    global _basemesh
+    if _basemesh is None:
+        _basemesh = files3d.loadMesh(getSysDataPath('3dobjs/base.obj'), maxFaces = 5)
+    return _basemesh
+
+def timeFunction(func, repeat):
+    """
+    Returns the best wall clock time of repeat calls to func, in seconds.
+    """
+    best = None
+    for i in xrange(repeat):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def report(name, times, fps = False):
+    reference = times[0][1]
+    print name
+    for label, elapsed in times:
+        if fps:
+            print "    %-24s %9.2f ms  %7.1f fps  (%.1fx)" % (label, elapsed * 1000, 1.0 / elapsed, reference / elapsed)
+        else:
+            print "    %-24s %9.2f ms  (%.1fx)" % (label, elapsed * 1000, reference / elapsed)
+
+def benchmarkTargets(repeat=10):
+    """
+    Applying all targets of a model: one scatter-add per target, as done by
+    Human.applyAllTargets, versus a single algos3d.TargetMatrix product.
+    """
+    obj = getBaseMesh()
+
+    paths = [t.path for t in targets.getTargets().targets]
+    weights = dict(zip(paths, np.random.uniform(0.0, 1.0, len(paths))))
+    for path in paths:
+        algos3d.getTarget(obj, path)
+    weights = dict((path, w) for path, w in weights.iteritems()
+                   if len(algos3d.getTarget(obj, path).verts))
+
+    def applyLoop():
+        algos3d.resetObj(obj)
+        for path, morphFactor in weights.iteritems():
+            algos3d.loadTranslationTarget(obj, path, morphFactor, None, 0, 0)
+
+    matrix = algos3d.TargetMatrix(obj)
+    def applyMatrix():
+        matrix.apply(weights, update=False, calcNormals=False)
+
+    applyLoop()
+    reference = obj.coord.copy()
+    applyMatrix()
+    error = np.abs(obj.coord - reference).max()
+
+    report("Apply %d targets (max. deviation %g)" % (len(weights), error),
+           [("loop", timeFunction(applyLoop, repeat)),
+            ("target matrix", timeFunction(applyMatrix, repeat))])
+
+def benchmarkSkinning(repeat=10, nBones=160, bonesPerVert=4):
+    """
+    Linear blend skinning of the basemesh: one transform and scatter-add per
+    bone, as Skeleton.skinMesh used to do, versus the packed per-vertex
+    weights of skeleton.packVertexWeights. The skeleton is a chain of
+    randomly placed bones in a random pose; every vertex is weighted to
+    bonesPerVert random bones.
+    """
+    obj = getBaseMesh()
+    nVerts = obj.getVertexCount()
+    rnd = np.random.RandomState(0)
+
+    skel = skeleton.Skeleton()
+    parent = None
+    for i in xrange(nBones):
+        head = obj.coord[rnd.randint(nVerts)]
+        skel.addBone("bone%d" % i, parent, head, head + rnd.uniform(0.1, 1.0, 3))
+        parent = "bone%d" % i
+    skel.build()
+
+    poseMats = np.array([tm.random_rotation_matrix(rnd.rand(3)) for i in xrange(nBones)], dtype=np.float32)
+    skel.setPose(poseMats)
+
+    vertBones = np.array([rnd.permutation(nBones)[:bonesPerVert] for v in xrange(nVerts)])
+    vertWeights = rnd.uniform(0.0, 1.0, vertBones.shape)
+    vertWeights /= vertWeights.sum(axis=1)[:,None]
+    vertBoneMapping = {}
+    for bone in skel.getBones():
+        verts, slots = np.nonzero(vertBones == bone.index)
+        vertBoneMapping[bone.name] = (verts, vertWeights[verts, slots].astype(np.float32))
+
+    meshCoords = np.ones((nVerts,4), np.float32)
+    meshCoords[:,:3] = obj.coord
+
+    def skinLoop():
+        coords = np.zeros((nVerts,4), float)
+        for bname, (verts, weights) in vertBoneMapping.items():
+            bone = skel.getBone(bname)
+            vec = np.dot(bone.matPoseVerts, meshCoords[verts].transpose())
+            coords[verts] += (weights*vec).transpose()
+        return coords[:,:3]
+
+    packed = skeleton.packVertexWeights(skel, vertBoneMapping, nVerts)
+    out = np.zeros((nVerts,3), np.float32)
+    def skinPacked():
+        skel.skinMesh(meshCoords, packed, out=out)
+
+    reference = skinLoop()
+    skinPacked()
+    error = np.abs(out - reference).max()
+
+    report("Skin %d verts to %d bones (max. deviation %g)" % (nVerts, nBones, error),
+           [("per-bone loop", timeFunction(skinLoop, repeat)),
+            ("packed weights", timeFunction(skinPacked, repeat))],
+           fps = True)
+
+def benchmarkRetarget(repeat=10, path='data/bvhs/03_03.bvh'):
+    """
+    Retargeting a BVH onto a skeleton with a compensation rotation for every
+    second bone: a joint lookup and matrix product per bone, as
+    BVH.createAnimationTrack used to do, versus a compiled
+    skeleton.Retargeter.
+    """
+    bvhRig = bvh.load(path)
+    joints = [joint for joint in bvhRig.getJoints() if not joint.isEndConnector()]
+    boneMapping = [(joint.name, 15.0 if idx % 2 else 0.0) for idx, joint in enumerate(joints)]
+    compensation = np.dot(tm.rotation_matrix(-15.0*skeleton.D, [0,0,1]), tm.rotation_matrix(15.0*skeleton.D, [0,1,0]))
+
+    def retargetLoop():
+        jointsData = []
+        for jointName, angle in boneMapping:
+            poseMats = bvhRig.getJointByCanonicalName(jointName).matrixPoses
+            if angle != 0.0:
+                poseMats = np.dot(poseMats, compensation)
+            jointsData.append(poseMats)
+        return np.hstack(jointsData).reshape(-1,4,4)
+
+    def retargetCompiled():
+        retargeter = skeleton.Retargeter([joint.name for joint in joints], boneMapping)
+        srcPoses = np.array([joint.matrixPoses for joint in joints]).swapaxes(0,1)
+        return retargeter.retarget(srcPoses).reshape(-1,4,4)
+
+    error = np.abs(retargetCompiled() - retargetLoop()).max()
+
+    report("Retarget %d frames of %d joints (max. deviation %g)" % (bvhRig.frameCount, len(joints), error),
+           [("per-bone loop", timeFunction(retargetLoop, repeat)),
+            ("retargeter", timeFunction(retargetCompiled, repeat))])
+
+benchmarks = [
+    ('targets', benchmarkTargets),
+    ('skinning', benchmarkSkinning),
+    ('retarget', benchmarkRetarget),
+    ]
+
+if __name__ == '__main__':
+    names = sys.argv[1:]
+    for name, func in benchmarks:
+        if names and name not in names:
+            continue
+        func()
@@ -19,3 +19,19 @@ for /r %%i in (*) do (
       del %%i
    )
 )
+
+:: And the memory-mapped target store
+
+for /r %%i in (targets.*.npy) do (
+   del %%i
+)
+
+:: And compiled proxies
+
+set filetype=.mhpxy
+
+for /r %%i in (*) do (
+   if %%~xi==%filetype% (
+      del %%i
+   )
+)
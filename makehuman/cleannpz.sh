@@ -10,3 +10,13 @@ find . -type f -iname \*.npz -exec rm -rf {} \;
 # And .bin files
 
 find . -type f -iname \*.bin -exec rm -rf {} \;
+
+
+# And the memory-mapped target store
+
+find . -type f -iname targets.\*.npy -exec rm -rf {} \;
+
+
+# And compiled proxies
+
+find . -type f -iname \*.mhpxy -exec rm -rf {} \;
@@ -23,8 +23,9 @@ TODO
 """
 
 import sys
-sys.path = ["./core", "./lib"] + sys.path
+sys.path = ["./core", "./lib", "./shared"] + sys.path
 import algos3d
+import files3d
 import os
 import zipfile
 import fnmatch
@@ -47,8 +48,12 @@ def getFiles(root, filenames, filterStr):
 
 if __name__ == '__main__':
     obj = algos3d.Target(None, None)
+    basemesh = files3d.loadMesh('data/3dobjs/base.obj', maxFaces = 5)
     allFiles = getAllFiles('data', ['*.target', '*.png'])
     npzPath = 'data/targets.npz'
+    storePath = 'data/targets'
+    storeTargets = []
+    storeFaces = []
     with zipfile.ZipFile(npzPath, mode='w', compression=zipfile.ZIP_DEFLATED) as zip:
         npzdir = os.path.dirname(npzPath)
         allTargets = allFiles[0]
@@ -56,7 +61,10 @@ if __name__ == '__main__':
         for (i, path) in enumerate(allTargets):
             try:
                 obj._load_text(path)
-                obj._save_binary(path)
+                index, vector = obj._compile()
+                name = os.path.splitext(os.path.relpath(path, npzdir))[0].replace('\\', '/')
+                storeTargets.append((name, index, vector))
+                storeFaces.append(basemesh.getFacesForVertices(index))
                 iname, vname = obj._save_binary(path)
                 zip.write(iname, os.path.relpath(iname, npzdir))
                 zip.write(vname, os.path.relpath(vname, npzdir))
@@ -67,6 +75,9 @@ if __name__ == '__main__':
                 raise e
                 print 'error converting target %s' % path
 
+    print "Writing target store"
+    algos3d.TargetStore.write(storePath, storeTargets, storeFaces)
+
     print "Writing images list"
     with open('data/images.list', 'w') as f:
         allImages = allFiles[1]
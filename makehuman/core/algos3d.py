@@ -43,11 +43,304 @@ algorithms will be coded. For example:
 __docformat__ = 'restructuredtext'
 
 import os
+import weakref
+import hashlib
+from collections import OrderedDict
 import numpy as np
 import log
 from getpath import getSysDataPath, canonicalPath
 
-_targetBuffer = {}
+
+class TargetBuffer(object):
+    """
+    Buffer of the loaded targets, keyed by canonical target path, that can be
+    used as a dict.
+
+    The buffer keeps track of the memory held by its targets, including the
+    faces that targets compute when first needed (see Target.faces), and can
+    be given a budget in bytes. Face arrays are shared by targets with the
+    same vertices (see getFacesForVertices), and are counted once for all
+    buffered targets sharing them. When the budget is exceeded, the least
+    recently used targets are evicted, to be loaded again when needed. Arrays mapped from a
+    compiled target store are not counted, as they are backed by the store
+    file rather than by private memory.
+    Pinned targets are never evicted, for targets that are needed all the
+    time (macro targets) or that cannot be loaded again from a file (warp
+    targets). Paths stay pinned when their target is removed from the buffer,
+    and apply again when it is loaded anew.
+    Objects keeping data of buffered targets (TargetMatrix) can be added as
+    listeners, their onTargetRemoved(targetPath) method is called when a
+    target is removed, evicted or replaced.
+    """
+
+    def __init__(self, budget = 0):
+        self._targets = OrderedDict()
+        self._sizes = {}
+        self._faces = {}
+        self._faceRefs = {}
+        self._pinned = set()
+        self._listeners = weakref.WeakSet()
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _isPrivateArray(array):
+        return isinstance(array, np.ndarray) and not isinstance(array, np.memmap)
+
+    @staticmethod
+    def getTargetBytes(target):
+        """
+        The private memory held by the vertex and offset arrays of a target,
+        in bytes. Faces are counted separately, as they can be shared.
+        """
+        size = 0
+        for name in ('verts', '_data'):
+            array = getattr(target, name, None)
+            if TargetBuffer._isPrivateArray(array):
+                size += array.nbytes
+        return size
+
+    def _addFaces(self, targetPath, target):
+        """
+        Count the faces of a buffered target, unless they are already counted
+        for another target sharing them.
+        """
+        faces = getattr(target, '_faces', None)
+        if not self._isPrivateArray(faces):
+            return
+        self._faces[targetPath] = faces
+        refs = self._faceRefs.get(id(faces), 0)
+        if refs == 0:
+            self.bytes += faces.nbytes
+        self._faceRefs[id(faces)] = refs + 1
+
+    def _removeFaces(self, targetPath):
+        faces = self._faces.pop(targetPath, None)
+        if faces is None:
+            return
+        refs = self._faceRefs.pop(id(faces)) - 1
+        if refs == 0:
+            self.bytes -= faces.nbytes
+        else:
+            self._faceRefs[id(faces)] = refs
+
+    def __len__(self):
+        return len(self._targets)
+
+    def __contains__(self, targetPath):
+        return targetPath in self._targets
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, targetPath):
+        return self._targets[targetPath]
+
+    def __setitem__(self, targetPath, target):
+        if targetPath in self._targets:
+            del self[targetPath]
+        self._targets[targetPath] = target
+        self._sizes[targetPath] = self.getTargetBytes(target)
+        self.bytes += self._sizes[targetPath]
+        self._addFaces(targetPath, target)
+        self._evict()
+
+    def __delitem__(self, targetPath):
+        del self._targets[targetPath]
+        self.bytes -= self._sizes.pop(targetPath)
+        self._removeFaces(targetPath)
+        for listener in list(self._listeners):
+            listener.onTargetRemoved(targetPath)
+
+    def get(self, targetPath, default = None):
+        return self._targets.get(targetPath, default)
+
+    def recount(self, targetPath):
+        """
+        Update the memory counted for a buffered target after arrays were
+        added to it, and evict targets as needed.
+        """
+        if targetPath not in self._targets:
+            return
+        target = self._targets[targetPath]
+        size = self.getTargetBytes(target)
+        self.bytes += size - self._sizes[targetPath]
+        self._sizes[targetPath] = size
+        if getattr(target, '_faces', None) is not self._faces.get(targetPath):
+            self._removeFaces(targetPath)
+            self._addFaces(targetPath, target)
+        self._evict()
+
+    def keys(self):
+        return self._targets.keys()
+
+    def values(self):
+        return self._targets.values()
+
+    def items(self):
+        return self._targets.items()
+
+    def clear(self):
+        for targetPath in self.keys():
+            del self[targetPath]
+
+    def lookup(self, targetPath):
+        """
+        Return the buffered target with specified path and mark it as most
+        recently used. Raises KeyError if the target is not buffered.
+        Lookups are counted as buffer hits and misses.
+        """
+        try:
+            target = self._targets.pop(targetPath)
+        except KeyError:
+            self.misses += 1
+            raise
+        self._targets[targetPath] = target
+        self.hits += 1
+        return target
+
+    def addListener(self, listener):
+        self._listeners.add(listener)
+
+    def pin(self, targetPath):
+        self._pinned.add(targetPath)
+
+    def unpin(self, targetPath):
+        self._pinned.discard(targetPath)
+
+    def isPinned(self, targetPath):
+        return targetPath in self._pinned
+
+    def setBudget(self, budget):
+        """
+        Set the maximum number of bytes held by the buffered targets, 0 for
+        no limit, and evict targets as needed.
+        """
+        self.budget = budget
+        self._evict()
+
+    def _evict(self):
+        if not self.budget or self.bytes <= self.budget:
+            return
+        # Oldest first, sparing the most recently added target
+        for targetPath in self._targets.keys()[:-1]:
+            if targetPath in self._pinned:
+                continue
+            del self[targetPath]
+            self.evictions += 1
+            if self.bytes <= self.budget:
+                break
+
+    def getStats(self):
+        """
+        Counters of this buffer, as a dict.
+        """
+        return dict(
+            targets = len(self._targets),
+            pinned = len(self._pinned.intersection(self._targets)),
+            bytes = self.bytes,
+            budget = self.budget,
+            hits = self.hits,
+            misses = self.misses,
+            evictions = self.evictions)
+
+_targetBuffer = TargetBuffer()
+
+
+class TargetStore(object):
+    """
+    Uncompressed archive of compiled targets, built by compile_targets.py.
+
+    All target indices and (int16, scaled by 1e3) vectors are concatenated in
+    one flat index array and one flat vector array, which are memory-mapped
+    from disk. A table maps each target name to its range in these arrays, so
+    that loading a target returns zero-copy views into the mapped files and
+    pages are only read from disk when a target is actually applied.
+    Optionally, the faces of the basemesh affected by each target (see
+    Target.faces) are stored the same way, in a flat faces array.
+    """
+
+    scale = 1e-3
+
+    def __init__(self, path):
+        """
+        Open the target store with specified path prefix (the path of the
+        store files without their .index.npy, .vector.npy, .faces.npy and
+        .table.npz extensions).
+        """
+        self.index = np.load(path + '.index.npy', mmap_mode='r')
+        self.vector = np.load(path + '.vector.npy', mmap_mode='r')
+        with np.load(path + '.table.npz') as table:
+            names = table['names']
+            offsets = table['offsets']
+            faceOffsets = table['faceOffsets'] if 'faceOffsets' in table.files else None
+        self._ranges = dict(zip(names.tolist(), zip(offsets[:-1].tolist(), offsets[1:].tolist())))
+        exts = ['.index.npy', '.vector.npy', '.table.npz']
+        if faceOffsets is not None and os.path.isfile(path + '.faces.npy'):
+            self.faces = np.load(path + '.faces.npy', mmap_mode='r')
+            self._faceRanges = dict(zip(names.tolist(), zip(faceOffsets[:-1].tolist(), faceOffsets[1:].tolist())))
+            exts.append('.faces.npy')
+        else:
+            self.faces = None
+            self._faceRanges = {}
+        self.mtime = min(os.path.getmtime(path + ext) for ext in exts)
+
+    def __contains__(self, name):
+        return name in self._ranges
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def get(self, name):
+        """
+        Returns views of the index and (unscaled) vector data of the target
+        with specified name.
+        """
+        start, end = self._ranges[name]
+        return self.index[start:end], self.vector[start:end]
+
+    def getFaces(self, name):
+        """
+        Returns a view of the face indices of the target with specified name,
+        or None if this store holds no faces.
+        """
+        if self.faces is None:
+            return None
+        start, end = self._faceRanges[name]
+        return self.faces[start:end]
+
+    @staticmethod
+    def write(path, targets, faces = None):
+        """
+        Write a target store with specified path prefix, from a list of
+        (name, index, vector) tuples with the compiled (uint16 index, int16
+        vector) data of each target. faces optionally is a list with the face
+        indices of each target.
+        """
+        names = [name for name, _, _ in targets]
+        sizes = [len(index) for _, index, _ in targets]
+        offsets = np.zeros(len(targets) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum(sizes)
+
+        index = np.empty(offsets[-1], dtype=np.uint16)
+        vector = np.empty((offsets[-1], 3), dtype=np.int16)
+        for i, (_, tindex, tvector) in enumerate(targets):
+            index[offsets[i]:offsets[i+1]] = tindex
+            vector[offsets[i]:offsets[i+1]] = tvector
+
+        np.save(path + '.index.npy', index)
+        np.save(path + '.vector.npy', vector)
+        if faces is None:
+            np.savez(path + '.table.npz', names = np.array(names), offsets = offsets)
+            return
+
+        faceOffsets = np.zeros(len(targets) + 1, dtype=np.uint32)
+        faceOffsets[1:] = np.cumsum([len(tfaces) for tfaces in faces])
+        np.save(path + '.faces.npy', np.concatenate(faces).astype(np.uint32))
+        np.savez(path + '.table.npz', names = np.array(names), offsets = offsets, faceOffsets = faceOffsets)
 
 
 class Target(object):
@@ -59,6 +352,10 @@ class Target(object):
     npzfile = None
     npztime = None
     npzdir = None
+    store = None
+
+    _obj = None
+    _faces = None
 
     def __init__(self, obj, name):
         """
@@ -79,6 +376,7 @@ class Target(object):
         """
         self.name = name
         self.morphFactor = -1
+        self._obj = obj
 
         try:
             self._load(self.name)
@@ -87,11 +385,42 @@ class Target(object):
             log.error('Unable to open %s', name)
             return
 
-        self.faces = obj.getFacesForVertices(self.verts)
-
     def __repr__(self):
         return ( "<Target %s>" % (os.path.basename(self.name)) )
 
+    def getFaces(self):
+        """
+        The faces affected by this target, which need their normals updated
+        when it is applied. These are loaded from the target store, or else
+        computed on first use and shared by targets with the same vertices.
+        """
+        if self._faces is None:
+            self._faces = getFacesForVertices(self._obj, self.verts)
+            if _targetBuffer.get(self.name) is self:
+                _targetBuffer.recount(self.name)
+        return self._faces
+
+    def setFaces(self, faces):
+        self._faces = faces
+
+    faces = property(getFaces, setFaces)
+
+    def getData(self):
+        """
+        The translation vectors of this target. Compiled targets keep their
+        vectors in compact integer form, so these are scaled on access.
+        Target.apply() applies the scale directly instead.
+        """
+        if self._dataScale == 1.0:
+            return self._data
+        return self._data * np.float32(self._dataScale)
+
+    def setData(self, data):
+        self._data = data
+        self._dataScale = 1.0
+
+    data = property(getData, setData)
+
     def _load_text(self, name):
         data = []
         with open(name) as fd:
@@ -125,7 +454,24 @@ class Target(object):
             log.message('compiled file missing: %s', vname)
             raise RuntimeError()
         self.verts = Target.npzfile[iname]
-        self.data = Target.npzfile[vname] * 1e-3
+        self._data = Target.npzfile[vname]
+        self._dataScale = 1e-3
+
+    def _load_binary_store(self, name):
+        """
+        Load target from the memory-mapped target store
+        """
+        name = name.replace('\\', '/')
+        bname = os.path.splitext(name)[0]
+        if os.path.isfile(name) and Target.store.mtime < os.path.getmtime(name):
+            log.message('compiled file newer than store: %s', name)
+            raise RuntimeError()
+        if bname not in Target.store:
+            log.message('compiled file missing: %s', bname)
+            raise RuntimeError()
+        self.verts, self._data = Target.store.get(bname)
+        self._dataScale = TargetStore.scale
+        self._faces = Target.store.getFaces(bname)
 
     def _load_binary_files(self, name):
         """
@@ -147,9 +493,25 @@ class Target(object):
             log.message('compiled file out of date: %s', vname)
             raise RuntimeError()
         self.verts = np.load(iname)
-        self.data = np.load(vname) * 1e-3
+        self._data = np.load(vname)
+        self._dataScale = 1e-3
 
     def _load_binary(self, name):
+        if Target.store is None:
+            try:
+                storename = getSysDataPath('targets')
+                Target.npzdir = os.path.dirname(storename)
+                Target.store = TargetStore(storename)
+            except:
+                log.message('no target store found')
+                Target.store = False
+        if Target.store:
+            try:
+                self._load_binary_store(os.path.relpath(name, Target.npzdir))
+                return
+            except StandardError, _:
+                pass
+
         if Target.npzfile is None:
             try:
                 npzname = getSysDataPath('targets.npz')     # TODO duplicate path literal
@@ -167,14 +529,22 @@ class Target(object):
             name = os.path.relpath(name, Target.npzdir)
             self._load_binary_archive(name)
 
+    def _compile(self):
+        """
+        Returns the compact (uint16 index, int16 vector) form of this target
+        that is stored in compiled target files.
+        """
+        index = np.ascontiguousarray(self.verts, dtype=np.uint16)
+        vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+        return index, vector
+
     def _save_binary(self, name):
         log.message('compiling %s', name)
         try:
             bname, ext = os.path.splitext(name)
             iname = '%s.index.npy' % bname
             vname = '%s.vector.npy' % bname
-            index = np.ascontiguousarray(self.verts, dtype=np.uint16)
-            vector = np.ascontiguousarray(np.round(self.data * 1e3), dtype=np.int16)
+            index, vector = self._compile()
             np.save(iname, index)
             np.save(vname, vector)
             return iname, vname
@@ -203,12 +573,10 @@ class Target(object):
                     vmask, fmask = obj.getVertexAndFaceMasksForGroups([faceGroupToUpdateName])
 
                     srcVerts = np.argwhere(vmask[self.verts])[...,0]
-                    facesToRecalculate = self.faces[fmask[self.faces]]
                 else:
                     # if a vertgroup is not provided, all verts affected by
                     # the targets will be modified
 
-                    facesToRecalculate = self.faces
                     srcVerts = np.s_[...]
 
                 dstVerts = self.verts[srcVerts]
@@ -216,11 +584,16 @@ class Target(object):
             if morphFactor:
                 # Adding the translation vector
 
-                scale = np.array(scale) * morphFactor
-                obj.coord[dstVerts] += self.data[srcVerts] * scale[None,:]
+                scale = np.array(scale) * (morphFactor * self._dataScale)
+                obj.coord[dstVerts] += self._data[srcVerts] * scale[None,:]
                 obj.markCoords(dstVerts, coor=True)
 
             if calcNormals:
+                # The faces of the target are only computed when needed
+                if faceGroupToUpdateName:
+                    facesToRecalculate = self.faces[fmask[self.faces]]
+                else:
+                    facesToRecalculate = self.faces
                 obj.calcNormals(1, 1, dstVerts, facesToRecalculate)
             if update:
                 obj.update()
@@ -263,7 +636,7 @@ def getTarget(obj, targetPath):
     targetPath = canonicalPath(targetPath)
 
     try:
-        return _targetBuffer[targetPath]
+        return _targetBuffer.lookup(targetPath)
     except KeyError:
         pass
 
@@ -271,6 +644,234 @@ def getTarget(obj, targetPath):
     _targetBuffer[targetPath] = target
     return target
 
+def pinTarget(targetPath):
+    """
+    Keep the target with specified path in the target buffer once it is
+    loaded, regardless of the buffer budget.
+    """
+    _targetBuffer.pin(canonicalPath(targetPath))
+
+def unpinTarget(targetPath):
+    _targetBuffer.unpin(canonicalPath(targetPath))
+
+def setTargetBufferBudget(budget):
+    """
+    Limit the memory held by buffered targets to budget bytes (0 for no
+    limit), evicting least recently used targets beyond that.
+    """
+    _targetBuffer.setBudget(budget)
+
+def getTargetBufferStats():
+    """
+    Counters of the target buffer: number of buffered and pinned targets,
+    bytes held and budget, lookup hits and misses, and evictions.
+    """
+    return _targetBuffer.getStats()
+
+_faceSets = weakref.WeakValueDictionary()
+
+def getFacesForVertices(obj, verts):
+    """
+    The indices of the faces of obj using any of the specified vertices, as
+    returned by obj.getFacesForVertices(). Face arrays are shared between
+    calls with the same vertex set, for as long as they are referenced.
+    """
+    verts = np.ascontiguousarray(verts, dtype=np.uint32)
+    key = (id(obj), len(verts), hashlib.sha1(verts.tostring()).digest())
+    faces = _faceSets.get(key)
+    if faces is None:
+        faces = obj.getFacesForVertices(verts)
+        _faceSets[key] = faces
+    return faces
+
+
+def compileTargetStore(path, targetPaths, obj = None):
+    """
+    Write a target store with specified path prefix containing the targets
+    with specified paths, loaded from whichever compiled or text form is
+    available. Target names are relative to the system data path, as in the
+    store written by compile_targets.py.
+    If the mesh obj is specified, the faces of obj affected by each target are
+    stored as well.
+    """
+    root = os.path.dirname(getSysDataPath('targets'))
+    targets = []
+    faces = [] if obj is not None else None
+    for targetPath in targetPaths:
+        target = Target.__new__(Target)
+        target._load(targetPath)
+        name = os.path.splitext(os.path.relpath(targetPath, root))[0].replace('\\', '/')
+        index, vector = target._compile()
+        targets.append((name, index, vector))
+        if obj is not None:
+            faces.append(obj.getFacesForVertices(index))
+    TargetStore.write(path, targets, faces)
+
+def useTargetStore(path):
+    """
+    Load compiled targets from the target store with specified path prefix
+    from now on, for instance a store shared by the processes of a batch
+    export (see headless.py). Buffered targets are released, so that they are
+    loaded again from the store.
+    """
+    Target.store = TargetStore(path)
+    Target.npzdir = os.path.dirname(getSysDataPath('targets'))
+    _targetBuffer.clear()
+
+
+class TargetMatrix(object):
+    """
+    A sparse delta matrix combining a set of morph targets, used to compute the
+    morph of many targets at once.
+
+    Each non-zero entry of the matrix holds a vertex index (row), the index of
+    the target it belongs to (column) and the translation vector of that vertex.
+    Entries are kept sorted by vertex, in compressed sparse row (CSR) layout,
+    so that morphing a mesh with a set of target weights boils down to a
+    single sparse matrix-vector product, instead of one scatter-add per target.
+
+    Targets are removed from the matrix when they leave the target buffer,
+    so that the matrix does not hold on to the data of evicted targets.
+    Their entries are dropped on the next use of the matrix, and they are
+    added anew (in a new column) when needed again.
+    """
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.clear()
+        _targetBuffer.addListener(self)
+
+    def clear(self):
+        self._keys = []
+        self._columns = {}
+        self._pending = []
+        self._removedPaths = set()
+        self._removed = set()
+        self.rows = np.zeros(0, dtype=np.uint32)
+        self.cols = np.zeros(0, dtype=np.uint32)
+        self.data = np.zeros((0,3), dtype=np.float32)
+        self.verts = np.zeros(0, dtype=np.uint32)
+        self.rowStart = np.zeros(0, dtype=np.intp)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __contains__(self, targetPath):
+        return targetPath in self._columns
+
+    def addTarget(self, targetPath):
+        """
+        Add the target with specified path as a new column of this matrix.
+        Returns the column index of the target.
+        """
+        if targetPath in self._columns:
+            return self._columns[targetPath]
+
+        target = getTarget(self.obj, targetPath)
+        col = len(self._keys)
+        self._keys.append(canonicalPath(targetPath))
+        self._columns[targetPath] = col
+        if len(target.verts):
+            self._pending.append((col, target))
+        return col
+
+    def onTargetRemoved(self, targetPath):
+        """
+        Called when the target with specified path left the target buffer.
+        Targets can be evicted while the matrix loads other targets, so
+        they are only removed on the next use of the matrix.
+        """
+        if targetPath in self._columns:
+            self._removedPaths.add(targetPath)
+
+    def _removeTargets(self):
+        for targetPath in self._removedPaths:
+            col = self._columns.pop(targetPath, None)
+            if col is None:
+                continue
+            self._pending = [(c, target) for c, target in self._pending if c != col]
+            self._removed.add(col)
+        self._removedPaths = set()
+
+    def _pack(self):
+        """
+        Merge the entries of the targets added since the last pack into the
+        packed row, column and data arrays.
+        """
+        if self._removed:
+            keep = np.logical_not(np.in1d(self.cols, list(self._removed)))
+            self.rows = self.rows[keep]
+            self.cols = self.cols[keep]
+            self.data = self.data[keep]
+            self._removed = set()
+            if not self._pending:
+                self._updateRowStart()
+        if not self._pending:
+            return
+        rows = [self.rows]
+        cols = [self.cols]
+        data = [self.data]
+        for col, target in self._pending:
+            rows.append(np.asarray(target.verts, dtype=np.uint32))
+            cols.append(np.repeat(np.uint32(col), len(target.verts)))
+            data.append(np.asarray(target.data, dtype=np.float32))
+        self._pending = []
+
+        # Already packed entries form a sorted run, which a stable sort merges
+        # cheaply with the new ones
+        rows = np.concatenate(rows)
+        order = np.argsort(rows, kind='mergesort')
+        self.rows = rows[order]
+        self.cols = np.concatenate(cols)[order]
+        self.data = np.concatenate(data)[order]
+        del rows, order
+        self._updateRowStart()
+
+    def _updateRowStart(self):
+        first = np.ones(len(self.rows), dtype=bool)
+        first[1:] = self.rows[1:] != self.rows[:-1]
+        self.rowStart = np.flatnonzero(first)
+        self.verts = self.rows[self.rowStart]
+
+    def getWeightVector(self, weights):
+        """
+        Convert a dict mapping target paths to weights (such as
+        Human.targetsDetailStack) to a weight vector with one entry per column
+        of this matrix. Targets not yet part of the matrix are added.
+        Target paths are expected to be canonical paths.
+        """
+        self._removeTargets()
+        columns = dict((path, self.addTarget(path)) for path in weights)
+        self._pack()
+
+        w = np.zeros(len(self._keys), dtype=np.float32)
+        for path, weight in weights.iteritems():
+            w[columns[path]] = weight
+        return w
+
+    def getMorph(self, weights):
+        """
+        Returns the combined offsets of all targets in weights, a dict mapping
+        target paths to their weight, as a (nVerts, 3) array.
+        """
+        w = self.getWeightVector(weights)
+        morph = np.zeros((self.obj.getVertexCount(), 3), dtype=np.float32)
+        if len(self.rows):
+            scaled = self.data * w[self.cols][:,None]
+            morph[self.verts] = np.add.reduceat(scaled, self.rowStart)
+        return morph
+
+    def apply(self, weights, update=True, calcNormals=True):
+        """
+        Reset the coordinates of the object to its original base positions
+        and apply all targets in weights to it.
+        """
+        self.obj.changeCoords(self.obj.orig_coord + self.getMorph(weights))
+        if calcNormals:
+            self.obj.calcNormals()
+        if update:
+            self.obj.update()
+
 
 def loadTranslationTarget(obj, targetPath, morphFactor, faceGroupToUpdateName=None, update=1, calcNorm=1, scale=[1.0,1.0,1.0]):
     """
@@ -136,6 +136,64 @@ def loadBinaryMesh(obj, path):
     obj.updateIndexBuffer()
     #log.debug('loadBinaryMesh: built index buffer for rendering')
 
+def saveMappedMesh(obj, path):
+    """
+    Save the arrays of a mesh uncompressed, as one .npy file per array with
+    specified path prefix, so that loadMappedMesh() can memory-map them.
+    """
+    fgstr, fgidx = packStringList(fg.name for fg in obj._faceGroups)
+    vars_ = dict(
+        coord = obj.coord,
+        vface = obj.vface,
+        nfaces = obj.nfaces,
+        texco = obj.texco,
+        fvert = obj.fvert,
+        group = obj.group,
+        fgstr = fgstr,
+        fgidx = fgidx)
+    if obj.has_uv:
+        vars_['fuvs']  = obj.fuvs
+    for name, array in vars_.iteritems():
+        np.save('%s.%s.npy' % (path, name), array)
+
+def loadMappedMesh(path, storePath, maxFaces=None):
+    """
+    Load the mesh with specified path from the arrays saved with
+    saveMappedMesh() at storePath.
+    The arrays that stay constant (base coordinates, faces, UVs and vertex to
+    face tables) are memory-mapped read-only, so that processes loading the
+    same mesh share their memory. Only the arrays that are modified, such as
+    the morphed coordinates and normals, are private to each process.
+    """
+    def load(name):
+        return np.load('%s.%s.npy' % (storePath, name), mmap_mode='r')
+
+    name = os.path.basename(path)
+    obj = module3d.Object3D(name)
+    if maxFaces:
+        obj.MAX_FACES = maxFaces
+    obj.path = path
+
+    coord = load('coord')
+    obj.setCoords(np.array(coord))
+    obj.orig_coord = coord
+    obj.setUVs(load('texco'))
+    fvert = load('fvert')
+    fuvs = load('fuvs') if os.path.isfile('%s.fuvs.npy' % storePath) else None
+    group = load('group')
+    obj.setFaces(fvert, fuvs, group, skipUpdate=True)
+    obj.fvert = fvert
+    obj.group = group
+    if fuvs is not None:
+        obj.fuvs = fuvs
+    obj.vface = load('vface')[:,:obj.MAX_FACES]
+    obj.nfaces = load('nfaces')
+    for name in unpackStringList(load('fgstr'), load('fgidx')):
+        obj.createFaceGroup(name)
+    obj.calcNormals()
+    obj.updateIndexBuffer()
+    return obj
+
 def loadTextMesh(obj, path):
     """
     Parse and load a Wavefront OBJ file as mesh.
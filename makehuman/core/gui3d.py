@@ -30,6 +30,7 @@ import module3d
 import mh
 import log
 import selection
+import picking
 
 from guicommon import Object, Action
 
@@ -419,10 +420,18 @@ class Application(events3d.EventHandler):
         return True
 
     def getSelectedFaceGroupAndObject(self):
+        if self.settings.get('cpuPicking', False):
+            pos = mh.getMousePos()
+            if pos is None:
+                return None
+            return picking.getSelectedFaceGroupAndObject(*pos)
         picked = mh.getPickedColor()
         return selection.selectionColorMap.getSelectedFaceGroupAndObject(picked)
 
     def getSelectedFaceGroup(self):
+        if self.settings.get('cpuPicking', False):
+            picked = self.getSelectedFaceGroupAndObject()
+            return picked[0] if picked else None
         picked = mh.getPickedColor()
         return selection.selectionColorMap.getSelectedFaceGroup(picked)
 
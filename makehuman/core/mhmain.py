@@ -271,6 +271,8 @@ class MHApplication(gui3d.Application, mh.Application):
         # Set a lower than default MAX_FACES value because we know the human has a good topology (will make it a little faster)
         # (we do not lower the global limit because that would limit the selection of meshes that MH would accept too much)
         self.selectedHuman = self.addObject(human.Human(files3d.loadMesh(mh.getSysDataPath("3dobjs/base.obj"), maxFaces = 5)))
+        self.selectedHuman.useTargetMatrix = self.settings.get('batchMorphing', False)
+        algos3d.setTargetBufferBudget(self.settings.get('targetCacheSize', 0) * 1024 * 1024)
 
     def loadMainGui(self):
 
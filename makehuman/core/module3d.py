@@ -396,6 +396,8 @@ class Object3D(object):
         if hasattr(self, 'r_color'): del self.r_color
         if hasattr(self, 'r_faces'): del self.r_faces
 
+        self._faceBVH = None
+
     def setCoords(self, coords):
         nverts = len(coords)
         self.coord = np.asarray(coords, dtype=np.float32)
@@ -442,6 +444,8 @@ class Object3D(object):
                     self.ucoor = np.zeros(nverts, dtype=bool)
                 if self.ucoor is not True:
                     self.ucoor[indices] = True
+            if self._faceBVH is not None:
+                self._faceBVH.markCoords(indices)
 
         if norm:
             if indices is None:
@@ -1099,6 +1103,20 @@ class Object3D(object):
     def getFacesForVertices(self, verts):
         return np.argwhere(self.getFaceMaskForVertices(verts))[...,0]
 
+    def getFaceBVH(self):
+        """
+        The bounding volume hierarchy over the faces of this object, used for
+        picking by casting rays (see picking.py). It is built on first use,
+        and refitted for the vertices marked as changed with markCoords().
+        Returns None for objects without faces or for line primitives.
+        """
+        if self.vertsPerPrimitive < 3 or len(self.coord) == 0 or len(getattr(self, 'fvert', [])) == 0:
+            return None
+        if self._faceBVH is None or self._faceBVH.isStale():
+            import picking
+            self._faceBVH = picking.FaceBVH(self)
+        return self._faceBVH
+
     def setCameraProjection(self, cameraMode):
         """
         This method sets the camera mode used to visualize this object (fixed or movable).
@@ -0,0 +1,360 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Picking by casting rays on the CPU, as an alternative to the picking buffer
+of the OpenGL module (see selection.py).
+
+Each mesh keeps a bounding volume hierarchy (BVH) over its faces, which is
+built on first use and refitted for the vertices reported as changed by
+Object3D.markCoords(). Rays are cast from the camera through a screen
+position, in the coordinate space of each object, so picking does not depend
+on the window contents and also works without an OpenGL context.
+"""
+
+import numpy as np
+
+from core import G
+import matrix
+import log
+
+class FaceBVH(object):
+    """
+    Bounding volume hierarchy over the faces of a module3d.Object3D.
+
+    The tree is stored in flat arrays. Nodes are numbered breadth-first, each
+    node has the bounding box (nodeMin, nodeMax) of its faces. Internal nodes
+    have two children, leaves reference a range (leafStart, leafCount) of the
+    faces in faceOrder.
+    """
+
+    LEAF_SIZE = 8
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.coord = mesh.coord
+        self.fvert = mesh.fvert
+        self._changed = False
+        self.build()
+
+    def markCoords(self, indices = None):
+        """
+        Mark vertices as changed, the boxes containing their faces are
+        refitted before the next ray query.
+        """
+        if indices is None:
+            self._changed = True
+        elif self._changed is not True:
+            if self._changed is False:
+                self._changed = np.zeros(len(self.coord), dtype=bool)
+            self._changed[indices] = True
+
+    def isStale(self):
+        """
+        Whether the mesh was rebuilt with other vertices or faces, requiring
+        a new BVH.
+        """
+        return self.mesh.coord is not self.coord or self.mesh.fvert is not self.fvert
+
+    def _calcFaceBoxes(self, faces = None):
+        if faces is None:
+            faces = np.s_[:]
+        coords = self.coord[self.fvert[faces]]
+        self.faceMin[faces] = coords.min(axis=1)
+        self.faceMax[faces] = coords.max(axis=1)
+
+    def build(self):
+        nFaces = len(self.fvert)
+        self.faceMin = np.zeros((nFaces, 3), dtype=np.float32)
+        self.faceMax = np.zeros((nFaces, 3), dtype=np.float32)
+        self._calcFaceBoxes()
+        centers = (self.faceMin + self.faceMax) / 2
+
+        # Split face ranges at the median of the longest axis of their centers,
+        # one level of the tree at a time
+        faceOrder = np.arange(nFaces, dtype=np.uint32)
+        leafStart = []
+        leafCount = []
+        parents = []
+        levels = []
+        level = [(0, nFaces, -1)]
+        while level:
+            levels.append(np.arange(len(parents), len(parents) + len(level), dtype=np.int32))
+            nextLevel = []
+            for start, end, parent in level:
+                node = len(parents)
+                parents.append(parent)
+                leafStart.append(start)
+                leafCount.append(end - start)
+                if end - start <= self.LEAF_SIZE:
+                    continue
+                faces = faceOrder[start:end]
+                faceCenters = centers[faces]
+                axis = np.argmax(faceCenters.max(axis=0) - faceCenters.min(axis=0))
+                half = (end - start) / 2
+                faceOrder[start:end] = faces[np.argpartition(faceCenters[:,axis], half)]
+                nextLevel.append((start, start + half, node))
+                nextLevel.append((start + half, end, node))
+            level = nextLevel
+
+        # Nodes are numbered breadth-first, so the children of internal nodes
+        # form consecutive pairs in the order of their parents
+        nNodes = len(parents)
+        self.parents = np.array(parents, dtype=np.int32)
+        self.children = -np.ones((nNodes, 2), dtype=np.int32)
+        internal = np.flatnonzero(self.parents >= 0)
+        firstChild = internal[::2]
+        self.children[self.parents[firstChild], 0] = firstChild
+        self.children[self.parents[firstChild], 1] = firstChild + 1
+        self.isLeaf = self.children[:,0] < 0
+        self.leafStart = np.array(leafStart, dtype=np.int32)
+        self.leafCount = np.array(leafCount, dtype=np.int32)
+        self.levels = levels
+        self.faceOrder = faceOrder
+
+        self.faceLeaf = np.zeros(nFaces, dtype=np.int32)
+        leaves = np.flatnonzero(self.isLeaf)
+        self.faceLeaf[faceOrder] = np.repeat(leaves, self.leafCount[leaves])
+
+        self.nodeMin = np.zeros((nNodes, 3), dtype=np.float32)
+        self.nodeMax = np.zeros((nNodes, 3), dtype=np.float32)
+        self._refitNodes(np.ones(nNodes, dtype=bool))
+        self._changed = False
+
+    def _refitNodes(self, dirty):
+        """
+        Recalculate the boxes of the dirty leaves from their faces, and of
+        their ancestors from their children, deepest level first.
+        """
+        leaves = np.flatnonzero(dirty & self.isLeaf)
+        if len(leaves):
+            starts = self.leafStart[leaves]
+            counts = self.leafCount[leaves]
+            # Faces of the dirty leaves, as consecutive runs
+            offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+            faces = self.faceOrder[np.arange(counts.sum()) + offsets]
+            runs = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            self.nodeMin[leaves] = np.minimum.reduceat(self.faceMin[faces], runs)
+            self.nodeMax[leaves] = np.maximum.reduceat(self.faceMax[faces], runs)
+
+        # Ancestors of dirty nodes are dirty
+        for level in reversed(self.levels[1:]):
+            nodes = level[dirty[level]]
+            dirty[self.parents[nodes]] = True
+        for level in reversed(self.levels):
+            nodes = level[dirty[level] & ~self.isLeaf[level]]
+            if len(nodes) == 0:
+                continue
+            left, right = self.children[nodes,0], self.children[nodes,1]
+            self.nodeMin[nodes] = np.minimum(self.nodeMin[left], self.nodeMin[right])
+            self.nodeMax[nodes] = np.maximum(self.nodeMax[left], self.nodeMax[right])
+
+    def refit(self):
+        """
+        Update the boxes for the vertices that changed since the last refit.
+        """
+        if self._changed is False:
+            return
+        if self._changed is True:
+            self._calcFaceBoxes()
+            dirty = np.ones(len(self.parents), dtype=bool)
+        else:
+            faces = self.mesh.getFacesForVertices(np.flatnonzero(self._changed))
+            self._calcFaceBoxes(faces)
+            dirty = np.zeros(len(self.parents), dtype=bool)
+            dirty[self.faceLeaf[faces]] = True
+        self._changed = False
+        self._refitNodes(dirty)
+
+    def _intersectBoxes(self, nodes, origin, invDirection):
+        """
+        Slab test of a ray against the boxes of nodes. Returns a mask of the
+        nodes hit.
+        """
+        with np.errstate(invalid='ignore'):
+            t0 = (self.nodeMin[nodes] - origin) * invDirection
+            t1 = (self.nodeMax[nodes] - origin) * invDirection
+        tNear = np.nanmax(np.minimum(t0, t1), axis=1)
+        tFar = np.nanmin(np.maximum(t0, t1), axis=1)
+        return (tNear <= tFar) & (tFar >= 0)
+
+    def getCandidateFaces(self, origin, direction):
+        """
+        Faces in the leaves whose boxes are hit by the ray. The tree is
+        traversed one level at a time.
+        """
+        with np.errstate(divide='ignore'):
+            invDirection = 1.0 / np.asarray(direction, dtype=np.float64)
+        origin = np.asarray(origin, dtype=np.float64)
+
+        leaves = []
+        nodes = np.zeros(1, dtype=np.int32)
+        while len(nodes):
+            nodes = nodes[self._intersectBoxes(nodes, origin, invDirection)]
+            leaf = self.isLeaf[nodes]
+            leaves.append(nodes[leaf])
+            nodes = self.children[nodes[~leaf]].reshape(-1)
+        leaves = np.concatenate(leaves)
+        if len(leaves) == 0:
+            return np.zeros(0, dtype=np.uint32)
+        counts = self.leafCount[leaves]
+        offsets = np.repeat(self.leafStart[leaves] - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+        return self.faceOrder[np.arange(counts.sum()) + offsets]
+
+    def intersect(self, origin, direction, cull = 0, faceMask = None):
+        """
+        Cast a ray, given by its origin and direction in object coordinates,
+        on the faces of the mesh.
+        Back faces are ignored if cull is positive, front faces if cull is
+        negative (see Object3D.cull). Only faces in faceMask are considered if
+        a mask is given.
+        Returns (face index, distance along the ray, hit point) of the nearest
+        hit, or None.
+        """
+        self.refit()
+        faces = self.getCandidateFaces(origin, direction)
+        if faceMask is not None:
+            faces = faces[faceMask[faces]]
+        if len(faces) == 0:
+            return None
+
+        # Quads are split in two triangles
+        fverts = self.fvert[faces]
+        triangles = [(faces, fverts[:,[0,1,2]])]
+        if fverts.shape[1] == 4:
+            triangles.append((faces, fverts[:,[0,2,3]]))
+        faces = np.concatenate([f for f, _ in triangles])
+        tverts = np.concatenate([t for _, t in triangles])
+
+        # Moller-Trumbore ray-triangle intersection
+        direction = np.asarray(direction, dtype=np.float64)
+        v0 = self.coord[tverts[:,0]].astype(np.float64)
+        edge1 = self.coord[tverts[:,1]] - v0
+        edge2 = self.coord[tverts[:,2]] - v0
+        pvec = np.cross(direction, edge2)
+        det = np.sum(edge1 * pvec, axis=1)
+        if cull > 0:
+            valid = det > 1e-12
+        elif cull < 0:
+            valid = det < -1e-12
+        else:
+            valid = np.abs(det) > 1e-12
+        invDet = 1.0 / np.where(valid, det, 1.0)
+        tvec = np.asarray(origin, dtype=np.float64) - v0
+        u = np.sum(tvec * pvec, axis=1) * invDet
+        qvec = np.cross(tvec, edge1)
+        v = np.dot(qvec, direction) * invDet
+        t = np.sum(edge2 * qvec, axis=1) * invDet
+        valid &= (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+        if not valid.any():
+            return None
+
+        hits = np.flatnonzero(valid)
+        nearest = hits[np.argmin(t[hits])]
+        point = np.asarray(origin, dtype=np.float64) + t[nearest] * direction
+        return faces[nearest], t[nearest], point
+
+
+def getRay(mesh, sx, sy, m = None):
+    """
+    The ray from the camera through screen position (sx, sy), in the object
+    coordinates of mesh, as (origin, direction). The ray starts at the near
+    plane (screen depth 0) and direction reaches the far plane (depth 1).
+    m is the matrix converting object to screen coordinates, as returned by
+    Camera.getConvertToScreenMatrix(mesh).
+    """
+    if m is None:
+        m = G.cameras[mesh.cameraMode].getConvertToScreenMatrix(mesh)
+    m = m.I
+    near = np.asarray(matrix.transform3(m, [sx, sy, 0.0]), dtype=np.float64)
+    far = np.asarray(matrix.transform3(m, [sx, sy, 1.0]), dtype=np.float64)
+    return near, far - near
+
+def pickMesh(mesh, sx, sy):
+    """
+    Cast a ray from the camera through screen position (sx, sy) on the visible
+    faces of mesh.
+    Returns (face index, hit point in object coordinates, screen depth) of
+    the nearest hit, or None.
+    """
+    bvh = mesh.getFaceBVH()
+    if bvh is None:
+        return None
+    camera = G.cameras[mesh.cameraMode]
+    m = camera.getConvertToScreenMatrix(mesh)
+    origin, direction = getRay(mesh, sx, sy, m)
+    hit = bvh.intersect(origin, direction, mesh.cull, mesh.face_mask)
+    if hit is None:
+        return None
+    face, t, point = hit
+    if t > 1.0:
+        # Beyond the far plane
+        return None
+    depth = matrix.transform3(m, point)[2]
+    return face, point, depth
+
+def pick(sx, sy, objects = None):
+    """
+    Pick the nearest visible and pickable mesh face at screen position
+    (sx, sy), from the meshes of objects (default all objects in the scene).
+    Returns (mesh, face group, face index, vertex index, hit point in object
+    coordinates) or None if nothing is hit. The vertex is the vertex of the
+    face closest to the hit point.
+    """
+    if objects is None:
+        objects = G.world
+
+    nearest = None
+    for obj in objects:
+        mesh = getattr(obj, 'parent', obj)
+        if not mesh.visibility or not mesh.pickable:
+            continue
+        if mesh.vertsPerPrimitive < 3:
+            continue
+        try:
+            hit = pickMesh(mesh, sx, sy)
+        except StandardError:
+            log.warning('Failed to pick mesh %s', mesh.name, exc_info=True)
+            continue
+        if hit is None:
+            continue
+        face, point, depth = hit
+        if nearest is None or depth < nearest[0]:
+            nearest = (depth, mesh, face, point)
+
+    if nearest is None:
+        return None
+    _, mesh, face, point = nearest
+    verts = mesh.fvert[face]
+    distances = np.sum((mesh.coord[verts] - point) ** 2, axis=1)
+    vert = verts[np.argmin(distances)]
+    group = mesh._faceGroups[mesh.group[face]]
+    return mesh, group, face, vert, point
+
+def getSelectedFaceGroupAndObject(sx, sy):
+    """
+    Same as selection.SelectionColorMap.getSelectedFaceGroupAndObject(), but
+    picking by casting a ray at screen position (sx, sy).
+    """
+    picked = pick(sx, sy)
+    if picked is None:
+        return None
+    mesh, group, _, _, _ = picked
+    return (group, mesh)
@@ -26,7 +26,7 @@ from core import G
 from getpath import getPath, getSysDataPath, getSysPath
 from makehuman import getVersion, getVersionStr, getBasemeshVersion, getShortVersion, isRelease, isBuild
 
-from glmodule import grabScreen, hasRenderSkin, renderSkin, getPickedColor, hasRenderToRenderbuffer, renderToBuffer, renderAlphaMask
+from glmodule import grabScreen, hasRenderSkin, renderSkin, getPickedColor, getMousePos, hasRenderToRenderbuffer, renderToBuffer, renderAlphaMask
 
 from image import Image
 from texture import Texture, getTexture, reloadTextures
@@ -24,12 +24,17 @@ TODO
 
 import os
 import zipfile
-from getpath import getSysDataPath, canonicalPath
+import cPickle as pickle
+from getpath import getSysDataPath, getPath, canonicalPath
 import log
 
 # TODO share with algos3d
 TARGETS_NPZ_PATH = getSysDataPath('targets.npz')
 
+# Version of the targets cache file, increase whenever Component or the cached
+# structures change
+CACHE_VERSION = 1
+
 # Defines reserved value keywords and which category they map to
 # Used for specifying dependencies between targets using their filename
 _cat_data = [
@@ -61,6 +66,12 @@ class Component(object):
     that.
     """
 
+    __slots__ = ['path', 'key', 'data', 'parent']
+
+    # Category tables, shared by all components
+    _categories = _categories
+    _value_cat = _value_cat
+
     def __init__(self, other = None):
         self.path = None
         if other is None:
@@ -69,14 +80,9 @@ class Component(object):
             self.parent = None
         else:
             self.key = other.key[:]
-            self.data = other.data.copy()
+            self.data = other.data
             self.parent = other
 
-        global _categories, _value_cat
-
-        self._categories = list(_categories)
-        self._value_cat = dict(_value_cat)
-
     def __repr__(self):
         return repr((self.key, self.data, self.path))
 
@@ -110,6 +116,7 @@ class Component(object):
         Finish component as a leaf in the tree (file).
         """
         self.path = path
+        self.data = self.data.copy()
         for category in self._categories:
             if category not in self.data:
                 self.data[category] = None
@@ -377,6 +384,11 @@ class Targets(object):
         return result
 
     def walk(self, dataPath):
+        cacheKey = self._getCacheKey(dataPath)
+        if cacheKey and self._loadCache(cacheKey):
+            log.debug("%s targets loaded from cache.", len(self.targets))
+            return
+
         try:
             # Load cached targets from .npz file
             log.debug("Attempting to load targets from NPZ file.")
@@ -396,9 +408,60 @@ class Targets(object):
         self.images = targetFinder.images
         self.index = targetFinder.index
 
+        if cacheKey:
+            self._saveCache(cacheKey)
+
+    def _getCacheKey(self, dataPath):
+        """
+        Returns the key identifying the version of the targets cache that
+        matches the targets in dataPath, or None if the targets cannot be
+        cached (individual .target files are not packed in targets.npz).
+        """
+        key = [CACHE_VERSION, canonicalPath(dataPath)]
+        for filename in ['targets.npz', 'images.list']:
+            path = os.path.join(dataPath, filename)
+            if not os.path.isfile(path):
+                return None
+            stat = os.stat(path)
+            key.extend([stat.st_mtime, stat.st_size])
+        return tuple(key)
+
+    def _loadCache(self, cacheKey):
+        """
+        Restore targets from the cache file. Returns True on success, False
+        if the cache file is missing or out of date.
+        """
+        try:
+            with open(getCachePath(), 'rb') as f:
+                if pickle.load(f) != cacheKey:
+                    log.debug("Targets cache out of date.")
+                    return False
+                self.targets, self.groups, self.images, self.index = pickle.load(f)
+            return True
+        except IOError:
+            return False
+        except StandardError:
+            log.debug("Failed to load targets cache.", exc_info=True)
+            return False
+
+    def _saveCache(self, cacheKey):
+        path = getCachePath()
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as f:
+                pickle.dump(cacheKey, f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump((self.targets, self.groups, self.images, self.index),
+                            f, pickle.HIGHEST_PROTOCOL)
+        except StandardError:
+            log.notice("Unable to save targets cache %s", path, exc_info=True)
+
 
 _targets = None
 
+def getCachePath():
+    return getPath(os.path.join('cache', 'targets.mhc'))
+
 def getTargets():
     global _targets
     if _targets is None:
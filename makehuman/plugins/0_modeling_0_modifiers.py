@@ -26,6 +26,7 @@ TODO
 import gui
 import gui3d
 import humanmodifier
+import modifierfeatures
 import modifierslider
 from core import G
 import log
@@ -89,11 +90,7 @@ class ModifierTaskView(gui3d.TaskView):
                 if macro:
                     tname, tvar, opts = template
                     resolveOptionsDict(opts, 'macro')
-                    if tname:
-                        groupName = base + "-" + tname
-                    else:
-                        groupName = base
-                    modifier = humanmodifier.MacroModifier(groupName, tvar)
+                    tvar, modifier = modifierfeatures.createModifier(base, template)
                     modifier.setHuman(G.app.selectedHuman)
                     self.modifiers[tvar] = modifier
                     tpath = '-'.join(template[1:-1])
@@ -118,12 +115,9 @@ class ModifierTaskView(gui3d.TaskView):
                             tlabel = tlabel[1:]
                         opts['label'] = ' '.join([word.capitalize() for word in tlabel])
 
-                    groupName = base
-                    name = tname
-                    modifier = humanmodifier.UniversalModifier(groupName, name, tleft, tright, centerExt=None)
+                    tpath, modifier = modifierfeatures.createModifier(base, template)
                     modifier.setHuman(G.app.selectedHuman)
 
-                    tpath = '-'.join(template[0:-1])
                     modifierName = tpath
                     clashIndex = 0
                     while modifierName in self.modifiers:
@@ -199,166 +193,7 @@ class ModifierTaskView(gui3d.TaskView):
 class FaceTaskView(ModifierTaskView):
     _name = 'Face'
     _group = 'face'
-    _features = [
-        ('head shape', 'head', [
-            ('head-age', 'less', 'more', {'cam' : 'frontView'}),
-            ('head-angle', 'in', 'out', {'cam' : 'rightView'}),
-            ('head-oval', {'cam' : 'frontView'}),
-            ('head-round', {'cam' : 'frontView'}),
-            ('head-rectangular', {'cam' : 'frontView'}),
-            ('head-square', {'cam' : 'frontView'}),
-            ('head-triangular', {'cam' : 'frontView'}),
-            ('head-invertedtriangular', {'cam' : 'frontView'}),
-            ('head-diamond', {'cam' : 'frontView'}),
-            ]),
-        ('head size', 'head', [
-            ('head-scale-depth', 'less', 'more', {'cam' : 'rightView'}),
-            ('head-scale-horiz', 'less', 'more', {'cam' : 'frontView'}),
-            ('head-scale-vert', 'more', 'less', {'cam' : 'frontView'}),
-            ('head-trans', 'in', 'out', {'cam' : 'frontView'}),
-            ('head-trans', 'down', 'up', {'cam' : 'frontView'}),
-            ('head-trans', 'forward', 'backward', {'cam' : 'rightView'}),
-            ]),
-        ('forehead', 'forehead', [
-            ('forehead-trans-depth', 'forward', 'backward', {'cam' : 'rightView'}),
-            ('forehead-scale-vert', 'less', 'more', {'cam' : 'rightView'}),
-            ('forehead-nubian', 'less', 'more', {'cam' : 'rightView'}),
-            ('forehead-temple', 'in', 'out', {'cam' : 'frontView'}),
-            ]),
-        ('eyebrows', 'eyebrows', [
-            ('eyebrows-trans-depth', 'less', 'more', {'cam' : 'rightView'}),
-            ('eyebrows-angle', 'up', 'down', {'cam' : 'frontView'}),
-            ('eyebrows-trans-vert', 'less', 'more', {'cam' : 'frontView'}),
-            ]),
-        ('neck', 'neck', [
-            ('neck-scale-depth', 'less', 'more', {'cam' : 'rightView'}),
-            ('neck-scale-horiz', 'less', 'more', {'cam' : 'frontView'}),
-            ('neck-scale-vert', 'more', 'less', {'cam' : 'frontView'}),
-            ('neck-trans-horiz', 'in', 'out', {'cam' : 'frontView'}),
-            ('neck-trans-vert', 'down', 'up', {'cam' : 'frontView'}),
-            ('neck-trans-depth', 'forward', 'backward', {'cam' : 'rightView'}),
-            ]),
-        ('right eye', 'eyes', [
-            ('r-eye-height1', 'min', 'max', {'cam' : 'frontView'}),
-            ('r-eye-height2', 'min', 'max', {'cam' : 'frontView'}),
-            ('r-eye-height3', 'min', 'max', {'cam' : 'frontView'}),
-            ('r-eye-push1', 'in', 'out', {'cam' : 'frontView'}),
-            ('r-eye-push2', 'in', 'out', {'cam' : 'frontView'}),
-            ('r-eye-move', 'in', 'out', {'cam' : 'frontView'}),
-            ('r-eye-move', 'up', 'down', {'cam' : 'frontView'}),
-            ('r-eye-size', 'small', 'big', {'cam' : 'frontView'}),
-            ('r-eye-corner1', 'up', 'down', {'cam' : 'frontView'}),
-            ('r-eye-corner2', 'up', 'down', {'cam' : 'frontView'})
-            ]),
-        ('left eye', 'eyes', [
-            ('l-eye-height1', 'min', 'max', {'cam' : 'frontView'}),
-            ('l-eye-height2', 'min', 'max', {'cam' : 'frontView'}),
-            ('l-eye-height3', 'min', 'max', {'cam' : 'frontView'}),
-            ('l-eye-push1', 'in', 'out', {'cam' : 'frontView'}),
-            ('l-eye-push2', 'in', 'out', {'cam' : 'frontView'}),
-            ('l-eye-move', 'in', 'out', {'cam' : 'frontView'}),
-            ('l-eye-move', 'up', 'down', {'cam' : 'frontView'}),
-            ('l-eye-size', 'small', 'big', {'cam' : 'frontView'}),
-            ('l-eye-corner1', 'up', 'down', {'cam' : 'frontView'}),
-            ('l-eye-corner2', 'up', 'down', {'cam' : 'frontView'}),
-            ]),        
-        ('nose size', 'nose', [
-            ('nose-trans-vert', 'up', 'down', {'cam' : 'frontView'}),
-            ('nose-trans-depth', 'forward', 'backward', {'cam' : 'rightView'}),
-            ('nose-trans-horiz', 'in', 'out', {'cam' : 'frontView'}),
-            ('nose-scale-vert', 'incr', 'decr', {'cam' : 'frontView'}),
-            ('nose-scale-horiz', 'incr', 'decr', {'cam' : 'frontView'}),
-            ('nose-scale-depth', 'incr', 'decr', {'cam' : 'rightView'}),
-            ]),
-        ('nose size details', 'nose', [
-            ('nose-nostril-width', 'min', 'max', {'cam' : 'frontView'}),
-            ('nose-point-width', 'less', 'more', {'cam' : 'frontView'}),
-            ('nose-height', 'min', 'max', {'cam' : 'rightView'}),
-            ('nose-width1', 'min', 'max', {'cam' : 'frontView'}),
-            ('nose-width2', 'min', 'max', {'cam' : 'frontView'}),
-            ('nose-width3', 'min', 'max', {'cam' : 'frontView'}),            
-            ]),
-        ('nose features', 'nose', [
-            ('nose-compression', 'compress', 'uncompress', {'cam' : 'rightView'}),
-            ('nose-curve', 'convex', 'concave', {'cam' : 'rightView'}),
-            ('nose-greek', 'moregreek', 'lessgreek', {'cam' : 'rightView'}),
-            ('nose-hump', 'morehump', 'lesshump', {'cam' : 'rightView'}),
-            ('nose-volume', 'potato', 'point', {'cam' : 'rightView'}),            
-            ('nose-nostrils-angle', 'up', 'down', {'cam' : 'rightView'}),
-            ('nose-point', 'up', 'down', {'cam' : 'rightView'}),
-            ('nose-septumangle', 'decr', 'incr', {'cam' : 'rightView'}),
-            ('nose-flaring', 'decr', 'incr', {'cam' : 'rightView'}),
-            ]),        
-        ('mouth size', 'mouth', [
-            ('mouth-scale-horiz', 'incr', 'decr', {'cam' : 'frontView'}),
-            ('mouth-scale-vert', 'incr', 'decr', {'cam' : 'frontView'}),
-            ('mouth-scale-depth', 'incr', 'decr', {'cam' : 'rightView'}),
-            ('mouth-trans', 'in', 'out', {'cam' : 'frontView'}),
-            ('mouth-trans', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-trans', 'forward', 'backward', {'cam' : 'rightView'}),
-            ]),
-        ('mouth size details', 'mouth', [
-            ('mouth-lowerlip-height', 'min', 'max', {'cam' : 'frontView'}),            
-            ('mouth-lowerlip-width', 'min', 'max', {'cam' : 'frontView'}),
-            ('mouth-upperlip-height', 'min', 'max', {'cam' : 'frontView'}),
-            ('mouth-upperlip-width', 'min', 'max', {'cam' : 'frontView'}),
-            ('mouth-cupidsbow-width', 'min', 'max', {'cam' : 'frontView'}),
-            ]),
-        ('mouth features', 'mouth', [
-            ('mouth-lowerlip-ext', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-angles', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-lowerlip-middle', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-lowerlip-volume', 'deflate', 'inflate', {'cam' : 'rightView'}),
-            ('mouth-philtrum-volume', 'increase', 'decrease', {'cam' : 'rightView'}),
-            ('mouth-upperlip-volume', 'deflate', 'inflate', {'cam' : 'rightView'}),
-            ('mouth-upperlip-ext', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-upperlip-middle', 'up', 'down', {'cam' : 'frontView'}),
-            ('mouth-cupidsbow', 'decr', 'incr', {'cam' : 'frontView'}),
-            ]),
-        ('right ear', 'ears', [
-            ('r-ear-trans-depth', 'backward', 'forward', {'cam' : 'rightView'}),
-            ('r-ear-size', 'big', 'small', {'cam' : 'rightView'}),
-            ('r-ear-trans-vert', 'down', 'up', {'cam' : 'rightView'}),
-            ('r-ear-height', 'min', 'max', {'cam' : 'rightView'}),
-            ('r-ear-lobe', 'min', 'max', {'cam' : 'rightView'}),
-            ('r-ear-shape1', 'pointed', 'triangle', {'cam' : 'rightView'}),
-            ('r-ear-rot', 'backward', 'forward', {'cam' : 'rightView'}),
-            ('r-ear-shape2', 'square', 'round', {'cam' : 'rightView'}),
-            ('r-ear-width', 'max', 'min', {'cam' : 'rightView'}),
-            ('r-ear-wing', 'out', 'in', {'cam' : 'frontView'}),
-            ('r-ear-flap', 'out', 'in', {'cam' : 'frontView'}),
-            ]),
-        ('left ear', 'ears', [
-            ('l-ear-trans-depth', 'backward', 'forward', {'cam' : 'leftView'}),
-            ('l-ear-size', 'big', 'small', {'cam' : 'leftView'}),
-            ('l-ear-trans-vert', 'down', 'up', {'cam' : 'leftView'}),
-            ('l-ear-height', 'min', 'max', {'cam' : 'leftView'}),
-            ('l-ear-lobe', 'min', 'max', {'cam' : 'leftView'}),
-            ('l-ear-shape1', 'pointed', 'triangle', {'cam' : 'leftView'}),
-            ('l-ear-rot', 'backward', 'forward', {'cam' : 'leftView'}),
-            ('l-ear-shape2', 'square', 'round', {'cam' : 'leftView'}),
-            ('l-ear-width', 'max', 'min', {'cam' : 'leftView'}),
-            ('l-ear-wing', 'out', 'in', {'cam' : 'frontView'}),
-            ('l-ear-flap', 'out', 'in', {'cam' : 'frontView'}),
-            ]),
-        ('chin', 'chin', [
-            ('chin-prominent', 'less', 'more', {'cam' : 'rightView'}),
-            ('chin-width', 'min', 'max', {'cam' : 'frontView'}),
-            ('chin-height', 'min', 'max', {'cam' : 'frontView'}),
-            ('chin-bones', 'in', 'out', {'cam' : 'frontView'}),
-            ('chin-prognathism', 'less', 'more', {'cam' : 'rightView'}),
-            ]),
-        ('cheek', 'cheek', [
-            ('l-cheek-volume', 'deflate', 'inflate', {'cam' : 'frontView'}),                      
-            ('l-cheek-bones', 'in', 'out', {'cam' : 'frontView'}),
-            ('l-cheek-inner', 'deflate', 'inflate', {'cam' : 'frontView'}),
-            ('l-cheek-trans-vert', 'down', 'up', {'cam' : 'frontView'}),   
-            ('r-cheek-volume', 'deflate', 'inflate', {'cam' : 'frontView'}),
-            ('r-cheek-bones', 'in', 'out', {'cam' : 'frontView'}),
-            ('r-cheek-inner', 'deflate', 'inflate', {'cam' : 'frontView'}),
-            ('r-cheek-trans-vert', 'down', 'up', {'cam' : 'frontView'}),
-            ]),
-        ]
+    _features = modifierfeatures.FACE
 
     def setCamera(self):
         G.app.setFaceCamera()
@@ -366,138 +201,24 @@ class FaceTaskView(ModifierTaskView):
 class TorsoTaskView(ModifierTaskView):
     _name = 'Torso'
     _group = 'torso'
-    _features = [
-        ('Torso', 'torso', [
-            ('torso-scale-depth', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('torso-scale-horiz', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('torso-scale-vert', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('torso-trans', 'in', 'out', {'cam' : 'setGlobalCamera'}),
-            ('torso-trans', 'down', 'up', {'cam' : 'setGlobalCamera'}),
-            ('torso-trans', 'forward', 'backward', {'cam' : 'setGlobalCamera'}),
-            ('torso-vshape', 'less', 'more', {'cam' : 'setGlobalCamera'}),
-            ]),
-        ('Hip', 'hip', [
-            ('hip-scale-depth', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('hip-scale-horiz', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('hip-scale-vert', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('hip-trans', 'in', 'out', {'cam' : 'setGlobalCamera'}),
-            ('hip-trans', 'down', 'up', {'cam' : 'setGlobalCamera'}),
-            ('hip-trans', 'forward', 'backward', {'cam' : 'setGlobalCamera'}),
-            ]),
-        ('Stomach', 'stomach', [
-            ('stomach-tone', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ('stomach-pregnant', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ]),
-        ('Buttocks', 'buttocks', [
-            ('buttocks-volume', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ]),
-        ('Pelvis', 'pelvis', [
-            ('pelvis-tone', 'decr', 'incr', {'cam' : 'setGlobalCamera'}),
-            ])
-        ]
+    _features = modifierfeatures.TORSO
 
 class ArmsLegsTaskView(ModifierTaskView):
     _name = 'Arms and Legs'
     _group = 'armslegs'
-    _features = [
-        ('right hand', 'armslegs', [   
-            ('r-hand-fingers-diameter', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),
-            ('r-hand-fingers-length', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}), 
-            ('r-hand-scale', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),       
-            ('r-hand-trans', 'in', 'out', {'cam' : 'setRightHandFrontCamera'}),            
-            ]),
-        ('left hand', 'armslegs', [  
-            ('l-hand-fingers-diameter', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),
-            ('l-hand-fingers-length', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}), 
-            ('l-hand-scale', 'decr', 'incr', {'cam' : 'setRightHandFrontCamera'}),              
-            ('l-hand-trans', 'in', 'out', {'cam' : 'setLeftHandFrontCamera'}),            
-            ]),
-        ('right foot', 'armslegs', [
-            ('r-foot-scale', 'decr', 'incr', {'cam' : 'setRightFootRightCamera'}),            
-            ('r-foot-trans', 'in', 'out', {'cam' : 'setRightFootFrontCamera'}),
-            ('r-foot-trans', 'down', 'up', {'cam' : 'setRightFootFrontCamera'}),
-            ('r-foot-trans', 'forward', 'backward', {'cam' : 'setRightFootRightCamera'}),
-            ]),
-        ('left foot', 'armslegs', [
-            ('l-foot-scale', 'decr', 'incr', {'cam' : 'setLeftFootLeftCamera'}),             
-            ('l-foot-trans', 'in', 'out', {'cam' : 'setLeftFootFrontCamera'}),
-            ('l-foot-trans', 'down', 'up', {'cam' : 'setLeftFootFrontCamera'}),
-            ('l-foot-trans', 'forward', 'backward', {'cam' : 'setLeftFootLeftCamera'}),
-            ]),
-        ('right arm', 'armslegs', [
-            ('r-lowerarm-scale-depth', 'decr', 'incr', {'cam' : 'setRightArmTopCamera'}),
-            ('r-lowerarm-scale-horiz', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
-            ('r-lowerarm-scale-vert', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
-            ('r-upperarm-scale-depth', 'decr', 'incr', {'cam' : 'setRightArmTopCamera'}),
-            ('r-upperarm-scale-horiz', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
-            ('r-upperarm-scale-vert', 'decr', 'incr', {'cam' : 'setRightArmFrontCamera'}),
-            ]),
-        ('left arm', 'armslegs', [
-            ('l-lowerarm-scale-depth', 'decr', 'incr', {'cam' : 'setLeftArmTopCamera'}),
-            ('l-lowerarm-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
-            ('l-lowerarm-scale-vert', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
-            ('l-upperarm-scale-depth', 'decr', 'incr', {'cam' : 'setLeftArmTopCamera'}),
-            ('l-upperarm-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
-            ('l-upperarm-scale-vert', 'decr', 'incr', {'cam' : 'setLeftArmFrontCamera'}),
-            ]),  
-        ('right leg', 'armslegs', [
-            ('r-leg-genu', 'varun', 'valgus', {'cam' : 'setRightLegRightCamera'}),
-            ('r-lowerleg-scale-depth', 'decr', 'incr', {'cam' : 'setRightLegRightCamera'}),
-            ('r-lowerleg-scale-horiz', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
-            ('r-lowerleg-scale-vert', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),            
-            ('r-upperleg-scale-depth', 'decr', 'incr', {'cam' : 'setRightLegRightCamera'}),
-            ('r-upperleg-scale-horiz', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),
-            ('r-upperleg-scale-vert', 'decr', 'incr', {'cam' : 'setRightLegFrontCamera'}),            
-            ]),      
-        ('left leg', 'armslegs', [
-            ('l-leg-genu', 'varun', 'valgus', {'cam' : 'setLeftLegLeftCamera'}),
-            ('l-lowerleg-scale-depth', 'decr', 'incr', {'cam' : 'setLeftLegLeftCamera'}),
-            ('l-lowerleg-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
-            ('l-lowerleg-scale-vert', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),            
-            ('l-upperleg-scale-depth', 'decr', 'incr', {'cam' : 'setLeftLegLeftCamera'}),
-            ('l-upperleg-scale-horiz', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),
-            ('l-upperleg-scale-vert', 'decr', 'incr', {'cam' : 'setLeftLegFrontCamera'}),            
-            ])       
-        ]
+    _features = modifierfeatures.ARMSLEGS
 
 class GenderTaskView(ModifierTaskView):
     _name = 'Gender'
     _group = 'gendered'
-    _features = [
-        ('Breast', 'breast', [
-            (None, 'BreastSize', {'label' : 'Breast size'}),
-            (None, 'BreastFirmness', {'label' : 'Breast firmness'}),
-            ('breast-trans-vert', 'down', 'up', {'label':'Vertical position'}),
-            ('breast-dist', 'min', 'max', {'label':'Horizontal distance'}),
-            ('breast-point', 'min', 'max', {'label':'Pointiness'}),
-            ('breast-volume-vert', 'up', 'down', {'label':'Volume'}),
-            ]),
-        ('Genitals', 'genitals', [
-            ('penis-length', 'min', 'max', {}),
-            ('penis-circ', 'min', 'max', {}),
-            ('penis-testicles', 'min', 'max', {}),
-            ('penis-bulgeeffect', 'one', 'two', {}),
-            ]),
-        ]
+    _features = modifierfeatures.GENDERED
 
 class MacroTaskView(ModifierTaskView):
     _name = 'Macro modelling'
     _group = 'macro'
     _label = 'Main'
 
-    _features = [
-        ('Macro', 'macrodetails', [
-            (None, 'Gender', {'label' : 'Gender'}),
-            (None, 'Age', {'label' : 'Age'}),
-            ('universal', 'Muscle', {'label' : 'Muscle'}),
-            ('universal', 'Weight', {'label' : 'Weight'}),
-            ('height', 'Height', {'label' : 'Height'}),
-            ('proportions', 'BodyProportions', {'label' : 'Proportions'}),
-            (None, 'African', {'label' : 'African'}),
-            (None, 'Asian', {'label' : 'Asian'}),
-            (None, 'Caucasian', {'label' : 'Caucasian'}),
-            ]),
-        ]
+    _features = modifierfeatures.MACRO
 
     def __init__(self, category):
         super(MacroTaskView, self).__init__(category)
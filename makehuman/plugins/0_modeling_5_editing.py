@@ -34,6 +34,7 @@ import log
 import module3d
 import algos3d
 import matrix
+from getpath import canonicalPath
 
 class EditTarget(algos3d.Target):
     _count = 0
@@ -53,11 +54,11 @@ class EditTarget(algos3d.Target):
             cls._count += 1
 
     def __init__(self, obj, verts, coords):
-        self.name = self.getName()
+        self.name = canonicalPath(self.getName())
         self.morphFactor = -1
         self.verts = verts.copy()
         self.data = coords.copy()
-        self.faces = obj.getFacesForVertices(self.verts)
+        self._obj = obj
 
 class EditAction(gui3d.Action):
     def __init__(self, human, targets, value, update=True):
@@ -102,6 +103,7 @@ class EditingTaskView(gui3d.TaskView):
         self.verts = None
         self.faces = None
         self.smoothed = None
+        self.editTargets = []
 
         self.converter = ValueConverter()
         value = self.converter.displayToData(self.radius)
@@ -278,6 +280,7 @@ class EditingTaskView(gui3d.TaskView):
             coord = self.original + delta[None,:] * self.weights[:,None]
 
         human.meshData.changeCoords(coord, self.verts)
+        human.invalidateAppliedTargets()
         human.meshData.calcNormals(True, True, self.verts, self.faces)
         human.meshData.update()
         mh.redraw()
@@ -289,7 +292,11 @@ class EditingTaskView(gui3d.TaskView):
         human = gui3d.app.selectedHuman
         morph = EditTarget(human.meshData, self.verts,
                            human.meshData.coord[self.verts] - self.original)
+        # Edits only exist in memory until the human is reset, they must not
+        # be evicted from the target buffer
+        algos3d.pinTarget(morph.name)
         algos3d._targetBuffer[morph.name] = morph
+        self.editTargets.append(morph.name)
         morph._save_binary(morph.name)
         gui3d.app.do(EditAction(human, [morph.name], 1.0))
 
@@ -304,6 +311,13 @@ class EditingTaskView(gui3d.TaskView):
         self.faces = None
         self.smoothed = None
 
+    def onHumanChanged(self, event):
+        if event.change == 'reset':
+            # The edits are discarded with the reset human
+            for name in self.editTargets:
+                algos3d.unpinTarget(name)
+            self.editTargets = []
+
     def onMouseWheel(self, event):
         value = self.radiusSlider.getValue()
         value += 0.1 * event.wheelDelta
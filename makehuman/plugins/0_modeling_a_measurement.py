@@ -32,6 +32,7 @@ import modifierslider
 import mh
 import gui
 import log
+from measure import Ruler
 
 class MeasurementValueConverter(object):
 
@@ -318,17 +319,20 @@ class MeasureTaskView(gui3d.TaskView):
         else:
             height = '%.2f in' % (height * 0.393700787)
 
+        measures = self.ruler.getMeasures(human, gui3d.app.settings['units'])
+
         self.height.setTextFormat('Height: %s', height)
-        self.chest.setTextFormat('Chest: %s', self.getMeasure('bust'))
-        self.waist.setTextFormat('Waist: %s', self.getMeasure('waist'))
-        self.hips.setTextFormat('Hips: %s', self.getMeasure('hips'))
+        self.chest.setTextFormat('Chest: %s', measures['bust'])
+        self.waist.setTextFormat('Waist: %s', measures['waist'])
+        self.hips.setTextFormat('Hips: %s', measures['hips'])
 
     def syncBraSizes(self):
 
         human = gui3d.app.selectedHuman
 
-        bust = self.ruler.getMeasure(human, 'bust', 'metric')
-        underbust = self.ruler.getMeasure(human, 'underbust', 'metric')
+        measures = self.ruler.getMeasures(human, 'metric')
+        bust = measures['bust']
+        underbust = measures['underbust']
 
         eucups = ['AA', 'A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K']
 
@@ -407,49 +411,3 @@ def load(app):
 
 def unload(app):
     pass
-
-class Ruler:
-
-    """
-  This class contains ...
-  """
-
-    def __init__(self):
-
-    # these are tables of vertex indices for each body measurement of interest
-
-        self.Measures = {}
-        self.Measures['thighcirc'] = [11071,11080,11081,11086,11076,11077,11074,11075,11072,11073,11069,11070,11087,11085,11084,12994,11083,11082,11079,11071]
-        self.Measures['neckcirc'] = [7514,10358,7631,7496,7488,7489,7474,7475,7531,7537,7543,7549,7555,7561,7743,7722,856,1030,1051,850,844,838,832,826,820,756,755,770,769,777,929,3690,804,800,808,801,799,803,7513,7515,7521,7514]
-        self.Measures['neckheight'] = [853,854,855,856,857,858,1496,1491]
-        
-        self.Measures['upperarm']=[8383,8393,8392,8391,8390,8394,8395,8399,10455,10516,8396,8397,8398,8388,8387,8386,10431,8385,8384,8389]
-        self.Measures['wrist']=[10208,10211,10212,10216,10471,10533,10213,10214,10215,10205,10204,10203,10437,10202,10201,10206,10200,10210,10209,10208]
-        self.Measures['frontchest']=[1437,8125]
-        self.Measures['bust']=[8471,8439,8455,8462,8446,8478,8494,8557,8510,8526,8542,10720,10601,10603,10602,10612,10611,10610,10613,10604,10605,10606,3942,3941,3940,3950,3947,3948,3949,3938,3939,3937,4065,1870,1854,1838,1885,1822,1806,1774,1790,1783,1767,1799,]
-        self.Measures['napetowaist']=[1491,4181]
-        self.Measures['waisttohip']=[4121,4341]
-        self.Measures['shoulder'] = [7478,8274]
-        self.Measures['underbust'] = [4088,10750,10744,10724,10725,10748,10722,10640,10642,10641,10651,10650,10649,10652,10643,10644,10645,10646,10647,10648,3988,3987,3986,3985,3984,3983,3982,3992,3989,3990,3991,3980,3981,3979,4067,4098,4073,4072,4094,4100,4082,4088]
-        self.Measures['waist'] = [4121,10760,10757,10777,10776,10779,10780,10778,10781,10771,10773,10772,10775,10774,10814,10834,10816,10817,10818,10819,10820,10821,4181,4180,4179,4178,4177,4176,4175,4196,4173,4131,4132,4129,4130,4128,4138,4135,4137,4136,4133,4134,4108,4113,4118,4121]
-        self.Measures['upperlegheight'] = [10970,11230]
-        self.Measures['lowerlegheight'] = [11225,12820]
-        self.Measures['calf'] = [11339,11336,11353,11351,11350,13008,11349,11348,11345,11337,11344,11346,11347,11352,11342,11343,11340,11341,11338,11339]
-        self.Measures['ankle'] = [11460,11464,11458,11459,11419,11418,12958,12965,12960,12963,12961,12962,12964,12927,13028,12957,11463,11461,11457,11460]
-        self.Measures['upperarmlenght'] = [8274,10037]
-        self.Measures['lowerarmlenght'] = [10040,10548]
-        self.Measures['hips'] = [4341,10968,10969,10971,10970,10967,10928,10927,10925,10926,10923,10924,10868,10875,10861,10862,4228,4227,4226,4242,4234,4294,4293,4296,4295,4297,4298,4342,4345,4346,4344,4343,4361,4341]
-                                            
-
-    def getMeasure(self, human, measurementname, mode):
-        measure = 0
-        vindex1 = self.Measures[measurementname][0]
-        for vindex2 in self.Measures[measurementname]:
-            vec = human.meshData.coord[vindex1] - human.meshData.coord[vindex2]
-            measure += math.sqrt(vec.dot(vec))
-            vindex1 = vindex2
-
-        if mode == 'metric':
-            return 10.0 * measure
-        else:
-            return 10.0 * measure * 0.393700787
@@ -30,10 +30,12 @@ import gui
 import log
 
 import os
+import hashlib
 import numpy as np
 
 import bvh
 import skeleton
+import animation
 import filechooser
 
 _jointMappingCache = {}
@@ -670,7 +672,122 @@ def getAnimationTrackName(collectionUuid, animationName):
 
 def loadAnimationTrack(anim):
     """
-    Load animation from a BVH file specified by anim.
+    Load animation from a BVH file specified by anim, or from the animation
+    cache if the BVH file was loaded for the same skeleton before.
+    """
+    human = gui3d.app.selectedHuman
+    skel = human.getSkeleton()
+
+    cachePath = getAnimationCachePath(anim, skel)
+    cacheKey = getAnimationCacheKey(anim, skel)
+    animTrack = loadCachedAnimationTrack(anim, skel, cachePath, cacheKey)
+    if animTrack is None:
+        animTrack = loadBVHAnimationTrack(anim)
+        if not animTrack:
+            return None
+        try:
+            saveCachedAnimationTrack(animTrack, skel, cachePath, cacheKey)
+        except StandardError:
+            log.notice('Unable to save animation cache %s', cachePath, exc_info=True)
+
+    log.debug("Created animation track for %s rig.", skel.name)
+    log.debug("Frames: %s", animTrack.nFrames)
+    log.debug("Playtime: %s", animTrack.getPlaytime())
+
+    # Playback and scrubbing only need a lookup of the skinning matrices
+    animTrack.bakeSkinning = True
+
+    return animTrack
+
+ANIMATION_CACHE_VERSION = 2
+
+def getAnimationCachePath(anim, skel):
+    """
+    Path of the animation cache file for the motion of anim mapped to the
+    skeleton skel.
+    """
+    name = hashlib.md5(os.path.abspath(anim.getPath()) + "|" + skel.name).hexdigest()
+    return mh.getPath(os.path.join('cache', 'animations', name + '.npz'))
+
+def getRetargetMappingPath(skelName):
+    return mh.getSysPath("tools/blender26x/mh_mocap_tool/target_rigs/%s.trg") % skelName
+
+def getSourceRigPath(anim):
+    return os.path.join(mh.getSysDataPath('rigs'), '%s.rig' % anim.collection.rig)
+
+def getAnimationCacheKey(anim, skel):
+    """
+    Identifies everything the animation track of anim depends on: the BVH
+    file, its load options and the skeleton. Motions that are retargeted to
+    another rig also depend on the rest pose of the skeleton, the retarget
+    mapping file and the rig of the motion. The joint hierarchy of the
+    skeleton is stored in the cache file itself (see getSkeletonHierarchy).
+    """
+    def fileKey(path):
+        if os.path.isfile(path):
+            return "%s %r" % (os.path.abspath(path), os.path.getmtime(path))
+        return os.path.abspath(path)
+
+    key = [str(ANIMATION_CACHE_VERSION), fileKey(anim.getPath()),
+           repr(anim.collection.scale), " ".join(anim.options), skel.name]
+    if skel.name != anim.collection.rig:
+        key.append(hashlib.md5(skel.restGlobalMats.tostring()).hexdigest())
+        key.append(fileKey(getRetargetMappingPath(skel.name)))
+        key.append(fileKey(getSourceRigPath(anim)))
+    return "\n".join(key)
+
+def getSkeletonHierarchy(skel):
+    """
+    The joint names of skel and the index of the parent of each joint (-1 for
+    the root), in the order of the rows of its animation tracks.
+    """
+    bones = skel.getBones()
+    joints = np.array([bone.name for bone in bones])
+    parents = np.array([bone.parent.index if bone.parent else -1 for bone in bones], dtype=np.int32)
+    return joints, parents
+
+def loadCachedAnimationTrack(anim, skel, cachePath, cacheKey):
+    """
+    Load an animation track from the animation cache. Returns None if it
+    is missing, out of date or was mapped to another joint hierarchy.
+    """
+    if not os.path.isfile(cachePath):
+        return None
+    try:
+        with np.load(cachePath) as npzfile:
+            if str(npzfile['key']) != cacheKey:
+                log.debug('Animation cache %s is out of date', cachePath)
+                return None
+            joints, parents = getSkeletonHierarchy(skel)
+            if not (np.array_equal(npzfile['joints'], joints) and
+                    np.array_equal(npzfile['parents'], parents)):
+                log.debug('Animation cache %s is for another joint hierarchy', cachePath)
+                return None
+            log.debug('Loading animation %s from cache %s', anim.getPath(), cachePath)
+            return animation.AnimationTrack(anim.getAnimationTrackName(), npzfile['data'],
+                                            int(npzfile['nFrames']), float(npzfile['frameRate']))
+    except StandardError:
+        log.notice('Unable to load animation cache %s', cachePath, exc_info=True)
+        return None
+
+def saveCachedAnimationTrack(animTrack, skel, cachePath, cacheKey):
+    """
+    Save an animation track mapped to skel to the (compressed) animation
+    cache, together with the joint hierarchy of skel.
+    """
+    cacheDir = os.path.dirname(cachePath)
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir)
+    joints, parents = getSkeletonHierarchy(skel)
+    with open(cachePath, 'wb') as f:
+        np.savez_compressed(f, key = np.array(cacheKey), data = animTrack.data,
+                            nFrames = np.array(animTrack.nFrames), frameRate = np.array(animTrack.frameRate),
+                            joints = joints, parents = parents)
+
+def loadBVHAnimationTrack(anim):
+    """
+    Load animation from a BVH file specified by anim, mapping it to the
+    skeleton of the human.
     """
     global _jointMappingCache
 
@@ -704,7 +821,7 @@ def loadAnimationTrack(anim):
     else:
         # Skeleton and joint rig in BVH are not the same, retarget/remap
         # the motion data:
-        if not os.path.isfile(mh.getSysPath("tools/blender26x/mh_mocap_tool/target_rigs/%s.trg") % human.getSkeleton().name):
+        if not os.path.isfile(getRetargetMappingPath(human.getSkeleton().name)):
             gui3d.app.statusPersist("Cannot apply motion on the selected skeleton %s because there is no target mapping file for it.", human.getSkeleton().name)
             return None
 
@@ -715,7 +832,7 @@ def loadAnimationTrack(anim):
             jointToBoneMap = _jointMappingCache[cacheName]
         else:
             # Create and cache mapping
-            srcSkel, _ = skeleton.loadRig(os.path.join(mh.getSysDataPath('rigs'), '%s.rig' % anim.collection.rig), human.meshData)
+            srcSkel, _ = skeleton.loadRig(getSourceRigPath(anim), human.meshData)
             tgtSkel = human.getSkeleton()
             # Load mapping from reference rig to target rig
             # TODO this only works if anim.collection.rig == soft1! We cannot do reverse target mappings
@@ -728,9 +845,5 @@ def loadAnimationTrack(anim):
         animTrack = bvhRig.createAnimationTrack(jointToBoneMap, anim.getAnimationTrackName())
         gui3d.app.statusPersist("")
 
-    log.debug("Created animation track for %s rig.", human.getSkeleton().name)
-    log.debug("Frames: %s", animTrack.nFrames)
-    log.debug("Playtime: %s", animTrack.getPlaytime())
-
     return animTrack
 
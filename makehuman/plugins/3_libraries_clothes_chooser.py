@@ -120,16 +120,14 @@ class ClothesTaskView(proxychooser.ProxyChooserTaskView):
             obj = human.clothesObjs[uuid]
 
             # Convert basemesh vertex mask to local mask for proxy vertices
-            proxyVertMask = np.ones(len(proxy.refVerts), dtype=bool)
-            for idx,vs in enumerate(proxy.refVerts):
-                # Body verts to which proxy vertex with idx is mapped
-                (v1,v2,v3) = vs.getHumanVerts()
-                # Hide proxy vert if any of its referenced body verts are hidden (most agressive)
-                #proxyVertMask[idx] = vertsMask[v1] and vertsMask[v2] and vertsMask[v3]
-                # Alternative1: only hide if at least two referenced body verts are hidden (best result)
-                proxyVertMask[idx] = np.count_nonzero(vertsMask[[v1, v2, v3]]) > 1
-                # Alternative2: Only hide proxy vert if all of its referenced body verts are hidden (least agressive)
-                #proxyVertMask[idx] = vertsMask[v1] or vertsMask[v2] or vertsMask[v3]
+            # Body verts to which the proxy vertices are mapped
+            refVertsMask = vertsMask[proxy.ref_vIdxs]
+            # Hide proxy vert if any of its referenced body verts are hidden (most agressive)
+            #proxyVertMask = refVertsMask.all(axis=1)
+            # Alternative1: only hide if at least two referenced body verts are hidden (best result)
+            proxyVertMask = refVertsMask.sum(axis=1) > 1
+            # Alternative2: Only hide proxy vert if all of its referenced body verts are hidden (least agressive)
+            #proxyVertMask = refVertsMask.any(axis=1)
 
             proxyKeepVerts = np.argwhere(proxyVertMask)[...,0]
             proxyFaceMask = obj.mesh.getFaceMaskForVertices(proxyKeepVerts)
@@ -26,6 +26,7 @@ import os
 import mh
 import gui3d
 import gui
+import algos3d
 import log
 
 class ThemeRadioButton(gui.RadioButton):
@@ -76,6 +77,10 @@ class SettingsTaskView(gui3d.TaskView):
             gui3d.app.settings.get('cameraAutoZoom', False)))
         self.sliderImages = sliderBox.addWidget(gui.CheckBox("Slider images",
             gui3d.app.settings.get('sliderImages', True)))
+        self.batchMorphing = sliderBox.addWidget(gui.CheckBox("Batch target morphing",
+            gui3d.app.settings.get('batchMorphing', False)))
+        self.cpuPicking = sliderBox.addWidget(gui.CheckBox("CPU picking",
+            gui3d.app.settings.get('cpuPicking', False)))
             
         modes = [] 
         unitBox = self.unitsBox = self.addLeftWidget(gui.GroupBox('Units'))
@@ -88,6 +93,10 @@ class SettingsTaskView(gui3d.TaskView):
         self.saveScreenSize = startupBox.addWidget(gui.CheckBox("Restore window size",
             gui3d.app.settings.get('restoreWindowSize', False)))
         
+        memoryBox = self.addLeftWidget(gui.SliderBox('Memory'))
+        self.targetCacheSize = memoryBox.addWidget(gui.Slider(gui3d.app.settings.get('targetCacheSize', 0), 0, 2048,
+            "Target cache (MB, 0 = unlimited): %d"))
+
         themes = []
         themesBox = self.themesBox = self.addRightWidget(gui.GroupBox('Theme'))
         self.themeNative = themesBox.addWidget(ThemeRadioButton(themes, "Native look", "default"))
@@ -132,6 +141,15 @@ class SettingsTaskView(gui3d.TaskView):
             gui.Slider.showImages(self.sliderImages.selected)
             mh.refreshLayout()
 
+        @self.batchMorphing.mhEvent
+        def onClicked(event):
+            gui3d.app.settings['batchMorphing'] = self.batchMorphing.selected
+            gui3d.app.selectedHuman.useTargetMatrix = self.batchMorphing.selected
+
+        @self.cpuPicking.mhEvent
+        def onClicked(event):
+            gui3d.app.settings['cpuPicking'] = self.cpuPicking.selected
+
         @metric.mhEvent
         def onClicked(event):
             gui3d.app.settings['units'] = 'metric'
@@ -150,6 +168,11 @@ class SettingsTaskView(gui3d.TaskView):
         def onClicked(event):
             gui3d.app.settings['restoreWindowSize'] = self.saveScreenSize.selected
 
+        @self.targetCacheSize.mhEvent
+        def onChange(value):
+            gui3d.app.settings['targetCacheSize'] = value
+            algos3d.setTargetBufferBudget(value * 1024 * 1024)
+
     def onShow(self, event):
         gui3d.TaskView.onShow(self, event)
     
@@ -63,6 +63,10 @@ class TargetsTaskView(gui3d.TaskView):
         self.targets = self.addTopWidget(TargetsTree())
         self.clear = self.addLeftWidget(gui.Button('Clear'))
 
+        cacheBox = self.addLeftWidget(gui.GroupBox('Target cache'))
+        self.cacheStats = cacheBox.addWidget(gui.TextView(''))
+        self.refresh = cacheBox.addWidget(gui.Button('Refresh'))
+
         @self.targets.mhEvent
         def onActivate(item):
             path = self.targets.getItemPath(item)
@@ -79,6 +83,31 @@ class TargetsTaskView(gui3d.TaskView):
             self.clearColor()
             mh.changeCategory('Modelling')
 
+        @self.refresh.mhEvent
+        def onClicked(event):
+            self.updateCacheStats()
+
+    def onShow(self, event):
+        gui3d.TaskView.onShow(self, event)
+        self.updateCacheStats()
+
+    def updateCacheStats(self):
+        stats = algos3d.getTargetBufferStats()
+        lookups = stats['hits'] + stats['misses']
+        if stats['budget']:
+            budget = '%.1f MB' % (stats['budget'] / 1048576.0)
+        else:
+            budget = 'unlimited'
+        self.cacheStats.setText(
+            'Targets: %d (%d pinned)\n'
+            'Memory: %.1f MB of %s\n'
+            'Hits: %d of %d lookups (%.0f%%)\n'
+            'Evictions: %d' % (
+            stats['targets'], stats['pinned'],
+            stats['bytes'] / 1048576.0, budget,
+            stats['hits'], lookups, 100.0 * stats['hits'] / lookups if lookups else 0.0,
+            stats['evictions']))
+
     def clearColor(self):
         mesh = G.app.selectedHuman.meshData
         mesh.color[...] = (255,255,255,255)
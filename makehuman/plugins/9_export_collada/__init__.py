@@ -22,7 +22,6 @@ Abstract
 TODO
 """
 
-import gui
 from export import Exporter
 from exportutils.config import Config
 
@@ -73,6 +72,8 @@ class ExporterCollada(Exporter):
         self.orderPriority = 70.0
 
     def build(self, options, taskview):
+        import gui
+
         Exporter.build(self, options, taskview)
         #self.expressions     = options.addWidget(gui.CheckBox("Expressions", False))
         #self.useCustomTargets = options.addWidget(gui.CheckBox("Custom targets", False))
@@ -27,7 +27,6 @@ from .dae_node import goodBoneName
 from progress import Progress
 
 import math
-import log
 import numpy as np
 import numpy.linalg as la
 import transformations as tm
@@ -57,19 +56,12 @@ def writeSkinController(fp, rmesh, amt, config):
     nVerts = len(rmesh.getCoord())
     nBones = len(amt.bones)
 
-    skinWeights = []
-    vertexWeights = [list() for _ in xrange(nVerts)]
-    wn = 0
-    for bn,bname in enumerate(amt.bones):
-        try:
-            wts = rmesh.weights[bname]
-        except KeyError:
-            wts = []
-        log.debug("W %d %s %s" % (bn,bname,wts))
-        skinWeights += wts
-        for (vn,_w) in wts:
-            vertexWeights[int(vn)].append((bn,wn))
-            wn += 1
+    # Weights of all bones in bone order, and the (bone, weight) index pairs
+    # of each vertex
+    weights = rmesh.weights.select(amt.bones.keys())
+    _,_,_,skinWeights = weights.compile()
+    vcount,entries = weights.getVertexView(nVerts)
+    pairs = np.column_stack((weights.getGroupIndices()[entries], entries))
     nSkinWeights = len(skinWeights)
 
     progress(0.1, 0.2)
@@ -103,7 +95,7 @@ def writeSkinController(fp, rmesh, amt, config):
         '          <float_array count="%d" id="%s-skin-weights-array">\n' % (nSkinWeights,rmesh.name) +
         '           ')
 
-    fp.write(''.join(' %s' % w[1] for w in skinWeights))
+    fp.write(''.join(' %s' % w for w in skinWeights.astype(str).tolist()))
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -145,7 +137,7 @@ def writeSkinController(fp, rmesh, amt, config):
         '          <vcount>\n' +
         '            ')
 
-    fp.write(''.join(['%d ' % len(wts) for wts in vertexWeights]))
+    fp.write(''.join(['%d ' % n for n in vcount.tolist()]))
 
     progress(0.8, 0.99)
     fp.write('\n' +
@@ -153,8 +145,7 @@ def writeSkinController(fp, rmesh, amt, config):
         '          <v>\n' +
         '           ')
 
-    for wts in vertexWeights:
-        fp.write(''.join([' %d %d' % pair for pair in wts]))
+    fp.write(''.join([' %d' % n for n in pairs.ravel().tolist()]))
 
     fp.write('\n' +
         '          </v>\n' +
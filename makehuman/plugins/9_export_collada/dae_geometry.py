@@ -23,10 +23,10 @@ Geometry export
 
 """
 
-import math
 import numpy as np
 import log
 from progress import Progress
+from exportutils.arraytext import writeRows
 
 #----------------------------------------------------------------------
 #   library_geometry
@@ -43,15 +43,16 @@ def writeLibraryGeometry(fp, rmeshes, config):
 
 def rotateCoord(coord, config):
     offs = config.scale * config.offset
-    coord = [co-offs for co in coord]
+    coord = coord - offs
+    x,y,z = coord[:,0], coord[:,1], coord[:,2]
     if config.yUpFaceZ:
         pass
     elif config.yUpFaceX:
-        coord = [(z,y,-x) for (x,y,z) in coord]
+        coord = np.column_stack((z,y,-x))
     elif config.zUpFaceNegY:
-        coord = [(x,-z,y) for (x,y,z) in coord]
+        coord = np.column_stack((x,-z,y))
     elif config.zUpFaceX:
-        coord = [(z,x,y) for (x,y,z) in coord]
+        coord = np.column_stack((z,x,y))
     return coord
 
 
@@ -69,7 +70,7 @@ def writeGeometry(fp, rmesh, config):
         '          <float_array count="%d" id="%s-Position-array">\n' % (3*nVerts,rmesh.name) +
         '          ')
 
-    fp.write( ''.join([("%.4f %.4f %.4f " % tuple(co)) for co in coord]) )
+    writeRows(fp, "%.4f %.4f %.4f ", coord)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -93,7 +94,7 @@ def writeGeometry(fp, rmesh, config):
             '          <float_array count="%d" id="%s-Normals-array">\n' % (3*nNormals,rmesh.name) +
             '          ')
 
-        fp.write( ''.join([("%.4f %.4f %.4f " % tuple(normalize(no))) for no in normals]) )
+        writeRows(fp, "%.4f %.4f %.4f ", normalize(normals))
 
         fp.write('\n' +
             '          </float_array>\n' +
@@ -117,7 +118,7 @@ def writeGeometry(fp, rmesh, config):
         '          <float_array count="%d" id="%s-UV-array">\n' % (2*nUvVerts,rmesh.name) +
         '           ')
 
-    fp.write( ''.join([("%.4f %.4f " % tuple(uv)) for uv in texco]) )
+    writeRows(fp, "%.4f %.4f ", texco)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -156,9 +157,8 @@ def writeGeometry(fp, rmesh, config):
     progress(1)
 
 
-def normalize(vec):
-    vec = np.array(vec)
-    return vec/math.sqrt(np.dot(vec,vec))
+def normalize(vecs):
+    return vecs / np.sqrt((vecs * vecs).sum(axis=-1))[...,None]
 
 
 def writeShapeKey(fp, name, shape, rmesh, config):
@@ -183,7 +183,7 @@ def writeShapeKey(fp, name, shape, rmesh, config):
         '          <float_array id="%sMeshMorph_%s-positions-array" count="%d">\n' % (rmesh.name, name, 3*nVerts) +
         '           ')
 
-    fp.write( ''.join([("%.4f %.4f %.4f " % tuple(co)) for co in target]) )
+    writeRows(fp, "%.4f %.4f %.4f ", target)
 
     fp.write('\n' +
         '          </float_array>\n' +
@@ -230,13 +230,13 @@ def writeShapeKey(fp, name, shape, rmesh, config):
         #'          <input semantic="NORMAL" source="#%sMeshMorph_%s-normals" offset="1"/>\n' % (rmesh.name, name) +
         '          <vcount>')
 
-    fp.write( ''.join(["4 " for fv in fvert]) )
+    fp.write( "4 " * nFaces )
 
     fp.write('\n' +
         '          </vcount>\n' +
         '          <p>')
 
-    fp.write( ''.join([("%d %d %d %d " % (fv[0], fv[1], fv[2], fv[3])) for fv in fvert]) )
+    writeRows(fp, "%d %d %d %d ", fvert)
 
     fp.write('\n' +
         '          </p>\n' +
@@ -293,7 +293,7 @@ def writePolylist(fp, rmesh, config):
         '          <input offset="1" semantic="TEXCOORD" source="#%s-UV"/>\n' % rmesh.name +
         '          <vcount>')
 
-    fp.write( ''.join(["4 " for fv in fvert]) )
+    fp.write( "4 " * nFaces )
 
     fp.write('\n' +
         '          </vcount>\n'
@@ -302,12 +302,13 @@ def writePolylist(fp, rmesh, config):
 
     fuvs = rmesh.getFuvs()
 
-    for fn,fv in enumerate(fvert):
-        fuv = fuvs[fn]
-        if config.useNormals:
-            fp.write( ''.join([("%d %d %d " % (fv[n], fn, fuv[n])) for n in range(4)]) )
-        else:
-            fp.write( ''.join([("%d %d " % (fv[n], fuv[n])) for n in range(4)]) )
+    # Vertex, normal and UV index of each face corner
+    if config.useNormals:
+        faces = np.dstack((fvert, np.repeat(np.arange(nFaces)[:,None], 4, axis=1), fuvs))
+        writeRows(fp, 4*"%d %d %d ", faces.reshape(nFaces, -1))
+    else:
+        faces = np.dstack((fvert, fuvs))
+        writeRows(fp, 4*"%d %d ", faces.reshape(nFaces, -1))
 
     fp.write(
         '          </p>\n' +
@@ -321,12 +322,9 @@ def writePolylist(fp, rmesh, config):
 def checkFaces(rmesh, nVerts, nUvVerts):
     fvert = rmesh.getFvert()
     fuvs = rmesh.getFuvs()
-    for fn,fvs in enumerate(fvert):
-        for n,vn in enumerate(fvs):
-            uv = fuvs[fn][n]
-            if vn > nVerts:
-                raise NameError("v %d > %d" % (vn, nVerts))
-            if uv > nUvVerts:
-                raise NameError("uv %d > %d" % (uv, nUvVerts))
+    for indices,count,name in [(fvert, nVerts, "v"), (fuvs, nUvVerts, "uv")]:
+        invalid = np.flatnonzero(indices > count)
+        if len(invalid):
+            raise NameError("%s %d > %d" % (name, indices.flat[invalid[0]], count))
 
 
@@ -30,7 +30,6 @@ import time
 import codecs
 import log
 
-import gui3d
 import exportutils
 
 from progress import Progress
@@ -26,6 +26,7 @@ import numpy as np
 import numpy.linalg as la
 import transformations as tm
 
+from exportutils.arraytext import writeRows
 from .fbx_utils import *
 
 #--------------------------------------------------------------------
@@ -115,16 +116,14 @@ def writeShapeGeometry(fp, name, sname, shape, config):
 '        Indexes: *%d   {\n' % nVerts +
 '            a: ')
 
-        string = "".join( ['%d,' % vn for vn in shape.verts] )
-        fp.write(string[:-1])
+        writeRows(fp, '%d', shape.verts, ',')
 
         fp.write('\n' +
 '        }\n' +
 '        Vertices: *%d   {\n' % (3*nVerts) +
 '            a: ')
 
-        string = "".join( ["%.4f,%.4f,%.4f," % tuple(dr) for dr in shape.data] )
-        fp.write(string[:-1])
+        writeRows(fp, "%.4f,%.4f,%.4f", shape.data, ',')
 
         # Must use normals for shapekeys
         fp.write('\n' +
@@ -180,7 +179,8 @@ def writeDeformer(fp, name):
 
 
 def writeSubDeformer(fp, name, bone, weights, config):
-    nVertexWeights = len(weights)
+    verts,wts = weights
+    nVertexWeights = len(verts)
     id,key = getId("SubDeformer::%s_%s" % (bone.name, name))
 
     fp.write(
@@ -190,21 +190,14 @@ def writeSubDeformer(fp, name, bone, weights, config):
 '        Indexes: *%d {\n' % nVertexWeights +
 '            a: ')
 
-    last = nVertexWeights - 1
-    for n,data in enumerate(weights):
-        vn,w = data
-        fp.write(str(vn))
-        writeComma(fp, n, last)
+    writeList(fp, verts.astype(str).tolist())
 
     fp.write(
 '        } \n' +
 '        Weights: *%d {\n' % nVertexWeights +
 '            a: ')
 
-    for n,data in enumerate(weights):
-        vn,w = data
-        fp.write(str(w))
-        writeComma(fp, n, last)
+    writeList(fp, wts.astype(str).tolist())
 
     bindmat,bindinv = bone.getBindMatrix(config)
     fp.write('        }\n')
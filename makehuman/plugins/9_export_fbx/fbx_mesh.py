@@ -21,6 +21,8 @@ Abstract
 Fbx mesh
 """
 
+import numpy as np
+from exportutils.arraytext import writeRows
 from .fbx_utils import *
 
 #--------------------------------------------------------------------
@@ -78,16 +80,17 @@ def writeGeometryProp(fp, name, obj, config):
 '            a: ')
 
     coord = obj.coord - config.scale*config.offset
-    string = "".join( ["%.4f,%.4f,%.4f," % tuple(co) for co in coord] )
-    fp.write(string[:-1])
+    writeRows(fp, "%.4f,%.4f,%.4f", coord, ',')
 
     fp.write('\n' +
 '        } \n' +
 '        PolygonVertexIndex: *%d {\n' % (4*nFaces) +
 '            a: ')
 
-    string = "".join( ['%d,%d,%d,%d,' % (fv[0],fv[1],fv[2],-1-fv[3]) for fv in obj.fvert] )
-    fp.write(string[:-1])
+    # The last vertex of each polygon is stored as -1-index
+    fvert = obj.fvert.astype(np.int64)
+    fvert[:,3] = -1 - fvert[:,3]
+    writeRows(fp, '%d,%d,%d,%d', fvert, ',')
     fp.write('\n' +
 '        } \n')
 
@@ -106,8 +109,7 @@ def writeGeometryProp(fp, name, obj, config):
 '            Normals: *%d {\n' % (3*nNormals) +
 '                a: ')
 
-    string = "".join( ["%.4f,%.4f,%.4f," % tuple(no) for no in obj.vnorm] )
-    fp.write(string[:-1])
+    writeRows(fp, "%.4f,%.4f,%.4f", obj.vnorm, ',')
     fp.write('\n' +
 '            } \n')
 
@@ -189,16 +191,14 @@ def writeUvs1(fp, obj):
 '            UV: *%d {\n' % (2*nUvVerts) +
 '                a: ')
 
-    string = "".join( ["%.4f,%.4f," % tuple(uv) for uv in obj.texco] )
-    fp.write(string[:-1])
+    writeRows(fp, "%.4f,%.4f", obj.texco, ',')
 
     fp.write('\n' +
 '            } \n'
 '            UVIndex: *%d {\n' % (4*nUvFaces) +
 '                a: ')
 
-    string = "".join( ['%d,%d,%d,%d,' % tuple(fuv) for fuv in obj.fuvs] )
-    fp.write(string[:-1])
+    writeRows(fp, '%d,%d,%d,%d', obj.fuvs, ',')
 
     fp.write(
 """
@@ -223,18 +223,14 @@ def writeUvs2(fp, obj):
 '            UV: *%d {\n' % (8*nUvFaces) +
 '                a: ')
 
-    string = ""
-    for fuv in obj.fuvs:
-        string += "".join( ['%.4f,%.4f,' % (tuple(obj.texco[vt])) for vt in fuv] )
-    fp.write(string[:-1])
+    writeRows(fp, ','.join(8*['%.4f']), obj.texco[obj.fuvs].reshape(nUvFaces, 8), ',')
 
     fp.write('\n' +
 '            } \n'
 '            UVIndex: *%d {\n' % (4*nUvFaces) +
 '                a: ')
 
-    string = "".join( ['%d,%d,%d,%d,' % (4*n,4*n+1,4*n+2,4*n+3) for n in range(nUvFaces)] )
-    fp.write(string[:-1])
+    writeRows(fp, '%d,%d,%d,%d', np.arange(4*nUvFaces).reshape(nUvFaces, 4), ',')
 
     fp.write(
 """
@@ -117,6 +117,17 @@ def writeComma(fp, n, last):
     else:
         fp.write(',')
 
+
+def writeList(fp, items):
+    """
+    Write a list of strings as an FBX array, in lines of 1024 items, as
+    writeComma does.
+    """
+    if not items:
+        return
+    fp.write(',\n            '.join([','.join(items[n:n+1024]) for n in xrange(0, len(items), 1024)]))
+    fp.write('\n')
+
 #--------------------------------------------------------------------
 #   Links
 #--------------------------------------------------------------------
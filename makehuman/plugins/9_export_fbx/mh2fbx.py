@@ -26,7 +26,7 @@ import os.path
 import sys
 import codecs
 
-import gui3d
+from core import G
 import exportutils
 import posemode
 import log
@@ -46,7 +46,7 @@ def exportFbx(human, filepath, config):
     #posemode.exitPoseMode()
     #posemode.enterPoseMode()
 
-    gui3d.app.progress(0, text="Preparing")
+    G.app.progress(0, text="Preparing")
 
     config.setHuman(human)
     config.setupTexFolder(filepath)
@@ -64,7 +64,7 @@ def exportFbx(human, filepath, config):
         config=config,
         rawTargets=rawTargets)
 
-    gui3d.app.progress(0.5, text="Exporting %s" % filepath)
+    G.app.progress(0.5, text="Exporting %s" % filepath)
 
     fp = codecs.open(filepath, "w", encoding="utf-8")
     fbx_utils.resetId()
@@ -105,7 +105,7 @@ def exportFbx(human, filepath, config):
     fbx_header.writeTakes(fp)
     fp.close()
 
-    gui3d.app.progress(1)
+    G.app.progress(1)
     #posemode.exitPoseMode()
     log.message("%s written" % filepath)
 
@@ -0,0 +1,90 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Binary glTF 2.0 exporter plugin.
+"""
+
+from export import Exporter
+from exportutils.config import Config
+
+
+class GltfConfig(Config):
+    def __init__(self, exporter):
+        Config.__init__(self)
+        self.selectedOptions(exporter)
+
+        # glTF units are meters
+        self.scale, self.unit = 0.1, "meter"
+
+        self.useRelPaths = True
+        self.useNormals = True
+
+        self.expressions = exporter.expressions.selected
+        self.useCustomTargets = False
+        self.useTPose = False
+        self.animations = exporter.animations.selected
+
+        # glTF is Y up, with the front facing Z
+        self.yUpFaceZ = True
+        self.yUpFaceX = False
+        self.zUpFaceNegY = False
+        self.zUpFaceX = False
+
+        self.localY = True
+        self.localX = False
+        self.localG = False
+
+        self.rigOptions = exporter.getRigOptions()
+        if not self.rigOptions:
+            return
+        self.rigOptions.setExportOptions(
+            useExpressions = self.expressions,
+            useTPose = self.useTPose,
+        )
+
+
+class ExporterGltf(Exporter):
+    def __init__(self):
+        Exporter.__init__(self)
+        self.name = "glTF binary (glb)"
+        self.filter = "glTF binary (*.glb)"
+        self.fileExtension = "glb"
+        self.orderPriority = 65.0
+
+    def build(self, options, taskview):
+        import gui
+
+        Exporter.build(self, options, taskview)
+        self.expressions = options.addWidget(gui.CheckBox("Expressions", False))
+        self.animations = options.addWidget(gui.CheckBox("Animations", True))
+
+    def export(self, human, filename):
+        from .mh2gltf import exportGltf
+        self.taskview.exitPoseMode()
+        exportGltf(human, filename("glb"), GltfConfig(self))
+        self.taskview.enterPoseMode()
+
+
+def load(app):
+    app.addExporter(ExporterGltf())
+
+def unload(app):
+    pass
@@ -0,0 +1,516 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Binary glTF 2.0 (.glb) exporter.
+(https://github.com/KhronosGroup/glTF/tree/master/specification/2.0)
+
+The meshes, skin, shape keys and animations are stored in the binary chunk
+of the file. Every accessor is a numpy array that is written to the file as
+is, so no per-element formatting is done.
+"""
+
+import os
+import struct
+import json
+import numpy as np
+import numpy.linalg as la
+
+import exportutils
+import log
+from progress import Progress
+from makehuman import getVersionStr
+
+# Accessor component types and element types
+ComponentTypes = {
+    np.dtype(np.int8): 5120,
+    np.dtype(np.uint8): 5121,
+    np.dtype(np.int16): 5122,
+    np.dtype(np.uint16): 5123,
+    np.dtype(np.uint32): 5125,
+    np.dtype(np.float32): 5126,
+}
+
+ElementTypes = {
+    (): "SCALAR",
+    (2,): "VEC2",
+    (3,): "VEC3",
+    (4,): "VEC4",
+    (4,4): "MAT4",
+}
+
+# Buffer view targets
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+
+# Image types that can be embedded in the file
+ImageTypes = {
+    '.png': "image/png",
+    '.jpg': "image/jpeg",
+    '.jpeg': "image/jpeg",
+}
+
+#
+#   class BinaryBuffer
+#
+
+class BinaryBuffer(object):
+    """
+    The binary chunk of a glb file, with the buffer views and accessors of
+    the glTF document. Arrays are kept until they are written with write(),
+    each aligned to 4 bytes.
+    """
+
+    def __init__(self, gltf):
+        self.gltf = gltf
+        self.gltf["bufferViews"] = []
+        self.gltf["accessors"] = []
+        self.arrays = []
+        self.byteLength = 0
+
+    def addView(self, data, target = None):
+        """
+        Add a buffer view with the contents of an array. Returns its index.
+        """
+        data = np.ascontiguousarray(data, dtype=data.dtype.newbyteorder('<'))
+        self.byteLength += -self.byteLength % 4
+        view = {
+            "buffer": 0,
+            "byteOffset": self.byteLength,
+            "byteLength": data.nbytes,
+            }
+        if target:
+            view["target"] = target
+        self.arrays.append((self.byteLength, data))
+        self.byteLength += data.nbytes
+        self.gltf["bufferViews"].append(view)
+        return len(self.gltf["bufferViews"]) - 1
+
+    def addAccessor(self, data, target = None, minmax = False, view = None, byteOffset = 0):
+        """
+        Add an accessor for an array of elements. Its first dimension is the
+        element count, the others the element type. The array is stored in a
+        new buffer view, unless the view that contains it is specified.
+        Returns the index of the accessor.
+        """
+        if view is None:
+            view = self.addView(data, target)
+        accessor = {
+            "bufferView": view,
+            "componentType": ComponentTypes[data.dtype],
+            "count": len(data),
+            "type": ElementTypes[data.shape[1:]],
+            }
+        if byteOffset:
+            accessor["byteOffset"] = byteOffset
+        if minmax:
+            accessor["min"] = data.min(axis=0).reshape(-1).tolist()
+            accessor["max"] = data.max(axis=0).reshape(-1).tolist()
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def addSparseAccessor(self, count, indices, values):
+        """
+        Add an accessor of count elements that are zero except at the
+        specified (increasing) indices. Returns the index of the accessor.
+        """
+        lower = values.min(axis=0)
+        upper = values.max(axis=0)
+        if len(indices) < count:
+            lower = np.minimum(lower, 0)
+            upper = np.maximum(upper, 0)
+        accessor = {
+            "componentType": ComponentTypes[values.dtype],
+            "count": count,
+            "type": ElementTypes[values.shape[1:]],
+            "min": lower.tolist(),
+            "max": upper.tolist(),
+            "sparse": {
+                "count": len(indices),
+                "indices": {
+                    "bufferView": self.addView(indices),
+                    "componentType": ComponentTypes[indices.dtype],
+                    },
+                "values": {
+                    "bufferView": self.addView(values),
+                    },
+                },
+            }
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def write(self, fp):
+        """
+        Write the contents of the buffer, padded to a multiple of 4 bytes.
+        """
+        position = 0
+        for offset, data in self.arrays:
+            fp.write('\0' * (offset - position))
+            data.tofile(fp)
+            position = offset + data.nbytes
+        fp.write('\0' * (-position % 4))
+
+#
+#   exportGltf(human, filepath, config):
+#
+
+def exportGltf(human, filepath, config):
+    from armature.armature import setupArmature
+    progress = Progress()
+
+    config.setHuman(human)
+    config.setupTexFolder(filepath)
+    filename = os.path.basename(filepath)
+    name = config.goodName(os.path.splitext(filename)[0])
+
+    progress(0, 0.5, "Preparing")
+    amt = setupArmature(name, human, config.rigOptions)
+    rawTargets = exportutils.collect.readTargets(human, config)
+    rmeshes = exportutils.collect.setupMeshes(
+        name,
+        human,
+        amt=amt,
+        config=config,
+        rawTargets = rawTargets)
+
+    progress(0.5, 0.9, "Exporting %s" % filepath)
+    log.message("Writing glTF file %s" % filepath)
+    gltf = {
+        "asset": {"version": "2.0", "generator": "MakeHuman %s" % getVersionStr()},
+        "scene": 0,
+        "scenes": [{"name": name, "nodes": []}],
+        "nodes": [],
+        "meshes": [],
+        "materials": [],
+        }
+    buf = BinaryBuffer(gltf)
+
+    if amt:
+        skin = addArmature(buf, amt, config)
+    else:
+        skin = None
+    for rmesh in rmeshes:
+        addMesh(buf, rmesh, amt, skin, config)
+    if amt and config.animations:
+        addAnimations(buf, human, amt, config)
+
+    progress(0.9, 0.99, "Writing %s" % filepath)
+    writeGlb(filepath, gltf, buf)
+    progress(1, None, "Export finished.")
+    log.message("%s written" % filepath)
+
+
+def writeGlb(filepath, gltf, buf):
+    """
+    Write a glb file: a header, the glTF document as JSON chunk and the
+    buffer as binary chunk.
+    """
+    gltf["buffers"] = [{"byteLength": buf.byteLength + -buf.byteLength % 4}]
+    for key in ["bufferViews", "accessors", "materials", "meshes", "skins", "animations",
+                "textures", "images", "samplers"]:
+        if key in gltf and not gltf[key]:
+            del gltf[key]
+    jsonData = json.dumps(gltf, separators=(',', ':'))
+    jsonData += ' ' * (-len(jsonData) % 4)
+    binLength = gltf["buffers"][0]["byteLength"]
+
+    with open(filepath, 'wb') as fp:
+        fp.write(struct.pack('<4sII', 'glTF', 2, 12 + 8 + len(jsonData) + 8 + binLength))
+        fp.write(struct.pack('<I4s', len(jsonData), 'JSON'))
+        fp.write(jsonData)
+        fp.write(struct.pack('<I4s', binLength, 'BIN\0'))
+        buf.write(fp)
+
+#
+#   Meshes
+#
+
+def unweld(obj):
+    """
+    glTF vertices have a single UV coordinate, so vertices with different
+    UVs in different faces are split.
+    Returns the original vertex and UV of each new vertex, and the faces in
+    new vertex indices.
+    """
+    fuvs = obj.fuvs if obj.has_uv else np.zeros_like(obj.fvert)
+    packed = (obj.fvert.astype(np.uint64) << 32) | fuvs.astype(np.uint64)
+    unique, faces = np.unique(packed.reshape(-1), return_inverse=True)
+    vmap = (unique >> 32).astype(np.intp)
+    tmap = (unique & 0xffffffff).astype(np.intp)
+    return vmap, tmap, faces.reshape(obj.fvert.shape)
+
+
+def getUnweldedIndices(vmap, verts):
+    """
+    The new vertices that are copies of original vertices verts, in
+    increasing order, and for each of them its index in verts.
+    """
+    order = np.argsort(vmap, kind='mergesort')
+    counts = np.bincount(vmap, minlength=verts.max()+1 if len(verts) else 0)
+    first = np.cumsum(counts) - counts
+    count = counts[verts]
+    entries = np.repeat(np.arange(len(verts)), count)
+    copies = np.arange(len(entries)) - np.repeat(np.cumsum(count) - count, count)
+    indices = order[first[verts[entries]] + copies]
+    sort = np.argsort(indices)
+    return indices[sort], entries[sort]
+
+
+def addMesh(buf, rmesh, amt, skin, config):
+    gltf = buf.gltf
+    obj = rmesh.object
+    obj.calcNormals()
+    vmap, tmap, faces = unweld(obj)
+    nVerts = len(vmap)
+
+    coord = (obj.coord - config.scale*config.offset).astype(np.float32)
+    normals = obj.vnorm.astype(np.float32)
+    lengths = np.sqrt((normals * normals).sum(axis=1))
+    normals /= np.where(lengths > 0, lengths, 1)[:,None]
+
+    attributes = {
+        "POSITION": buf.addAccessor(coord[vmap], ARRAY_BUFFER, minmax=True),
+        "NORMAL": buf.addAccessor(normals[vmap], ARRAY_BUFFER),
+        }
+    if obj.has_uv:
+        # glTF has the origin of UV coordinates at the top left
+        texco = obj.texco[tmap].astype(np.float32)
+        texco[:,1] = 1 - texco[:,1]
+        attributes["TEXCOORD_0"] = buf.addAccessor(texco, ARRAY_BUFFER)
+    if skin is not None:
+        joints, weights = packWeights(rmesh.weights, amt, len(obj.coord))
+        attributes["JOINTS_0"] = buf.addAccessor(joints[vmap], ARRAY_BUFFER)
+        attributes["WEIGHTS_0"] = buf.addAccessor(weights[vmap], ARRAY_BUFFER)
+
+    if faces.shape[1] == 4:
+        faces = faces[:,[0,1,2,2,3,0]]
+    indexType = np.uint16 if nVerts < 0xffff else np.uint32
+    primitive = {
+        "attributes": attributes,
+        "indices": buf.addAccessor(faces.reshape(-1).astype(indexType), ELEMENT_ARRAY_BUFFER),
+        "material": addMaterial(buf, rmesh.material, config),
+        }
+    mesh = {"name": rmesh.name, "primitives": [primitive]}
+
+    # Shape keys as sparse morph targets
+    targets = []
+    names = []
+    for sname, shape in rmesh.shapes:
+        verts = np.asarray(shape.verts, dtype=np.intp)
+        if len(verts) == 0:
+            continue
+        indices, entries = getUnweldedIndices(vmap, verts)
+        data = np.asarray(shape.data, dtype=np.float32)[entries]
+        targets.append({"POSITION": buf.addSparseAccessor(nVerts, indices.astype(np.uint32), data)})
+        names.append(sname)
+    if targets:
+        primitive["targets"] = targets
+        mesh["weights"] = [0.0] * len(targets)
+        mesh["extras"] = {"targetNames": names}
+
+    gltf["meshes"].append(mesh)
+    node = {"name": rmesh.name, "mesh": len(gltf["meshes"]) - 1}
+    if skin is not None:
+        node["skin"] = skin
+    gltf["nodes"].append(node)
+    gltf["scenes"][0]["nodes"].append(len(gltf["nodes"]) - 1)
+
+
+def addMaterial(buf, mat, config):
+    gltf = buf.gltf
+    color = list(mat.diffuseColor.asTuple()) + [mat.opacity]
+    material = {
+        "name": mat.name,
+        "pbrMetallicRoughness": {
+            "baseColorFactor": color,
+            "metallicFactor": 0.0,
+            "roughnessFactor": 1.0,
+            },
+        }
+    if mat.diffuseTexture:
+        material["pbrMetallicRoughness"]["baseColorTexture"] = {"index": addTexture(buf, mat.diffuseTexture, config)}
+    if mat.normalMapTexture:
+        material["normalTexture"] = {"index": addTexture(buf, mat.normalMapTexture, config)}
+    if mat.transparent or mat.opacity < 1:
+        material["alphaMode"] = "BLEND"
+    gltf["materials"].append(material)
+    return len(gltf["materials"]) - 1
+
+
+def addTexture(buf, filepath, config):
+    """
+    Add a texture with the image at filepath. PNG and JPEG images are stored
+    in the file, other images are copied to the textures folder.
+    """
+    gltf = buf.gltf
+    if "images" not in gltf:
+        gltf["images"] = []
+        gltf["textures"] = []
+        gltf["samplers"] = [{}]
+
+    mimeType = ImageTypes.get(os.path.splitext(filepath)[1].lower())
+    if mimeType:
+        with open(filepath, 'rb') as fp:
+            data = np.fromstring(fp.read(), dtype=np.uint8)
+        image = {"bufferView": buf.addView(data), "mimeType": mimeType}
+    else:
+        image = {"uri": config.copyTextureToNewLocation(filepath).replace('\\', '/')}
+    gltf["images"].append(image)
+    gltf["textures"].append({"sampler": 0, "source": len(gltf["images"]) - 1})
+    return len(gltf["textures"]) - 1
+
+#
+#   Skin
+#
+
+def addArmature(buf, amt, config):
+    """
+    Add a node per bone and a skin with all bones as joints, in the order of
+    amt.bones. Returns the index of the skin.
+    """
+    import animation
+
+    gltf = buf.gltf
+    boneNames = amt.bones.keys()
+    firstNode = len(gltf["nodes"])
+    amt.nodeIndices = dict((bname, firstNode + n) for n, bname in enumerate(boneNames))
+
+    # Node hierarchy from the bone parents (bone.children also lists bones
+    # that only follow a master bone)
+    children = dict((bname, []) for bname in boneNames)
+    roots = []
+    for bname, bone in amt.bones.items():
+        if bone.parent:
+            children[bone.parent].append(amt.nodeIndices[bname])
+        else:
+            roots.append(amt.nodeIndices[bname])
+
+    relMats = np.array([bone.getRelativeMatrix(config) for bone in amt.bones.values()])
+    quats = animation.quaternionsFromMatrices(relMats)
+    for n, bone in enumerate(amt.bones.values()):
+        node = {
+            "name": bone.name,
+            "translation": relMats[n,:3,3].tolist(),
+            "rotation": np.roll(quats[n], -1).tolist(),
+            }
+        if children[bone.name]:
+            node["children"] = children[bone.name]
+        gltf["nodes"].append(node)
+
+    gltf["nodes"].append({"name": amt.name, "children": roots})
+    gltf["scenes"][0]["nodes"].append(len(gltf["nodes"]) - 1)
+
+    # glTF matrices are stored column by column
+    invBindMats = np.array([la.inv(bone.getRestMatrix(config)) for bone in amt.bones.values()])
+    gltf["skins"] = [{
+        "name": amt.name,
+        "joints": [amt.nodeIndices[bname] for bname in boneNames],
+        "skeleton": len(gltf["nodes"]) - 1,
+        "inverseBindMatrices": buf.addAccessor(invBindMats.transpose(0,2,1).astype(np.float32)),
+        }]
+    return 0
+
+
+def packWeights(vertexWeights, amt, nVerts):
+    """
+    Joints and weights of each vertex, as (nVerts, 4) arrays. Vertices with
+    more than four bones keep the four largest weights, vertices without
+    bones are assigned to the root bone. Weights are normalized.
+    """
+    boneNames = amt.bones.keys()
+    weights = vertexWeights.select(boneNames)
+    _, _, verts, values = weights.compile()
+    counts, entries = weights.getVertexView(nVerts)
+    slots = np.arange(len(entries)) - np.repeat(np.cumsum(counts) - counts, counts)
+    nSlots = max(4, counts.max() if len(counts) else 0)
+
+    joints = np.zeros((nVerts, nSlots), np.int32)
+    packed = np.zeros((nVerts, nSlots), np.float32)
+    joints[verts[entries], slots] = weights.getGroupIndices()[entries]
+    packed[verts[entries], slots] = values[entries]
+    if nSlots > 4:
+        largest = np.argsort(-packed, axis=1, kind='mergesort')[:,:4]
+        rows = np.arange(nVerts)[:,None]
+        joints = joints[rows, largest]
+        packed = packed[rows, largest]
+
+    totals = packed.sum(axis=1)
+    unweighted = totals <= 0
+    joints[unweighted] = 0
+    joints[unweighted, 0] = boneNames.index(amt.roots[0].name)
+    packed[unweighted, 0] = 1
+    totals[unweighted] = 1
+    packed /= totals[:,None]
+
+    jointType = np.uint8 if len(boneNames) <= 256 else np.uint16
+    return joints.astype(jointType), packed
+
+#
+#   Animations
+#
+
+def addAnimations(buf, human, amt, config):
+    """
+    Add the animations of the human as sampled translation and rotation
+    channels of the bone nodes.
+    """
+    import animation
+
+    skel = human.getSkeleton() if hasattr(human, 'getSkeleton') else None
+    animated = getattr(human, 'animated', None)
+    if not skel or not animated:
+        return
+
+    skelNames = [bone.name for bone in skel.getBones()]
+    boneNames = [bname for bname in amt.bones.keys() if bname in skelNames]
+    skelIdxs = [skelNames.index(bname) for bname in boneNames]
+    relMats = np.array([amt.bones[bname].getRelativeMatrix(config) for bname in boneNames])
+
+    gltf = buf.gltf
+    gltf["animations"] = []
+    for animName in animated.getAnimations():
+        track = animated.getAnimation(animName)
+        poses = track.data.reshape((track.nFrames, track.nBones, 4, 4))[:, skelIdxs].astype(np.float64)
+        poses[...,:3,3] *= config.scale
+
+        # Pose matrices are relative to the rest pose of the bone
+        local = np.einsum('bij,fbjk->bfik', relMats, poses)
+        trans = np.ascontiguousarray(local[...,:3,3], dtype=np.float32)
+        quats = animation.quaternionsFromMatrices(local)
+        # Keep the rotations of consecutive frames in the same hemisphere,
+        # and store them as (x, y, z, w)
+        signs = np.sign((quats[:,1:] * quats[:,:-1]).sum(axis=-1))
+        signs[signs == 0] = 1
+        quats[:,1:] *= np.cumprod(signs, axis=1)[...,None]
+        quats = np.ascontiguousarray(np.roll(quats, -1, axis=-1), dtype=np.float32)
+
+        times = np.arange(track.nFrames, dtype=np.float32) / track.frameRate
+        input = buf.addAccessor(times, minmax=True)
+        transView = buf.addView(trans)
+        rotView = buf.addView(quats)
+        samplers = []
+        channels = []
+        for n, bname in enumerate(boneNames):
+            node = amt.nodeIndices[bname]
+            for path, data, view in [("translation", trans, transView), ("rotation", quats, rotView)]:
+                output = buf.addAccessor(data[n], view=view, byteOffset=data[n].nbytes * n)
+                samplers.append({"input": input, "output": output, "interpolation": "LINEAR"})
+                channels.append({"sampler": len(samplers) - 1, "target": {"node": node, "path": path}})
+        gltf["animations"].append({"name": animName, "samplers": samplers, "channels": channels})
@@ -25,6 +25,7 @@ Mesh
 import numpy
 import os
 import log
+from vertexweights import VertexWeights
 from . import mhx_writer
 from . import mhx_drivers
 
@@ -315,9 +316,10 @@ end Object
 
     def writeRigWeights(self, fp, weights):
         for grp in weights.keys():
+            verts,wts = VertexWeights.toArrays(weights[grp])
             fp.write(
                 "\n  VertexGroup %s\n" % grp +
-                "".join( ["    wv %d %.4g ;\n" % tuple(vw) for vw in weights[grp]] ) +
+                "".join( ["    wv %d %.4g ;\n" % vw for vw in zip(verts.tolist(), wts.tolist())] ) +
                 "  end VertexGroup\n")
 
 
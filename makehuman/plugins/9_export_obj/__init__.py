@@ -22,7 +22,6 @@ Abstract
 TODO
 """
 
-import gui
 from export import Exporter
 from exportutils.config import Config
 
@@ -44,6 +43,8 @@ class ExporterOBJ(Exporter):
         self.orderPriority = 60.0
 
     def build(self, options, taskview):
+        import gui
+
         Exporter.build(self, options, taskview)
         self.useNormals = options.addWidget(gui.CheckBox("Normals", False))
 
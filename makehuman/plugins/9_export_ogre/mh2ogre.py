@@ -30,12 +30,15 @@ A description of this format can be found here: https://bitbucket.org/sinbad/ogr
 __docformat__ = 'restructuredtext'
 
 import os
+import numpy as np
 from progress import Progress
 import codecs
 import transformations
 import exportutils
+from exportutils.arraytext import writeRows
 import skeleton
 import log
+from vertexweights import VertexWeights
 
 
 def exportOgreMesh(human, filepath, config, progressCallback = None):
@@ -103,10 +106,11 @@ def writeMeshFile(human, filepath, rmeshes, config, progressCallback = None):
 
         # Faces
         f.write('            <faces count="%s">\n' % numFaces)
-        for fv in obj.r_faces:
-            f.write('                <face v1="%s" v2="%s" v3="%s" />\n' % (fv[0], fv[1], fv[2]))
-            if obj.vertsPerPrimitive == 4:
-                f.write('                <face v1="%s" v2="%s" v3="%s" />\n' % (fv[2], fv[3], fv[0]))
+        if obj.vertsPerPrimitive == 4:
+            faces = obj.r_faces[:,[0,1,2,2,3,0]].reshape(-1,3)
+        else:
+            faces = obj.r_faces[:,:3]
+        writeRows(f, '                <face v1="%d" v2="%d" v3="%d" />\n', faces)
         f.write('            </faces>\n')
 
         loopprog(0.3, 0.7, "Writing vertices of %s." % rmesh.name)
@@ -114,31 +118,33 @@ def writeMeshFile(human, filepath, rmeshes, config, progressCallback = None):
         f.write('            <geometry vertexcount="%s">\n' % numVerts)
         f.write('                <vertexbuffer positions="true" normals="true">\n')
         #f.write('                <vertexbuffer positions="true">\n')
-        for vIdx, co in enumerate(obj.r_coord):
-            if config.feetOnGround:
-                co = co.copy()
-                co[1] += getFeetOnGroundOffset(human)
-
-            # Note: Ogre3d uses a y-up coordinate system (just like MH)
-            norm = obj.r_vnorm[vIdx]
-            f.write('                    <vertex>\n')
-            f.write('                        <position x="%s" y="%s" z="%s" />\n' % (co[0], co[1], co[2]))
-            f.write('                        <normal x="%s" y="%s" z="%s" />\n' % (norm[0], norm[1], norm[2]))
-            f.write('                    </vertex>\n')
+        coord = obj.r_coord.copy()
+        if config.feetOnGround:
+            coord[:,1] = coord[:,1] + np.float64(getFeetOnGroundOffset(human))
+        # Note: Ogre3d uses a y-up coordinate system (just like MH)
+        # Floats are written as numpy formats them (%s)
+        writeRows(f,
+            '                    <vertex>\n' +
+            '                        <position x="%s" y="%s" z="%s" />\n' +
+            '                        <normal x="%s" y="%s" z="%s" />\n' +
+            '                    </vertex>\n',
+            np.hstack((coord, obj.r_vnorm)).astype(str))
         f.write('                </vertexbuffer>\n')
 
         loopprog(0.8 - 0.1*bool(human.getSkeleton()), 0.9, "Writing UVs of %s." % rmesh.name)
         # UV Texture Coordinates
         f.write('                <vertexbuffer texture_coord_dimensions_0="2" texture_coords="1">\n')
-        for vIdx in xrange(numVerts):
-            if obj.has_uv:
-                u, v = obj.r_texco[vIdx]
-                v = 1-v
-            else:
-                u, v = 0, 0
-            f.write('                    <vertex>\n')
-            f.write('                        <texcoord u="%s" v="%s" />\n' % (u, v))
-            f.write('                    </vertex>\n')
+        if obj.has_uv:
+            # v = 1-v is computed in double precision
+            u, v = obj.r_texco[:,0], obj.r_texco[:,1]
+            texco = np.column_stack((u.astype(str), (1 - v.astype(np.float64)).astype(str)))
+        else:
+            texco = np.zeros((numVerts, 2), int)
+        writeRows(f,
+            '                    <vertex>\n' +
+            '                        <texcoord u="%s" v="%s" />\n' +
+            '                    </vertex>\n',
+            texco)
         f.write('                </vertexbuffer>\n')
         f.write('            </geometry>\n')
 
@@ -154,40 +160,31 @@ def writeMeshFile(human, filepath, rmeshes, config, progressCallback = None):
                 weights = skeleton.getProxyWeights(rmesh.proxy, bodyWeights, obj)
             else:
                 # Use vertex weights for human body
-                weights = bodyWeights
+                weights = VertexWeights(bodyWeights)
                 # Account for vertices that are filtered out
                 if rmesh.vertexMapping != None:
-                    filteredVIdxMap = rmesh.vertexMapping
-                    weights2 = {}
-                    for (boneName, (verts,ws)) in weights.items():
-                        verts2 = []
-                        ws2 = []
-                        for i, vIdx in enumerate(verts):
-                            if vIdx in filteredVIdxMap:
-                                verts2.append(filteredVIdxMap[vIdx])
-                                ws2.append(ws[i])
-                        weights2[boneName] = (verts2, ws2)
-                    weights = weights2
-
-            # Remap vertex weights to the unwelded vertices of the object (obj.coord to obj.r_coord)
-            originalToUnweldedMap = {}
-            for unweldedIdx, originalIdx in enumerate(obj.vmap):
-                if originalIdx not in originalToUnweldedMap.keys():
-                    originalToUnweldedMap[originalIdx] = []
-                originalToUnweldedMap[originalIdx].append(unweldedIdx)
+                    mask = rmesh.vertexMask
+                    weights = weights.remapped(np.where(mask, np.cumsum(mask) - 1, -1))
+
+            # Remap vertex weights to the unwelded vertices of the object
+            # (obj.coord to obj.r_coord): each weight is repeated for the
+            # unwelded copies of its vertex, in ascending order
+            names, _, verts, ws = weights.compile()
+            unwelded = np.argsort(obj.vmap, kind='mergesort')
+            nUnwelded = np.bincount(obj.vmap, minlength=len(obj.coord))
+            firstUnwelded = np.cumsum(nUnwelded) - nUnwelded
+            count = np.where(verts < len(nUnwelded), nUnwelded[np.minimum(verts, len(nUnwelded)-1)], 0)
+            entries = np.repeat(np.arange(len(verts)), count)
+            copies = np.arange(len(entries)) - np.repeat(np.cumsum(count) - count, count)
+            r_verts = unwelded[firstUnwelded[verts[entries]] + copies]
 
-            f.write('            <boneassignments>\n')
             boneNames = [ bone.name for bone in human.getSkeleton().getBones() ]
-            for (boneName, (verts,ws)) in weights.items():
-                bIdx = boneNames.index(boneName)
-                for i, vIdx in enumerate(verts):
-                    w = ws[i]
-                    try:
-                        for r_vIdx in originalToUnweldedMap[vIdx]:
-                            f.write('                <vertexboneassignment vertexindex="%s" boneindex="%s" weight="%s" />\n' % (r_vIdx, bIdx, w))
-                    except:
-                        # unused coord
-                        pass
+            boneIdxs = np.array([boneNames.index(boneName) for boneName in names], int)
+            boneIdxs = boneIdxs[weights.getGroupIndices()[entries]]
+
+            f.write('            <boneassignments>\n')
+            writeRows(f, '                <vertexboneassignment vertexindex="%s" boneindex="%s" weight="%s" />\n',
+                np.column_stack((r_verts.astype(str), boneIdxs.astype(str), ws[entries].astype(str))))
             f.write('            </boneassignments>\n')
 
         progress.step()
@@ -36,8 +36,35 @@ import os
 import struct
 import exportutils
 import numpy as np
+from exportutils.arraytext import writeRows
 from progress import Progress
 
+# Record of a triangle in a binary STL file
+STL_TRIANGLE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2'),
+    ])
+
+STL_ASCII_FACET = (
+    'facet normal %f %f %f\n' +
+    '\touter loop\n' +
+    '\t\tvertex %f %f %f\n' * 3 +
+    '\tendloop\n' +
+    '\tendfacet\n')
+
+
+def getTriangles(obj, offs):
+    """
+    The normals and vertex coordinates of the triangles of the quads of obj,
+    as (nTris, 3) and (nTris, 3, 3) arrays. Each quad is split in triangles
+    0-1-2 and 2-3-0, with the normal of the quad.
+    """
+    coord = obj.coord - offs
+    tris = obj.fvert[:,[0,1,2,2,3,0]].reshape(-1, 3)
+    return obj.fnorm.repeat(2, axis=0), coord[tris]
+
+
 def exportStlAscii(human, filepath, config, exportJoints = False):
     """
     This function exports MakeHuman mesh and skeleton data to stereolithography ascii format.
@@ -76,24 +103,9 @@ def exportStlAscii(human, filepath, config, exportJoints = False):
     objprog = Progress(len(rmeshes))
     offs = config.scale*config.offset
     for rmesh in rmeshes:
-        obj = rmesh.object
-        coord = np.array([co-offs for co in obj.coord])
-        fp.write("".join( [(
-            'facet normal %f %f %f\n' % tuple(obj.fnorm[fn]) +
-            '\touter loop\n' +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[1]]) +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-            '\tendloop\n' +
-            '\tendfacet\n' +
-            'facet normal %f %f %f\n' % tuple(obj.fnorm[fn]) +
-            '\touter loop\n' +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[2]]) +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[3]]) +
-            '\t\tvertex %f %f %f\n' % tuple(coord[fv[0]]) +
-            '\tendloop\n' +
-            '\tendfacet\n'
-            ) for fn,fv in enumerate(obj.fvert)] ))
+        normals, vertices = getTriangles(rmesh.object, offs)
+        facets = np.hstack((normals, vertices.reshape(-1, 9)))
+        writeRows(fp, STL_ASCII_FACET, facets)
         objprog.step()
 
     fp.write('endsolid %s\n' % solid)
@@ -125,36 +137,22 @@ def exportStlBinary(human, filepath, config, exportJoints = False):
         config=config,
         subdivide=config.subdivide)
 
-    fp = open(filepath, 'wb')
-    fp.write('\x00' * 80)
-    fp.write(struct.pack('<I', 0))
-    count = 0
-
     progress(0.3, 0.99, "Writing Objects")
     objprog = Progress(len(rmeshes))
     offs = config.scale * config.offset
+    records = []
     for rmesh in rmeshes:
-        obj = rmesh.object
-        for fn,fv in enumerate(obj.fvert):
-            fno = obj.fnorm[fn]
-            co = obj.coord[fv] - offs
-
-            fp.write(struct.pack('<fff', fno[0], fno[1], fno[2]))
-            fp.write(struct.pack('<fff', co[0][0], co[0][1], co[0][2]))
-            fp.write(struct.pack('<fff', co[1][0], co[1][1], co[1][2]))
-            fp.write(struct.pack('<fff', co[2][0], co[2][1], co[2][2]))
-            fp.write(struct.pack('<H', 0))
-            count += 1
-
-            fp.write(struct.pack('<fff', fno[0], fno[1], fno[2]))
-            fp.write(struct.pack('<fff', co[2][0], co[2][1], co[2][2]))
-            fp.write(struct.pack('<fff', co[3][0], co[3][1], co[3][2]))
-            fp.write(struct.pack('<fff', co[0][0], co[0][1], co[0][2]))
-            fp.write(struct.pack('<H', 0))
-            count += 1
+        normals, vertices = getTriangles(rmesh.object, offs)
+        record = np.zeros(len(normals), dtype=STL_TRIANGLE)
+        record['normal'] = normals
+        record['vertices'] = vertices
+        records.append(record)
         objprog.step()
+    records = np.concatenate(records) if records else np.zeros(0, dtype=STL_TRIANGLE)
 
-    fp.seek(80)
-    fp.write(struct.pack('<I', count))
+    fp = open(filepath, 'wb')
+    fp.write('\x00' * 80)
+    fp.write(struct.pack('<I', len(records)))
+    records.tofile(fp)
+    fp.close()
     progress(1, None, "STL export finished. Exported file: %s" % filepath)
-
@@ -24,6 +24,7 @@ Data handlers for skeletal animation.
 
 import math
 import numpy as np
+import skeleton
 
 
 INTERPOLATION = {
@@ -32,6 +33,8 @@ INTERPOLATION = {
     'LOG':    2
 }
 
+BAKE_CHUNK_FRAMES = 256     # Number of frames to bake skinning matrices for at once
+
 class AnimationTrack(object):
 
     def __init__(self, name, poseData, nFrames, framerate):
@@ -65,10 +68,21 @@ class AnimationTrack(object):
         
         # Type of interpolation between animation frames
         #   0  no interpolation
-        #   1  linear
-        #   2  logarithmic   # TODO!
+        #   1  linear (linear translations, normalized linear interpolation of
+        #      rotation quaternions)
+        #   2  logarithmic (linear translations, spherical linear
+        #      interpolation of rotation quaternions)
         self.interpolationType = 0
 
+        # Rotations and translations of the pose data, see getQuaternionData()
+        self.__quatData = None
+        self.__quatDataFor = None
+
+        # Cache the skinning matrices of all frames (see getSkinningMatrices)
+        self.bakeSkinning = False
+        self.__bakedSkinMats = None
+        self.__bakedFor = None
+
     def getAtTime(self, time):
         """
         Returns the animation state at the specified time.
@@ -78,22 +92,131 @@ class AnimationTrack(object):
         frameIdx, fraction = self.getFrameIndexAtTime(time)
         if fraction == 0 or self.interpolationType == 0:
             # Discrete animation
-            idx = frameIdx*self.nBones
+            idx = int(frameIdx)*self.nBones
             return self.data[idx:idx+self.nBones]
-        elif self.interpolationType == 1:
-            # Linear interpolation
-            idx1 = frameIdx*self.nBones
-            idx2 = ((frameIdx+1) % self.nFrames) * self.nBones
-            return self.data[idx1:idx1+self.nBones] * (1-fraction) + \
-                   self.data[idx2:idx2+self.nBones] * fraction
-        elif self.interpolationType == 2:
-            # Logarithmic interpolation
-            pass # TODO
+        else:
+            return self.sample([time])[0]
+
+    def sample(self, times, interpolationType=None):
+        """
+        Returns the animation state at each of the specified times (in
+        seconds), as np.array((nTimes, nBones, 4, 4), dtype=float32).
+        interpolationType defaults to that of this track.
+        """
+        if interpolationType is None:
+            interpolationType = self.interpolationType
+        frameIdxs, fractions = self.getFrameIndicesAtTimes(times)
+
+        poseData = self.data.reshape((self.nFrames, self.nBones, 4, 4))
+        if interpolationType == 0:
+            return poseData[frameIdxs]
+
+        if self.loop:
+            nextIdxs = (frameIdxs+1) % self.nFrames
+        else:
+            nextIdxs = np.minimum(frameIdxs+1, self.nFrames-1)
+        quats, trans = self.getQuaternionData()
+        fractions = fractions[:,None,None]
+        if interpolationType == 1:
+            quats = nlerp(quats[frameIdxs], quats[nextIdxs], fractions)
+        else:
+            quats = slerp(quats[frameIdxs], quats[nextIdxs], fractions)
+        trans = trans[frameIdxs] * (1-fractions) + trans[nextIdxs] * fractions
+        return matricesFromQuaternions(quats, trans)
+
+    def resample(self, newFrameRate, interpolationType=2):
+        """
+        Resample this animation to a new framerate, interpolating between the
+        frames with the specified type of interpolation (default spherical
+        linear interpolation of rotations).
+        """
+        nFrames = max(1, int(round(self.getPlaytime() * newFrameRate)))
+        times = np.arange(nFrames, dtype=np.float64) / newFrameRate
+        self.data = self.sample(times, interpolationType).reshape((-1, 4, 4))
+        self.frameRate = float(newFrameRate)
+        self.dataLen = len(self.data)
+        self.nFrames = nFrames
+        self.clearBakedSkinningMatrices()
+
+    def getQuaternionData(self):
+        """
+        Returns the rotation quaternions (w, x, y, z) and translations of the
+        pose matrices, as np.array((nFrames, nBones, 4)) and
+        np.array((nFrames, nBones, 3)). They are cached until the pose data of
+        this track is replaced.
+        """
+        if self.__quatDataFor is not self.data:
+            poseData = self.data.reshape((self.nFrames, self.nBones, 4, 4))
+            self.__quatData = (quaternionsFromMatrices(poseData), poseData[...,:3,3].astype(np.float32))
+            self.__quatDataFor = self.data
+        return self.__quatData
 
     def getAtFramePos(self, frame):
         frame = int(frame)
         return self.data[frame*self.nBones:(frame+1)*self.nBones]
 
+    def getSkinningMatrices(self, frameIdx, skel, inPlace=False):
+        """
+        Returns the skinning matrices of skel posed in the specified frame of
+        this animation, as np.array((nBones, 3, 4), dtype=float32).
+        They are looked up from the skinning matrices baked for all frames,
+        which are (re)baked when skel, its rest pose or inPlace changed since
+        the last bake.
+        """
+        if not self.isBaked(skel, inPlace):
+            self.bakeSkinningMatrices(skel, inPlace)
+        return self.__bakedSkinMats[int(frameIdx)]
+
+    def isBaked(self, skel, inPlace=False):
+        if self.__bakedFor is None:
+            return False
+        bakedSkel, bakedRest, bakedInPlace = self.__bakedFor
+        return bakedSkel is skel and bakedRest is skel.restGlobalMats and bakedInPlace == inPlace
+
+    def bakeSkinningMatrices(self, skel, inPlace=False):
+        """
+        Calculate and cache the skinning matrices of skel for all frames of
+        this animation. Set inPlace to remove translations from the pose
+        matrices.
+        """
+        poseData = self.data.reshape((self.nFrames, self.nBones, 4, 4))
+        baked = np.zeros((self.nFrames, self.nBones, 3, 4), dtype=np.float32)
+        for start in xrange(0, self.nFrames, BAKE_CHUNK_FRAMES):
+            end = min(start+BAKE_CHUNK_FRAMES, self.nFrames)
+            chunk = poseData[start:end]
+            if inPlace:
+                chunk = chunk.copy()
+                chunk[...,:3,3] = 0
+            baked[start:end] = skel.getSkinningMatricesForPoses(chunk)
+        self.__bakedSkinMats = baked
+        self.__bakedFor = (skel, skel.restGlobalMats, inPlace)
+
+    def clearBakedSkinningMatrices(self):
+        self.__bakedSkinMats = None
+        self.__bakedFor = None
+
+    def getFrameIndicesAtTimes(self, times):
+        """
+        Vectorized getFrameIndexAtTime() for an array of times (in seconds).
+        Returns     (frameIdxs, fractions)
+        as an integer and float array.
+        """
+        frames = float(self.frameRate) * np.asarray(times, dtype=np.float64)
+        frameIdxs = np.floor(frames)
+        fractions = frames - frameIdxs
+        frameIdxs = frameIdxs.astype(np.int64)
+
+        if self.loop:
+            # Loop from beginning
+            frameIdxs %= self.nFrames
+        else:
+            # Stop at last frame
+            ended = frameIdxs >= self.nFrames
+            frameIdxs[ended] = self.nFrames-1
+            fractions[ended] = 0
+
+        return frameIdxs, fractions
+
     def getFrameIndexAtTime(self, time):
         """
         Time should be in seconds (float).
@@ -135,14 +258,10 @@ class AnimationTrack(object):
         dropFrames = int(float(self.frameRate)/float(newFrameRate))
         if dropFrames <= 0:
             return
-        indxs = []
-        count = 0
-        for frameI in range(0,self.dataLen,self.nBones):
-            if count == 0:
-                indxs.extend(range(frameI,frameI+self.nBones))
-            count = (count + 1) % dropFrames
-        data = self.data[indxs]
-        self.data = data
+        # Keep every dropFrames-th frame
+        data = self.data.reshape((self.nFrames, self.nBones, 4, 4))[::dropFrames]
+        self.data = data.reshape((-1, 4, 4))
+        self.clearBakedSkinningMatrices()
         self.frameRate = newFrameRate
         self.dataLen = len(self.data)
         self.nFrames = self.dataLen/self.nBones
@@ -159,6 +278,7 @@ class AnimatedMesh(object):
         self.__skeleton = skel
         self.__meshes = []
         self.__vertexToBoneMaps = []
+        self.__skinningWeights = []
         self.__originalMeshCoords = []
         self.addMesh(mesh, vertexToBoneMapping)
 
@@ -209,6 +329,7 @@ class AnimatedMesh(object):
         originalMeshCoords[:,:3] = mesh.coord[:,:3]        
         self.__originalMeshCoords.append(originalMeshCoords)
         self.__vertexToBoneMaps.append(vertexToBoneMapping)
+        self.__skinningWeights.append(skeleton.packVertexWeights(self.__skeleton, vertexToBoneMapping, mesh.getVertexCount()))
         self.__meshes.append(mesh)
 
     def removeMesh(self, name):
@@ -227,6 +348,7 @@ class AnimatedMesh(object):
             del self.__meshes[rIdx]
             del self.__originalMeshCoords[rIdx]
             del self.__vertexToBoneMaps[rIdx]
+            del self.__skinningWeights[rIdx]
 
     def containsMesh(self, mesh):
         mesh2, _ = self.getMesh(mesh.name)
@@ -275,19 +397,28 @@ class AnimatedMesh(object):
 
     def _pose(self):
         if self.__currentAnim:
-            poseState = self.__currentAnim.getAtTime(self.__playTime)
-            if self.__inPlace:
-                poseState = poseState.copy()
-                # Remove translation from matrix
-                poseState[:,:3,3] = np.zeros((poseState.shape[0],3), dtype=np.float32)
-            # TODO pass poseVerts matrices immediately from animation track for performance improvement (cache them)
-            self.__skeleton.setPose(poseState)
+            anim = self.__currentAnim
+            frameIdx, fraction = anim.getFrameIndexAtTime(self.__playTime)
+            if anim.bakeSkinning and (fraction == 0 or anim.interpolationType == 0):
+                # Skin with the baked skinning matrices of the frame, the
+                # skeleton itself is not posed
+                skinMats = anim.getSkinningMatrices(frameIdx, self.__skeleton, self.__inPlace)
+            else:
+                poseState = anim.getAtTime(self.__playTime)
+                if self.__inPlace:
+                    poseState = poseState.copy()
+                    # Remove translation from matrix
+                    poseState[:,:3,3] = np.zeros((poseState.shape[0],3), dtype=np.float32)
+                self.__skeleton.setPose(poseState)
+                skinMats = None
             for idx,mesh in enumerate(self.__meshes):
                 if self.onlyAnimateVisible and not mesh.visibility:
                     continue
-                posedCoords = self.__skeleton.skinMesh(self.__originalMeshCoords[idx], self.__vertexToBoneMaps[idx])
-                # TODO you could avoid an array copy by passing the mesh.coord list directly and modifying it in place
-                self._updateMeshVerts(mesh, posedCoords[:,:3])
+                # Skin directly into the mesh coordinates
+                self.__skeleton.skinMesh(self.__originalMeshCoords[idx], self.__skinningWeights[idx], out=mesh.coord, skinMats=skinMats)
+                mesh.markCoords(coor=True)
+                mesh.calcNormals()
+                mesh.update()
         else:
             self.__skeleton.setToRestPose() # TODO not strictly necessary if you only want to skin the mesh
             for idx,mesh in enumerate(self.__meshes):
@@ -298,6 +429,90 @@ class AnimatedMesh(object):
         mesh.calcNormals()
         mesh.update()
 
+def quaternionsFromMatrices(mats):
+    """
+    Returns the rotation quaternions (w, x, y, z) of the rotation part of a
+    stack of matrices with shape (..., 4, 4) or (..., 3, 3), as
+    np.array((..., 4)). Vectorized version of
+    transformations.quaternion_from_matrix() for rotation matrices.
+    """
+    mats = np.asarray(mats, dtype=np.float64)
+    shape = mats.shape[:-2]
+    m = mats[...,:3,:3].reshape((-1, 3, 3))
+    m00, m01, m02 = m[:,0,0], m[:,0,1], m[:,0,2]
+    m10, m11, m12 = m[:,1,0], m[:,1,1], m[:,1,2]
+    m20, m21, m22 = m[:,2,0], m[:,2,1], m[:,2,2]
+
+    # Four candidate solutions, the one with the largest diagonal term is
+    # numerically the most stable
+    diag = np.column_stack([1+m00+m11+m22, 1+m00-m11-m22, 1-m00+m11-m22, 1-m00-m11+m22])
+    candidates = np.array([
+        [diag[:,0], m21-m12, m02-m20, m10-m01],
+        [m21-m12, diag[:,1], m01+m10, m02+m20],
+        [m02-m20, m01+m10, diag[:,2], m12+m21],
+        [m10-m01, m02+m20, m12+m21, diag[:,3]] ])    # (case, component, n)
+    best = np.argmax(diag, axis=1)
+    n = np.arange(len(best))
+    quats = candidates[best,:,n] * (0.5 / np.sqrt(diag[n,best]))[:,None]
+    return quats.reshape(shape + (4,))
+
+def matricesFromQuaternions(quats, trans=None):
+    """
+    Returns 4x4 matrices np.array((..., 4, 4), dtype=float32) with the
+    rotations of unit quaternions (w, x, y, z) of shape (..., 4) and optional
+    translations of shape (..., 3).
+    """
+    quats = np.asarray(quats, dtype=np.float64)
+    w, x, y, z = quats[...,0], quats[...,1], quats[...,2], quats[...,3]
+    mats = np.zeros(quats.shape[:-1] + (4,4), dtype=np.float32)
+    mats[...,0,0] = 1 - 2*(y*y + z*z)
+    mats[...,0,1] = 2*(x*y - z*w)
+    mats[...,0,2] = 2*(x*z + y*w)
+    mats[...,1,0] = 2*(x*y + z*w)
+    mats[...,1,1] = 1 - 2*(x*x + z*z)
+    mats[...,1,2] = 2*(y*z - x*w)
+    mats[...,2,0] = 2*(x*z - y*w)
+    mats[...,2,1] = 2*(y*z + x*w)
+    mats[...,2,2] = 1 - 2*(x*x + y*y)
+    mats[...,3,3] = 1
+    if trans is not None:
+        mats[...,:3,3] = trans
+    return mats
+
+def _alignQuaternions(q0, q1):
+    """
+    Flip q1 where needed to interpolate q0 and q1 along the shortest path.
+    Returns q1 and the cosines of the angles between the quaternions.
+    """
+    dot = (q0*q1).sum(axis=-1)
+    flip = dot < 0
+    q1 = np.where(flip[...,None], -q1, q1)
+    return q1, np.abs(dot)
+
+def nlerp(q0, q1, t):
+    """
+    Normalized linear interpolation between quaternions q0 and q1, of shape
+    (..., 4), with t of shape (..., 1).
+    """
+    q1, _ = _alignQuaternions(q0, q1)
+    q = q0 * (1-t) + q1 * t
+    return q / np.sqrt((q*q).sum(axis=-1))[...,None]
+
+def slerp(q0, q1, t):
+    """
+    Spherical linear interpolation between quaternions q0 and q1, of shape
+    (..., 4), with t of shape (..., 1).
+    """
+    q1, dot = _alignQuaternions(q0, q1)
+    # Nearly identical rotations are interpolated linearly
+    close = dot > 0.9995
+    angle = np.arccos(np.clip(dot, -1, 1))[...,None]
+    sinAngle = np.where(close[...,None], 1, np.sin(angle))
+    w0 = np.where(close[...,None], 1-t, np.sin((1-t)*angle) / sinAngle)
+    w1 = np.where(close[...,None], t, np.sin(t*angle) / sinAngle)
+    q = q0 * w0 + q1 * w1
+    return q / np.sqrt((q*q).sum(axis=-1))[...,None]
+
 def emptyTrack(nFrames, nBones=1):
     """
     Create an empty (rest pose) animation track pose data array.
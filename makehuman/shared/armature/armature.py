@@ -31,6 +31,7 @@ import numpy.linalg as la
 import transformations as tm
 
 import makehuman
+from vertexweights import VertexWeights
 from .flags import *
 from .utils import *
 
@@ -75,7 +76,7 @@ class Armature:
 
         self.done = False
 
-        self.vertexWeights = OrderedDict([])
+        self.vertexWeights = VertexWeights()
         self.isNormalized = False
 
 
@@ -121,22 +122,7 @@ class Armature:
             return
 
         nVerts = len(human.meshData.coord)
-        wtot = np.zeros(nVerts, float)
-        for vgroup in self.vertexWeights.values():
-            for vn,w in vgroup:
-                wtot[vn] += w
-
-        for bname in self.vertexWeights.keys():
-            vgroup = self.vertexWeights[bname]
-            weights = np.zeros(len(vgroup), float)
-            verts = []
-            n = 0
-            for vn,w in vgroup:
-                verts.append(vn)
-                weights[n] = w/wtot[vn]
-                n += 1
-            self.vertexWeights[bname] = (verts, weights)
-
+        self.vertexWeights = self.vertexWeights.normalized(nVerts)
         self.isNormalized = True
 
 
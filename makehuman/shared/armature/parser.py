@@ -28,6 +28,7 @@ import log
 from collections import OrderedDict
 import io_json
 from getpath import getSysDataPath
+from vertexweights import VertexWeights
 
 import numpy as np
 import numpy.linalg as la
@@ -864,7 +865,7 @@ class Parser:
 
 
     def readVertexGroupFiles(self, files):
-        vgroups = OrderedDict()
+        vgroups = VertexWeights()
         for file in files:
             try:
                 folder,fname = file
@@ -875,10 +876,7 @@ class Parser:
             log.message("Loading %s" % filepath)
             vglist = io_json.loadJson(filepath)
             for key,data in vglist:
-                try:
-                    vgroups[key] += data
-                except KeyError:
-                    vgroups[key] = data
+                vgroups.add(key, data)
             #readVertexGroups(filepath, vgroups, vgroups)
         return vgroups
 
@@ -911,45 +909,22 @@ class Parser:
         vec /= np.dot(vec,vec)
         orig = self.locations[head] + self.origin
 
-        vgroup1 = []
-        vgroup2 = []
-        vgroup3 = []
         obj = self.human.meshData
-
-        #splice = [vw[0] for vw in vgroup]
-        #deltas = obj.coord[splice] - orig
-        #factors = np.dot(deltas, vec)
+        verts,weights = vgroup
+        x = np.dot(obj.coord[verts] - orig, vec)
 
         if npieces == 2:
-            for vn,w in vgroup:
-                y = obj.coord[vn] - orig
-                x = np.dot(vec,y)
-                if x < 0:
-                    vgroup1.append((vn,w))
-                elif x < 0.5:
-                    vgroup1.append((vn, (1-x)*w))
-                    vgroup2.append((vn, x*w))
-                else:
-                    vgroup2.append((vn,w))
-            amt.vertexWeights[defName1] = vgroup1
-            amt.vertexWeights[defName2] = vgroup2
+            in1 = x < 0.5
+            in2 = x >= 0
+            amt.vertexWeights[defName1] = (verts[in1], np.where(x < 0, 1, 1-x)[in1] * weights[in1])
+            amt.vertexWeights[defName2] = (verts[in2], np.where(x < 0.5, x, 1)[in2] * weights[in2])
         elif npieces == 3:
-            for vn,w in vgroup:
-                y = obj.coord[vn] - orig
-                x = np.dot(vec,y)
-                if x < 0:
-                    vgroup1.append((vn,w))
-                elif x < 0.5:
-                    vgroup1.append((vn, (1-2*x)*w))
-                    vgroup2.append((vn, (2*x)*w))
-                elif x < 1:
-                    vgroup2.append((vn, (2-2*x)*w))
-                    vgroup3.append((vn, (2*x-1)*w))
-                else:
-                    vgroup3.append((vn,w))
-            amt.vertexWeights[defName1] = vgroup1
-            amt.vertexWeights[defName2] = vgroup2
-            amt.vertexWeights[defName3] = vgroup3
+            in1 = x < 0.5
+            in2 = (x >= 0) & (x < 1)
+            in3 = x >= 0.5
+            amt.vertexWeights[defName1] = (verts[in1], np.where(x < 0, 1, 1-2*x)[in1] * weights[in1])
+            amt.vertexWeights[defName2] = (verts[in2], np.where(x < 0.5, 2*x, 2-2*x)[in2] * weights[in2])
+            amt.vertexWeights[defName3] = (verts[in3], np.where(x < 1, 2*x-1, 1)[in3] * weights[in3])
 
 
     def mergeBones(self, mergers, boneInfo):
@@ -959,16 +934,13 @@ class Parser:
                 head,tail = self.headsTails[bname]
                 _,tail2 = self.headsTails[merged[1]]
                 self.headsTails[bname] = head,tail2
-            vgroup = amt.vertexWeights[bname]
-            for mbone in merged:
-                if mbone != bname:
-                    vgroup += amt.vertexWeights[mbone]
-                    del amt.vertexWeights[mbone]
-                    del boneInfo[mbone]
-                    for child in boneInfo.values():
-                        if child.parent == mbone:
-                            child.parent = bname
-            amt.vertexWeights[bname] = mergeWeights(vgroup)
+            others = [mbone for mbone in merged if mbone != bname]
+            for mbone in others:
+                del boneInfo[mbone]
+                for child in boneInfo.values():
+                    if child.parent == mbone:
+                        child.parent = bname
+            amt.vertexWeights.merge(bname, others)
 
 
     def addCSysBones(self, csysList, boneInfo):
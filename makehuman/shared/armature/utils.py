@@ -206,22 +206,6 @@ def readVertexGroups(file, vgroups, vgroupList):
     fp.close()
 """
 
-def mergeWeights(vgroup):
-    vgroup.sort()
-    ngroup = []
-    vn0 = -1
-    w0 = 0
-    for vn,w in vgroup:
-        if vn == vn0:
-            w0 += w
-        else:
-            ngroup.append((vn0,w0))
-            vn0 = vn
-            w0 = w
-    if vn0 >= 0:
-        ngroup.append((vn0,w0))
-    return ngroup
-
 #-------------------------------------------------------------------------------
 #
 #-------------------------------------------------------------------------------
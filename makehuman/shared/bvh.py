@@ -35,6 +35,8 @@ import numpy.linalg as la
 from math import pi
 D = pi/180
 
+WRITE_CHUNK_FRAMES = 256    # Number of frames of motion data written at once
+
 
 class BVH():
     """
@@ -137,53 +139,22 @@ class BVH():
         if jointsOrder == None:
             jointsData = [joint.matrixPoses for joint in self.getJoints() if not joint.isEndConnector()]
             # We leave out end effectors as they should not have animation data
+
+            nJoints = len(jointsData)
+            nFrames = len(jointsData[0])
+
+            # Interweave joints animation data, per frame with joints in breadth-first order
+            animData = np.hstack(jointsData).reshape(nJoints*nFrames,4,4)
         else:
-            nFrames = self.frameCount
-            import re
-            # Remove the tail from duplicate bone names
-            for idx,jName in enumerate(jointsOrder):
-                # Joint mappings can contain a rotation compensation
-                if isinstance(jName, tuple):
-                    jName, _ = jName
-                if not jName:
-                    continue
-                r = re.search("(.*)_\d+$",jName)
-                if r:
-                    jointsOrder[idx] = r.group(1)
-
-            jointsData = []
-            for jointName in jointsOrder:
-                if isinstance(jointName, tuple):
-                    jointName, angle = jointName
-                else:
-                    angle = 0.0
-                if jointName:
-                    poseMats = self.getJointByCanonicalName(jointName).matrixPoses.copy()
-                    if isinstance(angle, float):
-                        if angle != 0.0:
-                            # Rotate around global Z axis
-                            rot = tm.rotation_matrix(-angle*D, [0,0,1])
-                            # Roll around global Y axis (this is a limitation)
-                            roll = tm.rotation_matrix(angle*D, [0,1,0])
-                            for i in xrange(nFrames):
-                                # TODO make into numpy loop
-                                poseMats[i] = np.dot(poseMats[i], rot)
-                                poseMats[i] = np.dot(poseMats[i], roll)
-                    else:   # Compensation (angle) is a transformation matrix
-                        # Compensate animation frames
-                        for i in xrange(nFrames):
-                            # TODO make into numpy loop
-                            poseMats[i] = np.mat(poseMats[i]) * np.mat(angle)
-                            #poseMats[i] = np.mat(angle) # Test compensated rest pose
-                    jointsData.append(poseMats)
-                else:
-                    jointsData.append(animation.emptyTrack(nFrames))
+            joints = [joint for joint in self.getJoints() if not joint.isEndConnector()]
+            retargeter = skeleton.Retargeter([joint.name for joint in joints], jointsOrder)
+
+            # Motion of all joints, per frame
+            srcPoses = np.array([joint.matrixPoses for joint in joints]).swapaxes(0,1)
+            nFrames = len(srcPoses)
 
-        nJoints = len(jointsData)
-        nFrames = len(jointsData[0])
+            animData = retargeter.retarget(srcPoses).reshape(-1,4,4)
 
-        # Interweave joints animation data, per frame with joints in breadth-first order
-        animData = np.hstack(jointsData).reshape(nJoints*nFrames,4,4)
         framerate = 1.0/self.frameTime
         return animation.AnimationTrack(name, animData, nFrames, framerate)
 
@@ -246,12 +217,21 @@ class BVH():
         words = self.__expectKeyword('Frame', fp) # Time:
         self.frameTime = float(words[2])
 
-        for i in range(self.frameCount):
-            line = fp.readline()
-            words = line.split()
-            data = [float(word) for word in words]
-            for joint in self.getJointsBVHOrder():
-                data = self.__processChannelData(joint, data)
+        # Read all frames at once, one row of channel data per frame
+        nChannels = sum([len(joint.channels) for joint in self.getJointsBVHOrder()])
+        motionData = np.fromstring(fp.read(), dtype=np.float64, sep=' ')
+        fp.close()
+        dataLen = self.frameCount * nChannels
+        if len(motionData) < dataLen:
+            raise RuntimeError('Expected %s values of motion data (%s frames of %s channels), found %s' % (dataLen, self.frameCount, nChannels, len(motionData)))
+        motionData = motionData[:dataLen].reshape((self.frameCount, nChannels))
+
+        # Distribute the channel columns among the joints
+        chanIdx = 0
+        for joint in self.getJointsBVHOrder():
+            nJointChannels = len(joint.channels)
+            joint.frames = motionData[:,chanIdx:chanIdx+nJointChannels].ravel()
+            chanIdx += nJointChannels
 
         self.__cacheGetJoints()
 
@@ -320,28 +300,20 @@ class BVH():
             self.frameCount = animationTrack.nFrames
             self.frameTime = 1.0/animationTrack.frameRate
 
-            jointToBoneIdx = {}
+            poseData = animationTrack.data.reshape((animationTrack.nFrames, animationTrack.nBones, 4, 4))
             for joint in nonEndJoints:
                 if skel.containsBone(joint.name):
-                    jointToBoneIdx[joint.name] = skel.getBone(joint.name).index
+                    poseMats = poseData[:, skel.getBone(joint.name).index]
                 else:
-                    jointToBoneIdx[joint.name] = -1
-
-            for fIdx in xrange(animationTrack.nFrames):
-                offset = fIdx * animationTrack.nBones
-                for jIdx,joint in enumerate(nonEndJoints):
-                    bIdx = jointToBoneIdx[joint.name]
-                    if bIdx < 0:
-                        poseMat = np.identity(4, dtype=np.float32)
-                    else:
-                        poseMat = animationTrack.data[offset + bIdx]
-
-                    if len(joint.channels) == 6:
-                        # Add transformation
-                        tx, ty, tz = poseMat[:3,3]
-                        joint.frames.extend([tx, ty, tz])
-                    ay,ax,az = tm.euler_from_matrix(poseMat, "syxz")
-                    joint.frames.extend([az/D, ax/D, ay/D])
+                    poseMats = animation.emptyTrack(animationTrack.nFrames)
+
+                channelData = []
+                if len(joint.channels) == 6:
+                    # Add transformation
+                    channelData.extend([poseMats[:,0,3], poseMats[:,1,3], poseMats[:,2,3]])
+                ay,ax,az = eulerFromMatrices(poseMats, "syxz")
+                channelData.extend([az/D, ax/D, ay/D])
+                joint.frames = np.column_stack(channelData).ravel()
         else:
             # Add bogus animation with one frame
             self.frameCount = 1
@@ -371,19 +343,15 @@ class BVH():
         f.write('Frames: %s\n' % self.frameCount)
         f.write('Frame Time: %f\n' % self.frameTime)
 
+        # Write motion data in chunks of frames, one line per frame
         allJoints = [joint for joint in self.getJointsBVHOrder() if not joint.isEndConnector()]
-        jointsData = [joint.matrixPoses for joint in allJoints]
-        nJoints = len(jointsData)
-        nFrames = len(jointsData[0])
-        totalChannels = sum([len(joint.channels) for joint in allJoints])
-
-        for fIdx in xrange(self.frameCount):
-            frameData = []
-            for joint in allJoints:
-                offset = fIdx * len(joint.channels)
-                frameData.extend(joint.frames[offset:offset + len(joint.channels)])
-            frameData = [str(fl) for fl in frameData]
-            f.write('%s\n' % " ".join(frameData))
+        jointsData = [np.asarray(joint.frames).reshape((-1, len(joint.channels))) for joint in allJoints]
+        for start in xrange(0, self.frameCount, WRITE_CHUNK_FRAMES):
+            end = min(start + WRITE_CHUNK_FRAMES, self.frameCount)
+            frameData = np.hstack([jointData[start:end] for jointData in jointsData])
+            # Six significant digits, as most BVH files are written with
+            lineFmt = ' '.join(['%.6g'] * frameData.shape[1]) + '\n'
+            f.write((lineFmt * len(frameData)) % tuple(frameData.ravel().tolist()))
         f.close()
 
     def _writeJoint(self, f, joint, ident):
@@ -460,17 +428,6 @@ class BVH():
             else:
                 raise RuntimeError('Expected %s found %s' % ('JOINT, End Site or }', words[0]))
 
-    def __processChannelData(self, joint, data):
-        """
-        Distribute animation channel data for one frame or motion sample, 
-        loaded from a BVH file, among the joints of the skeleton structure.
-        """
-        nChannels = len(joint.channels)
-        joint.frames.extend(data[:nChannels])
-        data = data[nChannels:]
-
-        return data
-
     def __calcPosition(self, joint, offset):
         """
         Calculate this joint's position using offset (from parent) defined in
@@ -552,8 +509,10 @@ class BVHJoint():
     def calculateFrames(self):
         """
         Calculate transformation matrices from this joint's (BVH) channel data.
+        The channel data is kept in double precision, the pose matrices are
+        float32.
         """
-        self.frames = np.asarray(self.frames, dtype=np.float32)
+        self.frames = np.asarray(self.frames, dtype=np.float64)
         nChannels = len(self.channels)
         nFrames = self.skeleton.frameCount
         dataLen = nFrames * nChannels
@@ -605,24 +564,16 @@ class BVHJoint():
             # TODO allow partial rotation channels too?
             pass
         elif len(rotAngles) >= 3:
-            for frameIdx in range(nFrames):
-                self.matrixPoses[frameIdx,:3,:3] = tm.euler_matrix(rotAngles[2][frameIdx], rotAngles[1][frameIdx], rotAngles[0][frameIdx], axes=rotOrder)[:3,:3]
-
-            # TODO eliminate loop with numpy?
-            '''
-            for rotAngle in rotAngles:  
-                self.matrixPoses[:] = tm.euler_matrix(rotAngle[2], rotAngle[1], rotAngle[0], axes=rotOrder))
-            # unfortunately tm.euler_matrix is not a np ufunc
-            '''
+            self.matrixPoses[:,:3,:3] = eulerMatrices(rotAngles[2], rotAngles[1], rotAngles[0], axes=rotOrder)
 
         # Add translations to pose matrices
         # Allow partial transformation channels too
-        if rXs != None or rYs != None or rZs != None:
-            if rXs == None:
+        if rXs is not None or rYs is not None or rZs is not None:
+            if rXs is None:
                 rXs = np.zeros(nFrames, dtype=np.float32)
-            if rYs == None:
+            if rYs is None:
                 rYs = np.zeros(nFrames, dtype=np.float32)
-            if rZs == None:
+            if rZs is None:
                 rZs = np.zeros(nFrames, dtype=np.float32)
 
             self.matrixPoses[:,:3,3] = np.column_stack([rXs,rYs,rZs])[:,:]
@@ -657,3 +608,92 @@ def createFromSkeleton(skel, animationTrack = None):
     result = BVH()
     result.fromSkeleton(skel, animationTrack)
     return result
+
+
+def eulerMatrices(ai, aj, ak, axes='sxyz'):
+    """
+    Vectorized version of transformations.euler_matrix(): returns the 3x3
+    rotation matrices for arrays of Euler angles ai, aj and ak, as
+    np.array((n, 3, 3), dtype=float64).
+    """
+    try:
+        firstaxis, parity, repetition, frame = tm._AXES2TUPLE[axes]
+    except (AttributeError, KeyError):
+        tm._TUPLE2AXES[axes]  # validation
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = tm._NEXT_AXIS[i+parity]
+    k = tm._NEXT_AXIS[i-parity+1]
+
+    ai = np.asarray(ai, dtype=np.float64)
+    aj = np.asarray(aj, dtype=np.float64)
+    ak = np.asarray(ak, dtype=np.float64)
+    if frame:
+        ai, ak = ak, ai
+    if parity:
+        ai, aj, ak = -ai, -aj, -ak
+
+    si, sj, sk = np.sin(ai), np.sin(aj), np.sin(ak)
+    ci, cj, ck = np.cos(ai), np.cos(aj), np.cos(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
+
+    M = np.zeros((len(ai), 3, 3), dtype=np.float64)
+    if repetition:
+        M[:, i, i] = cj
+        M[:, i, j] = sj*si
+        M[:, i, k] = sj*ci
+        M[:, j, i] = sj*sk
+        M[:, j, j] = -cj*ss+cc
+        M[:, j, k] = -cj*cs-sc
+        M[:, k, i] = -sj*ck
+        M[:, k, j] = cj*sc+cs
+        M[:, k, k] = cj*cc-ss
+    else:
+        M[:, i, i] = cj*ck
+        M[:, i, j] = sj*sc-cs
+        M[:, i, k] = sj*cc+ss
+        M[:, j, i] = cj*sk
+        M[:, j, j] = sj*ss+cc
+        M[:, j, k] = sj*cs-sc
+        M[:, k, i] = -sj
+        M[:, k, j] = cj*si
+        M[:, k, k] = cj*ci
+    return M
+
+def eulerFromMatrices(mats, axes='sxyz'):
+    """
+    Vectorized version of transformations.euler_from_matrix(): returns the
+    Euler angles (ai, aj, ak) of a stack of rotation matrices with shape
+    (n, 4, 4) or (n, 3, 3), as three arrays of length n.
+    """
+    try:
+        firstaxis, parity, repetition, frame = tm._AXES2TUPLE[axes.lower()]
+    except (AttributeError, KeyError):
+        tm._TUPLE2AXES[axes]  # validation
+        firstaxis, parity, repetition, frame = axes
+
+    i = firstaxis
+    j = tm._NEXT_AXIS[i+parity]
+    k = tm._NEXT_AXIS[i-parity+1]
+
+    M = np.asarray(mats, dtype=np.float64)[:, :3, :3]
+    if repetition:
+        sy = np.sqrt(M[:, i, j]*M[:, i, j] + M[:, i, k]*M[:, i, k])
+        regular = sy > tm._EPS
+        ax = np.where(regular, np.arctan2( M[:, i, j],  M[:, i, k]), np.arctan2(-M[:, j, k],  M[:, j, j]))
+        ay = np.arctan2( sy,       M[:, i, i])
+        az = np.where(regular, np.arctan2( M[:, j, i], -M[:, k, i]), 0.0)
+    else:
+        cy = np.sqrt(M[:, i, i]*M[:, i, i] + M[:, j, i]*M[:, j, i])
+        regular = cy > tm._EPS
+        ax = np.where(regular, np.arctan2( M[:, k, j],  M[:, k, k]), np.arctan2(-M[:, j, k],  M[:, j, j]))
+        ay = np.arctan2(-M[:, k, i],  cy)
+        az = np.where(regular, np.arctan2( M[:, j, i],  M[:, i, i]), 0.0)
+
+    if parity:
+        ax, ay, az = -ax, -ay, -az
+    if frame:
+        ax, az = az, ax
+    return ax, ay, az
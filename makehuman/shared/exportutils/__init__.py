@@ -23,6 +23,7 @@ Export utilities available to all exporters.
 """
 
 
+from . import arraytext
 from . import collect
 from . import config
 from . import custom
@@ -0,0 +1,62 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Writing of numpy arrays to text files, for the text based exporters.
+
+The rows of an array are formatted with one string format operation per
+chunk of rows, instead of one per row or element, and written chunk by chunk,
+so that the memory used does not grow with the size of the mesh.
+"""
+
+import numpy as np
+
+CHUNK_SIZE = 4096
+
+
+def formatRows(fmt, data, sep = '', chunkSize = CHUNK_SIZE):
+    """
+    Yields the rows of data formatted with fmt, separated by sep, as strings
+    of at most chunkSize rows.
+    fmt contains a conversion for each column of data (each element, for a
+    one dimensional array), in Python string formatting syntax. Floats are
+    formatted as Python floats, so use '%s' only with arrays converted to
+    strings (data.astype(str)), to get the numpy representation.
+    """
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data.reshape(-1, 1)
+    nRows = len(data)
+    for start in xrange(0, nRows, chunkSize):
+        chunk = data[start:start+chunkSize]
+        if start + len(chunk) < nRows:
+            chunkFmt = (fmt + sep) * len(chunk)
+        else:
+            chunkFmt = (fmt + sep) * (len(chunk) - 1) + fmt
+        yield chunkFmt % tuple(chunk.ravel().tolist())
+
+
+def writeRows(fp, fmt, data, sep = '', chunkSize = CHUNK_SIZE):
+    """
+    Write the rows of data formatted with fmt and separated by sep to file
+    fp (see formatRows).
+    """
+    for text in formatRows(fmt, data, sep, chunkSize):
+        fp.write(text)
@@ -160,17 +160,12 @@ def filterMesh(richMesh, deleteGroups, deleteVerts, useFaceMask = False):
     """
     obj = richMesh.object
 
-    killUvs = numpy.zeros(len(obj.texco), bool)
-    killFaces = numpy.zeros(len(obj.fvert), bool)
-
     if deleteVerts is not None:
-        killVerts = deleteVerts
-        for fn,fverts in enumerate(obj.fvert):
-            for vn in fverts:
-                if killVerts[vn]:
-                    killFaces[fn] = True
+        killVerts = numpy.array(deleteVerts, bool)
+        killFaces = killVerts[obj.fvert].any(axis=1)
     else:
         killVerts = numpy.zeros(len(obj.coord), bool)
+        killFaces = numpy.zeros(len(obj.fvert), bool)
 
     killGroups = []
     for fg in obj.faceGroups:
@@ -184,74 +179,38 @@ def filterMesh(richMesh, deleteGroups, deleteVerts, useFaceMask = False):
         # Apply the facemask set on the module3d object (the one used for rendering within MH)
         faceMask = numpy.logical_or(faceMask, numpy.logical_not(obj.getFaceMask()))
     killFaces[faceMask] = True
+    keepFaces = numpy.logical_not(killFaces)
+
+    # Vertices and UVs not used by any of the remaining faces are removed
+    keepVerts = numpy.zeros(len(obj.coord), bool)
+    keepVerts[obj.fvert[numpy.logical_not(faceMask)]] = True
+    keepVerts[killVerts] = False
+
+    keepUvs = numpy.zeros(len(obj.texco), bool)
+    keepUvs[obj.fuvs[numpy.logical_not(faceMask)]] = True
+
+    # Tables mapping original to filtered vertex and UV indices
+    newVerts = numpy.cumsum(keepVerts) - 1
+    newUvs = numpy.cumsum(keepUvs) - 1
+
+    coords = obj.coord[keepVerts]
+    texVerts = obj.texco[keepUvs]
+    faceVerts = newVerts[obj.fvert[keepFaces]]
+    faceUvs = newUvs[obj.fuvs[keepFaces]]
 
-    #verts = obj.fvert[faceMask]
-    verts = obj.fvert[numpy.logical_not(faceMask)]
-    vertMask = numpy.ones(len(obj.coord), bool)
-    vertMask[verts] = False
-    verts = numpy.argwhere(vertMask)
-    del vertMask
-    killVerts[verts] = True
-
-    #uvs = obj.fuvs[faceMask]
-    uvs = obj.fuvs[numpy.logical_not(faceMask)]
-    uvMask = numpy.ones(len(obj.texco), bool)
-    uvMask[uvs] = False
-    uvs = numpy.argwhere(uvMask)
-    del uvMask
-    killUvs[uvs] = True
-
-    n = 0
-    newVerts = {}
-    coords = []
-    for m,co in enumerate(obj.coord):
-        if not killVerts[m]:
-            coords.append(co)
-            newVerts[m] = n
-            n += 1
-
-    n = 0
-    texVerts = []
-    newUvs = {}
-    for m,uv in enumerate(obj.texco):
-        if not killUvs[m]:
-            texVerts.append(uv)
-            newUvs[m] = n
-            n += 1
-
-    faceVerts = []
-    faceUvs = []
-    for fn,fverts in enumerate(obj.fvert):
-        if not killFaces[fn]:
-            fverts2 = []
-            fuvs2 = []
-            for vn in fverts:
-                fverts2.append(newVerts[vn])
-            for uv in obj.fuvs[fn]:
-                fuvs2.append(newUvs[uv])
-            faceVerts.append(fverts2)
-            faceUvs.append(fuvs2)
-
-    weights = {}
-    if richMesh.weights:
-        for (b, wts1) in richMesh.weights.items():
-            wts2 = []
-            for (v1,w) in wts1:
-                if not killVerts[v1]:
-                   wts2.append((newVerts[v1],w))
-            weights[b] = wts2
+    weights = richMesh.weights.remapped(numpy.where(keepVerts, newVerts, -1))
 
     shapes = []
     if richMesh.shapes:
         for (name, morphs1) in richMesh.shapes:
-            verts = [newVerts[v1] for v1 in morphs1.verts if not killVerts[v1]]
-            slice = [n for n,v1 in enumerate(morphs1.verts) if not killVerts[v1]]
-            data = morphs1.data[slice]
-            shapes.append((name, FakeTarget(name, verts, data)))
+            verts = numpy.asarray(morphs1.verts, dtype=numpy.intp)
+            keep = keepVerts[verts]
+            data = morphs1.data[numpy.flatnonzero(keep)]
+            shapes.append((name, FakeTarget(name, newVerts[verts[keep]].tolist(), data)))
 
     richMesh.fromData(coords, texVerts, faceVerts, faceUvs, weights, shapes, obj.material)
-    richMesh.vertexMask = numpy.logical_not(killVerts)
-    richMesh.vertexMapping = newVerts
+    richMesh.vertexMask = keepVerts
+    richMesh.vertexMapping = dict(zip(numpy.flatnonzero(keepVerts).tolist(), xrange(len(coords))))
     richMesh.faceMask = numpy.logical_not(faceMask)
     return richMesh
 
@@ -129,8 +129,11 @@ class Config:
             try:
                 os.mkdir(folder)
             except:
-                log.error("Unable to create separate folder:", exc_info=True)
-                return None
+                # Processes exporting to the same folder (batch export) can
+                # create it between the check and mkdir
+                if not os.path.isdir(folder):
+                    log.error("Unable to create separate folder:", exc_info=True)
+                    return None
         return folder
 
 
@@ -931,7 +931,11 @@ class Material(object):
     shader = property(getShader, setShader)
 
     def getShaderObj(self):
-        import shader
+        try:
+            import shader
+        except ImportError:
+            # No OpenGL available, when running headless
+            return None
         if not shader.Shader.supported():
             return None
         shaderPath = self.getShader()
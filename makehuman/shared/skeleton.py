@@ -33,6 +33,8 @@ assignments.
 
 import math
 from math import pi
+import time
+import re
 
 import numpy as np
 import numpy.linalg as la
@@ -40,6 +42,7 @@ import transformations as tm
 import matrix
 
 import log
+from vertexweights import VertexWeights
 
 D = pi/180
 
@@ -88,40 +91,16 @@ class Skeleton(object):
 
         self.build()
 
-        # Normalize weights and put them in np format
-        boneWeights = {}
-        wtot = np.zeros(mesh.getVertexCount(), np.float32)
-        for vgroup in amt.vertexWeights.values():
-            for vn,w in vgroup:
-                wtot[vn] += w
-
-        for bname,vgroup in amt.vertexWeights.items():
-            weights = np.zeros(len(vgroup), np.float32)
-            verts = []
-            n = 0
-            for vn,w in vgroup:
-                verts.append(vn)
-                weights[n] = w/wtot[vn]
-                n += 1
-            boneWeights[bname] = (verts, weights)
+        # Normalize weights
+        nVerts = mesh.getVertexCount()
+        boneWeights = amt.vertexWeights.normalized(nVerts)
 
         # Assign unweighted vertices to root bone with weight 1
         rootBone = self.roots[0].name
-        informed = False
-        if rootBone not in boneWeights.keys():
-            boneWeights[rootBone] = ([], [])
-        else:
-            vs,ws = boneWeights[rootBone]
-            boneWeights[rootBone] = (list(vs), list(ws))
-        vs,ws = boneWeights[rootBone]
-        for vIdx, wCount in enumerate(wtot):
-            if wCount == 0:
-                vs.append(vIdx)
-                ws.append(1.0)
-                if not informed:
-                    log.debug("Adding trivial bone weights to bone %s for unweighted vertices.", rootBone)
-                    informed = True
-        boneWeights[rootBone] = (vs, np.asarray(ws, dtype=np.float32))
+        unweighted = np.flatnonzero(amt.vertexWeights.getVertexTotals(nVerts) == 0)
+        if len(unweighted):
+            log.debug("Adding trivial bone weights to bone %s for unweighted vertices.", rootBone)
+        boneWeights.add(rootBone, (unweighted, np.ones(len(unweighted), np.float32)))
 
         return boneWeights
 
@@ -135,12 +114,74 @@ class Skeleton(object):
 
     def build(self):
         self.__cacheGetBones()
+
+        # Matrices of all bones in breadth-first order, the matrices of each
+        # bone are views on these. They are kept in double precision, only the
+        # skinning matrices are converted to float32.
+        nBones = len(self.boneslist)
+        identity = np.tile(np.identity(4, dtype=np.float64), (nBones,1,1))
+        self.restGlobalMats = identity.copy()
+        self.invRestGlobalMats = identity.copy()
+        self.restRelativeMats = identity.copy()
+        self.poseMats = identity.copy()
+        self.poseGlobalMats = identity.copy()
+        self.poseVertsMats = identity
+
         for bone in self.getBones():
             bone.build()
 
-    def update(self):
+        # Bones of the same depth are consecutive in the breadth-first list
+        depths = []
         for bone in self.getBones():
-            bone.update()
+            depths.append(depths[bone.parent.index]+1 if bone.parent else 0)
+        self.__levels = []
+        start = 0
+        for end in xrange(1, nBones+1):
+            if end == nBones or depths[end] != depths[start]:
+                bones = self.boneslist[start:end]
+                if depths[start] == 0:
+                    parentIdxs = None
+                else:
+                    parentIdxs = np.array([bone.parent.index for bone in bones], dtype=np.int32)
+                self.__levels.append( (slice(start, end), parentIdxs) )
+                start = end
+
+    def update(self):
+        """
+        Recalculate the global pose matrices of all bones.
+        Should be called after changing pose matrices.
+        """
+        self._calcPoseMats(self.poseMats, self.poseGlobalMats, self.poseVertsMats)
+
+    def _calcPoseMats(self, poseMats, poseGlobalMats, poseVertsMats):
+        """
+        Calculate global and pose verts matrices from pose matrices, one level
+        of the bone hierarchy at a time. The matrix arrays have shape
+        (..., nBones, 4, 4), allowing to calculate several poses at once.
+        """
+        localMats = np.einsum('nij,...njk->...nik', self.restRelativeMats, poseMats)
+        for levelSlice, parentIdxs in self.__levels:
+            if parentIdxs is None:
+                poseGlobalMats[...,levelSlice,:,:] = localMats[...,levelSlice,:,:]
+            else:
+                poseGlobalMats[...,levelSlice,:,:] = np.einsum('...nij,...njk->...nik', poseGlobalMats[...,parentIdxs,:,:], localMats[...,levelSlice,:,:])
+        poseVertsMats[...] = np.einsum('...nij,njk->...nik', poseGlobalMats, self.invRestGlobalMats)
+
+    def _toPoseMats(self, poseData):
+        """
+        Convert pose data, as passed to setPose(), of shape (..., nBones, 4, 4)
+        to pose matrices relative to the rest pose of the bones.
+        """
+        # Calculate rotations
+        rotMats = np.zeros(poseData.shape, dtype=np.float64)
+        rotMats[...,:3,:3] = poseData[...,:3,:3]
+        rotMats[...,3,3] = 1
+        rotMats = np.einsum('nij,...njk->...nik', self.invRestGlobalMats, rotMats)
+        poseMats = np.einsum('...nij,njk->...nik', rotMats, self.restGlobalMats)
+
+        # Add translations from original
+        poseMats[...,:3,3] = poseData[...,:3,3]
+        return poseMats
 
     def getBoneCount(self):
         return len(self.getBones())
@@ -151,15 +192,9 @@ class Skeleton(object):
         one matrix per bone, bones in breadth-first order (same order as
         getBones()).
 
-        returns     np.array((nBones, 4, 4), dtype=float32)
+        returns     np.array((nBones, 4, 4), dtype=float64)
         """
-        nBones = self.getBoneCount()
-        poseMats = np.zeros((nBones,4,4),dtype=np.float32)
-
-        for bIdx, bone in enumerate(self.getBones()):    # TODO eliminate loop?
-            poseMats[bIdx] = bone.matPose
-
-        return poseMats
+        return self.poseMats.copy()
 
     def setPose(self, poseMats):
         """
@@ -168,43 +203,71 @@ class Skeleton(object):
 
         poseMats    np.array((nBones, 4, 4), dtype=float32)
         """
-        for bIdx, bone in enumerate(self.getBones()):
-            bone.matPose = np.identity(4, dtype=np.float32)
-
-            # Calculate rotations
-            bone.matPose[:3,:3] = poseMats[bIdx,:3,:3]
-            invRest = la.inv(bone.matRestGlobal)
-            bone.matPose = np.dot(np.dot(invRest, bone.matPose), bone.matRestGlobal)
-
-            # Add translations from original
-            bone.matPose[:3,3] = poseMats[bIdx,:3,3]
-        # TODO avoid this loop, eg by storing a pre-allocated poseMats np array in skeleton and keeping a reference to a sub-array in each bone. It would allow batch processing of all pose matrices in one np call
+        self.poseMats[:] = self._toPoseMats(poseMats)
         self.update()
 
     def isInRestPose(self):
-        for bone in self.getBones():
-            if not bone.isInRestPose():
-                return False
-        return True
+        return (self.poseMats == np.identity(4, np.float32)).all()
 
     def setToRestPose(self):
-        for bone in self.getBones():
-            bone.setToRestPose()
+        self.poseMats[:] = np.identity(4, np.float32)
+        self.update()
 
-    def skinMesh(self, meshCoords, vertBoneMapping):
+    def getSkinningMatrices(self):
         """
-        Update (pose) assigned mesh using linear blend skinning.
+        Returns the pose verts matrices of all bones, in breadth-first order
+        (same order as getBones()), without their last row.
+
+        returns     np.array((nBones, 3, 4), dtype=float32)
+        """
+        return self.poseVertsMats[:,:3,:4].astype(np.float32)
+
+    def getSkinningMatricesForPoses(self, poseData):
         """
-        nVerts = len(meshCoords)
-        coords = np.zeros((nVerts,4), float)
-        for bname, mapping in vertBoneMapping.items():
-            bone = self.getBone(bname)
-            verts,weights = mapping
-            vec = np.dot(bone.matPoseVerts, meshCoords[verts].transpose())
-            wvec = weights*vec
-            coords[verts] += wvec.transpose()
+        Returns the skinning matrices (see getSkinningMatrices()) for a number
+        of poses at once, without changing the pose of this skeleton.
 
-        return coords
+        poseData    np.array((nPoses, nBones, 4, 4), dtype=float32)
+            pose matrices as passed to setPose(), for each pose
+
+        returns     np.array((nPoses, nBones, 3, 4), dtype=float32)
+        """
+        poseMats = self._toPoseMats(poseData)
+        poseGlobalMats = np.empty_like(poseMats)
+        poseVertsMats = np.empty_like(poseMats)
+        self._calcPoseMats(poseMats, poseGlobalMats, poseVertsMats)
+        return np.ascontiguousarray(poseVertsMats[...,:3,:4], dtype=np.float32)
+
+    def skinMesh(self, meshCoords, vertBoneMapping, out=None, skinMats=None):
+        """
+        Update (pose) assigned mesh using linear blend skinning.
+
+        meshCoords      np.array((nVerts, 4), dtype=float32)
+            homogenous rest coordinates of the mesh
+        vertBoneMapping
+            (boneIdxs, weights) as returned by packVertexWeights(), or
+            vertex-to-bone weights in {boneName: (vertIdxs, weights)} format
+            (which is packed on every call)
+        out             np.array((nVerts, 3), dtype=float32)
+            optional array (eg. mesh.coord) to write the posed coordinates to
+        skinMats        np.array((nBones, 3, 4), dtype=float32)
+            optional skinning matrices to use instead of those of the current
+            pose of this skeleton
+
+        returns     np.array((nVerts, 3), dtype=float32)
+        """
+        if isinstance(vertBoneMapping, dict):
+            vertBoneMapping = packVertexWeights(self, vertBoneMapping, len(meshCoords))
+        boneIdxs, weights = vertBoneMapping
+        if skinMats is None:
+            skinMats = self.getSkinningMatrices()
+
+        # Blend the skinning matrices of each vertex, then transform it
+        vertMats = np.einsum('nk,nkij->nij', weights, skinMats[boneIdxs])
+        if out is None:
+            out = np.empty((len(meshCoords), 3), dtype=np.float32)
+        np.einsum('nij,nj->ni', vertMats, meshCoords, out=out)
+        return out
 
     def getBones(self):
         """
@@ -245,6 +308,14 @@ class Skeleton(object):
     def containsBone(self, name):
         return name in self.bones.keys()
 
+    def getBoneLevels(self):
+        """
+        Returns the bones grouped per depth in the hierarchy, as a list of
+        slices into the breadth-first bone list (root level first).
+        Bones within one level do not depend on each other.
+        """
+        return [levelSlice for levelSlice, _ in self.__levels]
+
     def getBoneToIdxMapping(self):
         result = {}
         boneNames = [ bone.name for bone in self.getBones() ]
@@ -287,6 +358,22 @@ class Skeleton(object):
         # TODO compare two skeletons (structure only)
 
 
+def _skeletonMatrix(name, doc):
+    """
+    Bone property for the view on the matrix of a bone in the specified
+    (nBones,4,4) matrix array of its skeleton.
+    """
+    def getMatrices(bone):
+        if bone.index is None or not hasattr(bone.skeleton, name):
+            raise RuntimeError("Bone %s has no matrices, its skeleton is not built" % bone.name)
+        return getattr(bone.skeleton, name)
+    def fget(bone):
+        return getMatrices(bone)[bone.index]
+    def fset(bone, value):
+        getMatrices(bone)[bone.index] = value
+    return property(fget, fset, doc=doc)
+
+
 class Bone(object):
 
     def __init__(self, skel, name, parentName, headPos, tailPos, roll=0):
@@ -316,20 +403,16 @@ class Bone(object):
 
         self.index = None   # The index of this bone in the breadth-first bone list
 
-        # Matrices:
-        # static
-        #  matRestGlobal:     4x4 rest matrix, relative world
-        #  matRestRelative:   4x4 rest matrix, relative parent
-        # posed
-        #  matPose:           4x4 pose matrix, relative parent and own rest pose
-        #  matPoseGlobal:     4x4 matrix, relative world
-        #  matPoseVerts:      4x4 matrix, relative world and own rest pose
-
-        self.matRestGlobal = None
-        self.matRestRelative = None
-        self.matPose = None
-        self.matPoseGlobal = None
-        self.matPoseVerts = None
+
+    # Matrices, stored in the skeleton (available after building it):
+    # static
+    matRestGlobal = _skeletonMatrix('restGlobalMats', "4x4 rest matrix, relative world")
+    invRestGlobal = _skeletonMatrix('invRestGlobalMats', "4x4 inverse of matRestGlobal")
+    matRestRelative = _skeletonMatrix('restRelativeMats', "4x4 rest matrix, relative parent")
+    # posed
+    matPose = _skeletonMatrix('poseMats', "4x4 pose matrix, relative parent and own rest pose")
+    matPoseGlobal = _skeletonMatrix('poseGlobalMats', "4x4 matrix, relative world")
+    matPoseVerts = _skeletonMatrix('poseVertsMats', "4x4 matrix, relative world and own rest pose")
 
     def __repr__(self):
         return ("  <Bone %s>" % self.name)
@@ -350,8 +433,13 @@ class Bone(object):
 
         # Update rest matrices
         self.length, self.matRestGlobal = getMatrix(self.head3, self.tail3, self.roll)
+        try:
+            self.invRestGlobal = la.inv(self.matRestGlobal)
+        except la.LinAlgError:
+            log.debug("Cannot calculate pose verts matrix for bone %s %s %s", self.name, self.getRestHeadPos(), self.getRestTailPos())
+            log.debug("Non-singular rest matrix %s", self.matRestGlobal)
         if self.parent:
-            self.matRestRelative = np.dot(la.inv(self.parent.matRestGlobal), self.matRestGlobal)
+            self.matRestRelative = np.dot(self.parent.invRestGlobal, self.matRestGlobal)
         else:
             self.matRestRelative = self.matRestGlobal
 
@@ -372,11 +460,7 @@ class Bone(object):
         else:
             self.matPoseGlobal = np.dot(self.matRestRelative, self.matPose)
 
-        try:
-            self.matPoseVerts = np.dot(self.matPoseGlobal, la.inv(self.matRestGlobal))
-        except:
-            log.debug("Cannot calculate pose verts matrix for bone %s %s %s", self.name, self.getRestHeadPos(), self.getRestTailPos())
-            log.debug("Non-singular rest matrix %s", self.matRestGlobal)
+        self.matPoseVerts = np.dot(self.matPoseGlobal, self.invRestGlobal)
 
     def getHead(self):
         """
@@ -665,7 +749,8 @@ def loadRig(options, mesh):
     """
     Initializes a skeleton from an option set
     Returns the skeleton and vertex-to-bone weights.
-    Weights are of format: {"boneName": [ (vertIdx, weight), ...], ...}
+    Weights are a VertexWeights mapping of bone names to (verts, weights)
+    arrays.
     """
     from armature.options import ArmatureOptions
 
@@ -678,31 +763,38 @@ def loadRig(options, mesh):
 
 def getProxyWeights(proxy, humanWeights, mesh):
 
-    # Zip vertex indices and weights
-    rawWeights = {}
-    for (key, val) in humanWeights.items():
-        indxs, weights = val
-        rawWeights[key] = zip(indxs, weights)
-    vertexWeights = proxy.getWeights(rawWeights)
-
-    # Unzip and normalize weights (and put them in np format)
-    boneWeights = {}
-    wtot = np.zeros(mesh.getVertexCount(), np.float32)
-    for vgroup in vertexWeights.values():
-        for vn,w in vgroup:
-            wtot[vn] += w
-
-    for bname,vgroup in vertexWeights.items():
-        weights = np.zeros(len(vgroup), np.float32)
-        verts = []
-        n = 0
-        for vn,w in vgroup:
-            verts.append(vn)
-            weights[n] = w/wtot[vn]
-            n += 1
-        boneWeights[bname] = (verts, weights)
-
-    return boneWeights
+    vertexWeights = proxy.getWeights(VertexWeights(humanWeights))
+    return vertexWeights.normalized(mesh.getVertexCount())
+
+def packVertexWeights(skel, vertBoneMapping, nVerts):
+    """
+    Convert vertex-to-bone weights in {boneName: (vertIdxs, weights)} format
+    to a fixed-width layout for skinning, with bones identified by their
+    index in skel.getBones().
+    Returns (boneIdxs, weights), both of shape (nVerts, K), with K the
+    maximum number of bones a vertex is assigned to. Unused slots are
+    assigned to the first bone with weight 0.
+    """
+    vertBoneMapping = VertexWeights(vertBoneMapping)
+    names, _, verts, weights = vertBoneMapping.compile()
+    if not len(verts):
+        return np.zeros((nVerts,1), np.int32), np.zeros((nVerts,1), np.float32)
+    boneIdxs = np.array([skel.getBone(bname).index for bname in names], np.int32)
+    boneIdxs = boneIdxs[vertBoneMapping.getGroupIndices()]
+
+    # Slot of each weight within the row of its vertex
+    order = np.argsort(verts, kind='mergesort')
+    verts = verts[order]
+    counts = np.bincount(verts, minlength=nVerts)
+    rowStart = np.cumsum(counts) - counts
+    slots = np.arange(len(verts)) - rowStart[verts]
+
+    nSlots = max(1, counts.max())
+    packedIdxs = np.zeros((nVerts, nSlots), np.int32)
+    packedWeights = np.zeros((nVerts, nSlots), np.float32)
+    packedIdxs[verts, slots] = boneIdxs[order]
+    packedWeights[verts, slots] = weights[order]
+    return packedIdxs, packedWeights
 
 # TODO code replication is not nice...
 def loadTargetMapping(rigName, skel):
@@ -878,31 +970,28 @@ def getRestPoseCompensation(srcSkel, tgtSkel, boneMapping, excludedTgtBones = ["
     from the process (not compensated for). Usually this is done with the spine
     bones (you could consider removing "Hips" from the list, though).
     The target skeleton will be set to its rest pose.
+    Compensation only depends on the parent bones, so all bones of one level
+    of the target hierarchy are compensated at once.
     """
-    result = []
-
-    # Determine pose to place target rig in the same rest pose as src rig
-    #import animation
-    #pose = animation.emptyPose(tgtSkel.getBoneCount())
-
+    start = time.time()
     tgtSkel.setToRestPose()
 
+    nBones = tgtSkel.getBoneCount()
+    srcNames = []
+    compensated = np.zeros(nBones, dtype=bool)
+    srcGlobalOrients = np.tile(np.identity(4), (nBones,1,1))
+
     for bIdx, tgtBone in enumerate(tgtSkel.getBones()):
         boneMap = boneMapping[bIdx]
         if isinstance(boneMap, tuple):
             srcName, _ = boneMap
         else:
             srcName = boneMap
-
-        result.append( (srcName, np.mat(np.identity(4))) )
+        srcNames.append(srcName)
 
         if not srcName:
             continue
         srcBone = srcSkel.getBone(srcName)
-        srcGlobalOrient = srcBone.matRestGlobal.copy()
-        srcGlobalOrient[:3,3] = 0.0  # No translation, only rotation
-        tgtGlobalOrient = np.mat(tgtBone.matPoseGlobal.copy()) # Depends on pose compensation of parent bones
-        tgtGlobalOrient[:3,3] = 0.0
 
         if srcBone.length == 0:
             # Safeguard because this always leads to wrong pointing target bones
@@ -921,19 +1010,133 @@ def getRestPoseCompensation(srcSkel, tgtSkel, boneMapping, excludedTgtBones = ["
             continue
 
         log.message("compensating %s", tgtBone.name)
-        log.debug(str(srcGlobalOrient))
-        log.debug(str(tgtGlobalOrient))
+        srcGlobalOrients[bIdx] = srcBone.matRestGlobal
+        compensated[bIdx] = True
+    srcGlobalOrients[:,:3,3] = 0.0  # No translation, only rotation
+
+    compensation = np.tile(np.identity(4), (nBones,1,1))
+    for levelSlice in tgtSkel.getBoneLevels():
+        bIdxs = levelSlice.start + np.nonzero(compensated[levelSlice])[0]
+        if len(bIdxs) == 0:
+            continue
 
-        diff = np.mat(la.inv(tgtGlobalOrient)) * srcGlobalOrient
+        # Depends on pose compensation of parent bones
+        tgtGlobalOrients = tgtSkel.poseGlobalMats[bIdxs].astype(float)
+        tgtGlobalOrients[:,:3,3] = 0.0
+        invTgtGlobalOrients = la.inv(tgtGlobalOrients)
+
+        diff = np.einsum('nij,njk->nik', invTgtGlobalOrients, srcGlobalOrients[bIdxs])
         # Rotation only
-        diff[:3,3] = 0.0
-        diffPose = tgtGlobalOrient * diff * np.mat(la.inv(tgtGlobalOrient))
-        log.debug(str(diffPose))
+        diff[:,:3,3] = 0.0
+        diffPose = np.einsum('nij,njk,nkl->nil', tgtGlobalOrients, diff, invTgtGlobalOrients)
+        compensation[bIdxs] = diffPose
 
-        result[bIdx] = (srcName, diffPose)
+        # Set pose that orients target bones in the same orientation as the source bones in rest
+        tgtSkel.poseMats[bIdxs] = np.einsum('nij,njk,nkl->nil', tgtSkel.invRestGlobalMats[bIdxs], diffPose, tgtSkel.restGlobalMats[bIdxs])
 
-        # Set pose that orients target bone in the same orientation as the source bone in rest
-        tgtBone.matPose = np.mat(la.inv(tgtBone.matRestGlobal)) * diffPose * np.mat(tgtBone.matRestGlobal)
+        tgtSkel.update()   # Update skeleton after each level of the hierarchy
 
-        tgtSkel.update()   # Update skeleton after each modification of a bone
-    return result
+    log.debug("Rest pose compensation of %d bones took %.1f ms", np.count_nonzero(compensated), (time.time() - start) * 1000)
+    return [(srcName, np.mat(diffPose)) for srcName, diffPose in zip(srcNames, compensation)]
+
+
+class Retargeter(object):
+    """
+    Retargets the motion of the joints of a source rig, such as the joints of
+    a BVH file, onto the bones of a target skeleton.
+    The bone mapping, as returned by getRetargetMapping() or
+    getRestPoseCompensation(), is compiled once into the index of the source
+    joint and a compensation matrix for each target bone. Complete animation
+    tracks are then retargeted with batched matrix products.
+    The durations (in seconds) of the stages of the last compile and retarget
+    are kept in the timings dict.
+    """
+
+    def __init__(self, srcJointNames, boneMapping):
+        """
+        srcJointNames lists the names of the source joints, in the order in
+        which their motion is passed to retarget().
+        boneMapping contains for each target bone (in breadth-first order) the
+        name of a source joint, or a tuple of the name with a compensation
+        angle or transformation matrix, or None if the bone is not animated.
+        """
+        start = time.time()
+        self.timings = {}
+
+        jointIdxs = {}
+        for jIdx, jName in enumerate(srcJointNames):
+            jointIdxs.setdefault(canonicalSrcName(jName), jIdx)
+
+        nBones = len(boneMapping)
+        self.srcIdxs = -np.ones(nBones, dtype=np.int32)
+        self.compensation = np.tile(np.identity(4), (nBones,1,1))
+        angles = np.zeros(nBones, dtype=float)
+        for bIdx, boneMap in enumerate(boneMapping):
+            if isinstance(boneMap, tuple):
+                jName, angle = boneMap
+            else:
+                jName, angle = boneMap, 0.0
+            if not jName:
+                continue
+
+            jName = canonicalSrcName(jName)
+            if jName not in jointIdxs:
+                # Remove the tail from duplicate bone names
+                r = re.search("(.*)_\d+$", jName)
+                if r:
+                    jName = r.group(1)
+            if jName not in jointIdxs:
+                log.warning("Cannot retarget bone %d, source rig has no joint %s", bIdx, jName)
+                continue
+            self.srcIdxs[bIdx] = jointIdxs[jName]
+
+            if isinstance(angle, float):
+                angles[bIdx] = angle
+            else:   # Compensation (angle) is a transformation matrix
+                self.compensation[bIdx] = np.asarray(angle)
+
+        # Rotate around global Z axis by -angle, then roll around global Y
+        # axis by angle (this is a limitation)
+        rotated = np.nonzero(angles)[0]
+        c = np.cos(angles[rotated]*D)
+        s = np.sin(angles[rotated]*D)
+        self.compensation[rotated,:3,:3] = np.array([[c*c,  s,  c*s],
+                                                     [-s*c, c, -s*s],
+                                                     [-s,   np.zeros_like(c), c]]).transpose(2,0,1)
+
+        # Bones with identity compensation only need their source motion copied
+        identity = np.abs(self.compensation - np.identity(4)).reshape(nBones,16).max(axis=1) < 1e-6
+        self.unmappedIdxs = np.nonzero(self.srcIdxs < 0)[0]
+        self.copiedIdxs = np.nonzero((self.srcIdxs >= 0) & identity)[0]
+        self.compensatedIdxs = np.nonzero((self.srcIdxs >= 0) & ~identity)[0]
+        self.timings['compile'] = time.time() - start
+
+    def getBoneCount(self):
+        return len(self.srcIdxs)
+
+    def retarget(self, srcPoses):
+        """
+        Retarget source motion of shape (nFrames, nSrcJoints, 4, 4), with the
+        joints in the order of srcJointNames, to the target skeleton.
+        Returns target motion of shape (nFrames, nBones, 4, 4). Bones that are
+        not mapped to a source joint remain in rest pose.
+        """
+        start = time.time()
+        nFrames = len(srcPoses)
+        result = np.empty((nFrames, self.getBoneCount(), 4, 4), dtype=srcPoses.dtype)
+        result[:,self.unmappedIdxs] = np.identity(4)
+        result[:,self.copiedIdxs] = srcPoses[:,self.srcIdxs[self.copiedIdxs]]
+        gathered = time.time()
+
+        # One matrix product over all frames per compensated bone, with the
+        # frames stacked as rows of a 2D array
+        for bIdx in self.compensatedIdxs:
+            rows = srcPoses[:,self.srcIdxs[bIdx]].reshape(-1,4)
+            result[:,bIdx] = np.dot(rows, self.compensation[bIdx]).reshape(nFrames,4,4)
+        self.timings['gather'] = gathered - start
+        self.timings['transform'] = time.time() - gathered
+
+        log.debug("Retargeted %d frames to %d bones (%d compensated): compile %.1f ms, gather %.1f ms, transform %.1f ms",
+                  nFrames, len(self.copiedIdxs) + len(self.compensatedIdxs), len(self.compensatedIdxs),
+                  self.timings['compile'] * 1000, self.timings['gather'] * 1000, self.timings['transform'] * 1000)
+        return result
@@ -0,0 +1,272 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Vertex weights of bones (or other vertex groups), as used by the armature,
+the rich meshes and the exporters.
+
+The weights of each bone are a pair of arrays, the indices of its vertices and
+their weights. Operations on all bones at once (normalizing, filtering the
+vertices of a mesh, transferring weights to a proxy, writing skin data) work
+on a compiled table in compressed sparse row layout, in which the vertices and
+weights of all bones are concatenated, instead of looping over the weights of
+each vertex.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VertexWeights(object):
+    """
+    Ordered mapping of bone names to (verts, weights) pairs, of an int32 array
+    of vertex indices and a float32 array of weights.
+    Groups can be assigned as such a pair (a tuple), or as a list of
+    (vertex, weight) items, as read from vertex group files.
+
+    compile() returns all groups as one table: the list of bone names, an
+    offsets array with the range of each bone in the concatenated vertex and
+    weight arrays, and these arrays. The table is kept until the weights are
+    modified.
+    """
+
+    def __init__(self, groups = None):
+        self._groups = OrderedDict()
+        self._compiled = None
+        if isinstance(groups, VertexWeights):
+            self._groups.update(groups._groups)
+            self._compiled = groups._compiled
+        elif groups:
+            for name, group in groups.items():
+                self[name] = group
+
+    @staticmethod
+    def toArrays(group):
+        """
+        Convert a vertex group, a (verts, weights) tuple or a list of
+        (vertex, weight) items, to a (verts, weights) pair of arrays.
+        """
+        if isinstance(group, tuple):
+            verts, weights = group
+            return np.asarray(verts, dtype=np.int32), np.asarray(weights, dtype=np.float32)
+        group = np.asarray(group, dtype=np.float64).reshape(-1, 2)
+        return group[:,0].astype(np.int32), group[:,1].astype(np.float32)
+
+    @classmethod
+    def fromTable(cls, names, offsets, verts, weights):
+        """
+        Create vertex weights from a compiled table (see compile()). The
+        groups are views of the table arrays.
+        """
+        result = cls()
+        for idx, name in enumerate(names):
+            start, end = offsets[idx], offsets[idx+1]
+            result._groups[name] = (verts[start:end], weights[start:end])
+        result._compiled = (list(names), offsets, verts, weights)
+        return result
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __contains__(self, name):
+        return name in self._groups
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __getitem__(self, name):
+        return self._groups[name]
+
+    def __setitem__(self, name, group):
+        self._groups[name] = self.toArrays(group)
+        self._compiled = None
+
+    def __delitem__(self, name):
+        del self._groups[name]
+        self._compiled = None
+
+    def __repr__(self):
+        return "<VertexWeights %d groups %d weights>" % (len(self), len(self.compile()[2]))
+
+    def get(self, name, default = None):
+        return self._groups.get(name, default)
+
+    def keys(self):
+        return self._groups.keys()
+
+    def values(self):
+        return self._groups.values()
+
+    def items(self):
+        return self._groups.items()
+
+    def add(self, name, group):
+        """
+        Append the vertices and weights of group to the group with specified
+        name, which is created if it does not exist.
+        """
+        verts, weights = self.toArrays(group)
+        if name in self._groups:
+            verts0, weights0 = self._groups[name]
+            verts = np.concatenate([verts0, verts])
+            weights = np.concatenate([weights0, weights])
+        self[name] = (verts, weights)
+
+    def merge(self, name, others):
+        """
+        Merge the groups with names in others into the group with specified
+        name, and remove them. Weights of vertices that occur more than once
+        are summed, and the merged group is sorted by vertex.
+        """
+        verts = [self._groups[name][0]] + [self._groups[other][0] for other in others]
+        weights = [self._groups[name][1]] + [self._groups[other][1] for other in others]
+        verts, inverse = np.unique(np.concatenate(verts), return_inverse=True)
+        weights = np.bincount(inverse, np.concatenate(weights), minlength=len(verts))
+        for other in others:
+            del self[other]
+        self[name] = (verts, weights)
+
+    def select(self, names):
+        """
+        The groups with specified names, in the order of names. Names without
+        group get an empty group.
+        """
+        empty = (np.zeros(0, np.int32), np.zeros(0, np.float32))
+        result = VertexWeights()
+        for name in names:
+            result._groups[name] = self._groups.get(name, empty)
+        return result
+
+    def compile(self):
+        """
+        Returns the (names, offsets, verts, weights) table of all groups.
+        Entries of group i are at offsets[i]:offsets[i+1] in verts and weights.
+        """
+        if self._compiled is None:
+            names = self._groups.keys()
+            offsets = np.zeros(len(names) + 1, dtype=np.intp)
+            offsets[1:] = np.cumsum([len(verts) for verts, _ in self._groups.values()])
+            if names:
+                verts = np.concatenate([verts for verts, _ in self._groups.values()])
+                weights = np.concatenate([weights for _, weights in self._groups.values()])
+            else:
+                verts = np.zeros(0, np.int32)
+                weights = np.zeros(0, np.float32)
+            self._compiled = (names, offsets, verts, weights)
+        return self._compiled
+
+    def getGroupIndices(self):
+        """
+        The index of the group of each entry of the compiled table.
+        """
+        names, offsets, _, _ = self.compile()
+        return np.repeat(np.arange(len(names), dtype=np.int32), np.diff(offsets))
+
+    def getVertexTotals(self, nVerts):
+        """
+        The sum of the weights of each vertex, as float64 array.
+        """
+        _, _, verts, weights = self.compile()
+        return np.bincount(verts, weights, minlength=nVerts)
+
+    def getVertexView(self, nVerts):
+        """
+        The compiled table ordered by vertex: returns (counts, entries), with
+        counts the number of weights of each vertex, and entries the indices
+        of the weights of vertex 0, 1, ... in the compiled table, in group
+        order.
+        """
+        _, _, verts, _ = self.compile()
+        return np.bincount(verts, minlength=nVerts), np.argsort(verts, kind='mergesort')
+
+    def normalized(self, nVerts, threshold = 0.0):
+        """
+        Weights scaled so that the weights of each vertex sum to 1. The
+        weights of vertices with a total weight not above threshold become 0.
+        """
+        names, offsets, verts, weights = self.compile()
+        totals = self.getVertexTotals(nVerts)
+        factors = np.zeros(nVerts, dtype=np.float64)
+        valid = totals > threshold
+        factors[valid] = 1.0 / totals[valid]
+        return VertexWeights.fromTable(names, offsets, verts, (weights * factors[verts]).astype(np.float32))
+
+    def remapped(self, vertexMap):
+        """
+        Weights with their vertex indices replaced by vertexMap[index].
+        Entries of vertices mapped to a negative index are removed.
+        """
+        names, offsets, verts, weights = self.compile()
+        verts = vertexMap[verts]
+        keep = verts >= 0
+        counts = np.bincount(self.getGroupIndices()[keep], minlength=len(names))
+        newOffsets = np.zeros(len(names) + 1, dtype=np.intp)
+        newOffsets[1:] = np.cumsum(counts)
+        return VertexWeights.fromTable(names, newOffsets, verts[keep].astype(np.int32), weights[keep])
+
+    def transferred(self, refVerts, refWeights, threshold = 1e-4):
+        """
+        Weights of a mesh bound to the vertices of this one, such as a proxy,
+        where vertex i of that mesh has reference vertices refVerts[i] with
+        weights refWeights[i].
+        Each weight of a reference vertex contributes to its bound vertices
+        in proportion to their reference weight. Contributions and summed
+        weights not above threshold are dropped, as are groups without any
+        contribution above threshold.
+        """
+        refVerts = np.asarray(refVerts)
+        nPerVert = refVerts.shape[1]
+        refV = refVerts.ravel()
+        refPV = np.repeat(np.arange(len(refVerts)), nPerVert)
+        refW = np.asarray(refWeights, dtype=np.float64).ravel()
+        valid = refW != 0
+        order = np.argsort(refV[valid], kind='mergesort')
+        refV = refV[valid][order]
+        refPV = refPV[valid][order]
+        refW = refW[valid][order]
+
+        # Join each weight with the bindings of its vertex
+        names, _, verts, weights = self.compile()
+        start = np.searchsorted(refV, verts, 'left')
+        count = np.searchsorted(refV, verts, 'right') - start
+        entry = np.repeat(np.arange(len(verts)), count)
+        ref = np.arange(count.sum()) + np.repeat(start - np.cumsum(count) + count, count)
+        groups = self.getGroupIndices()[entry]
+        pverts = refPV[ref]
+        pweights = weights[entry] * refW[ref]
+
+        keep = pweights > threshold
+        groups = groups[keep]
+        pverts = pverts[keep]
+        pweights = pweights[keep]
+
+        # Sum the contributions per group and bound vertex
+        keys, inverse = np.unique(groups.astype(np.int64) * len(refVerts) + pverts, return_inverse=True)
+        sums = np.bincount(inverse, pweights, minlength=len(keys))
+        used = np.bincount(groups, minlength=len(names)) > 0
+        keep = sums > threshold
+        keys = keys[keep]
+        groups = keys // len(refVerts)
+        counts = np.bincount(groups, minlength=len(names))[used]
+        offsets = np.zeros(used.sum() + 1, dtype=np.intp)
+        offsets[1:] = np.cumsum(counts)
+        return VertexWeights.fromTable([name for name, u in zip(names, used) if u], offsets,
+                                       (keys % len(refVerts)).astype(np.int32), sums[keep].astype(np.float32))
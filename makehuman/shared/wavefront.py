@@ -26,7 +26,6 @@ Abstract
 import os
 import module3d
 import codecs
-import math
 import numpy as np
 
 def loadObjFile(path, obj = None):
@@ -134,6 +133,8 @@ def loadObjFile(path, obj = None):
 
 
 def writeObjFile(path, objects, writeMTL = True, config = None):
+    from exportutils.arraytext import writeRows
+
     if not isinstance(objects, list):
         objects = [objects]
 
@@ -156,19 +157,20 @@ def writeObjFile(path, objects, writeMTL = True, config = None):
     else:
         offs = np.array((0,0,0))
     for obj in objects:
-        fp.write("".join( ["v %.4f %.4f %.4f\n" % tuple(co-offs) for co in obj.coord] ))
+        writeRows(fp, "v %.4f %.4f %.4f\n", obj.coord - offs)
 
     # Vertex normals
     if config == None or config.useNormals:
         for obj in objects:
             obj.calcFaceNormals()
             #obj.calcVertexNormals()
-            fp.write("".join( ["vn %.4f %.4f %.4f\n" % tuple(no/math.sqrt(no.dot(no))) for no in obj.fnorm] ))
+            fnorm = obj.fnorm
+            writeRows(fp, "vn %.4f %.4f %.4f\n", fnorm / np.sqrt((fnorm * fnorm).sum(axis=1))[:,None])
 
     # UV vertices
     for obj in objects:
         if obj.has_uv:
-            fp.write("".join( ["vt %.4f %.4f\n" % tuple(uv) for uv in obj.texco] ))
+            writeRows(fp, "vt %.4f %.4f\n", obj.texco)
 
     # Faces
     nVerts = 1
@@ -177,26 +179,24 @@ def writeObjFile(path, objects, writeMTL = True, config = None):
         fp.write("usemtl %s\n" % obj.material.name)
         fp.write("g %s\n" % obj.name)
 
+        # Columns of the face table, interleaved per face corner
+        columns = [obj.fvert + nVerts]
+        if obj.has_uv:
+            columns.append(obj.fuvs + nTexVerts)
+        if config == None or config.useNormals:
+            columns.append(np.repeat(np.arange(len(obj.fvert))[:,None], 4, axis=1))
         if config == None or config.useNormals:
             if obj.has_uv:
-                for fn,fv in enumerate(obj.fvert):
-                    fuv = obj.fuvs[fn]
-                    line = [" %d/%d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts, fn) for n in range(4)]
-                    fp.write("f" + "".join(line) + "\n")
+                corner = " %d/%d/%d"
             else:
-                for fn,fv in enumerate(obj.fvert):
-                    line = [" %d//%d" % (fv[n]+nVerts, fn) for n in range(4)]
-                    fp.write("f" + "".join(line) + "\n")
+                corner = " %d//%d"
         else:
             if obj.has_uv:
-                for fn,fv in enumerate(obj.fvert):
-                    fuv = obj.fuvs[fn]
-                    line = [" %d/%d" % (fv[n]+nVerts, fuv[n]+nTexVerts) for n in range(4)]
-                    fp.write("f" + "".join(line) + "\n")
+                corner = " %d/%d"
             else:
-                for fv in obj.fvert:
-                    line = [" %d" % (fv[n]+nVerts) for n in range(4)]
-                    fp.write("f" + "".join(line) + "\n")
+                corner = " %d"
+        faces = np.dstack(columns).reshape(len(obj.fvert), -1)
+        writeRows(fp, "f" + 4*corner + "\n", faces)
 
         nVerts += len(obj.coord)
         nTexVerts += len(obj.texco)
@@ -0,0 +1,80 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+BVH tests
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Tests of loading and writing BVH files, that run without GUI. Run from the
+makehuman folder:
+
+    python -m unittest testsuite.test_bvh
+"""
+
+import sys
+import os
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import bvh
+
+
+def readMotionText(filepath):
+    """
+    The motion values of a BVH file, as written in the file, one row per frame.
+    """
+    with open(filepath, 'rU') as fp:
+        lines = fp.read().split('MOTION', 1)[1].strip().splitlines()
+    return np.array([[float(value) for value in line.split()] for line in lines[2:] if line.strip()])
+
+
+class BVHTest(unittest.TestCase):
+
+    filenames = ['data/bvhs/02_02.bvh', 'data/bvhs/03_03.bvh']
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def getMotion(self, anim):
+        joints = [joint for joint in anim.getJointsBVHOrder() if not joint.isEndConnector()]
+        return np.hstack([np.asarray(joint.frames).reshape((anim.frameCount, -1)) for joint in joints])
+
+    def testRoundTrip(self):
+        # Loading and writing a file keeps the values as written in the file
+        for filename in self.filenames:
+            expected = readMotionText(filename)
+            anim = bvh.load(filename)
+            self.assertEqual(anim.frameCount, len(expected))
+            self.assertTrue(np.array_equal(self.getMotion(anim), expected))
+
+            path = os.path.join(self.folder, os.path.basename(filename))
+            anim.writeToFile(path)
+            self.assertTrue(np.array_equal(readMotionText(path), expected))
+            self.assertTrue(np.array_equal(self.getMotion(bvh.load(path)), expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Measurement tests
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Tests of solving for measurement modifier values on a human without GUI.
+Run from the makehuman folder:
+
+    python -m unittest testsuite.test_measure
+"""
+
+import sys
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+
+import unittest
+
+import headless
+import measure
+
+
+class MeasurementSolverTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = headless.Engine(True)
+        cls.ruler = measure.Ruler()
+
+    def setUp(self):
+        self.human = self.engine.human
+        for name in ['waist', 'hips', 'bust']:
+            self.engine.getMeasureModifier(name).setValue(0.0)
+        self.human.applyAllTargets()
+        self.measures = self.ruler.getMeasures(self.human, 'metric')
+
+    def getSolver(self, names):
+        return measure.MeasurementSolver(self.human, [self.engine.getMeasureModifier(name) for name in names], self.ruler)
+
+    def testSolve(self):
+        tolerance = 0.05
+        goals = {'waist': self.measures['waist'] + 5.0, 'hips': self.measures['hips'] - 4.0}
+        solver = self.getSolver(['waist', 'hips'])
+        values = solver.solve(goals, tolerance = tolerance)
+        self.assertEqual(sorted(values.keys()), sorted([m.fullName for m in solver.modifiers]))
+
+        # Solving does not change the human, applying does
+        self.assertEqual(self.ruler.getMeasures(self.human, 'metric'), self.measures)
+        solver.apply(values)
+        measures = self.ruler.getMeasures(self.human, 'metric')
+        for name, goal in goals.items():
+            self.assertTrue(abs(measures[name] - goal) < tolerance, (name, measures[name], goal))
+
+    def testInfeasible(self):
+        # Goals beyond the range of the modifier end at its bounds
+        solver = self.getSolver(['bust'])
+        modifier = solver.modifiers[0]
+        for goal, bound in [(self.measures['bust'] * 3, 1.0), (self.measures['bust'] / 3, -1.0)]:
+            values = solver.solve({'bust': goal})
+            self.assertEqual(values[modifier.fullName], bound)
+            solver.apply(values)
+            self.assertEqual(modifier.getValue(), bound)
+            bust = self.ruler.getMeasures(self.human, 'metric')['bust']
+            self.assertTrue(abs(bust - goal) < abs(self.measures['bust'] - goal))
+
+            modifier.setValue(0.0)
+            self.human.applyAllTargets()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Picking tests
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Tests of the face BVH used for picking against intersecting the rays with
+all faces, that run without GUI. Run from the makehuman folder:
+
+    python -m unittest testsuite.test_picking
+"""
+
+import sys
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+
+import unittest
+import numpy as np
+
+import module3d
+import picking
+
+
+def createTerrain(size, rand):
+    """
+    A mesh of size x size quads with random heights.
+    """
+    obj = module3d.Object3D('terrain')
+    n = size + 1
+    x, y = np.mgrid[0:n,0:n]
+    z = rand.uniform(0, 2, (n, n))
+    obj.setCoords(np.column_stack((x.ravel(), y.ravel(), z.ravel())).astype(np.float32))
+    obj.setUVs(np.column_stack((x.ravel(), y.ravel())).astype(np.float32) / size)
+    corners = (x[:-1,:-1] * n + y[:-1,:-1]).ravel()
+    fverts = np.column_stack((corners, corners + n, corners + n + 1, corners + 1))
+    obj.setFaces(fverts, fverts)
+    return obj
+
+def cross(a, b):
+    return (a[1]*b[2] - a[2]*b[1], a[2]*b[0] - a[0]*b[2], a[0]*b[1] - a[1]*b[0])
+
+def dot(a, b):
+    return a[0]*b[0] + a[1]*b[1] + a[2]*b[2]
+
+def sub(a, b):
+    return (a[0] - b[0], a[1] - b[1], a[2] - b[2])
+
+def intersectTriangle(origin, direction, v0, v1, v2, eps = 1e-12):
+    """
+    Moller-Trumbore intersection of a ray with one triangle. Returns the
+    distance along the ray, or None.
+    """
+    edge1 = sub(v1, v0)
+    edge2 = sub(v2, v0)
+    pvec = cross(direction, edge2)
+    det = dot(edge1, pvec)
+    if abs(det) <= eps:
+        return None
+    tvec = sub(origin, v0)
+    u = dot(tvec, pvec) / det
+    if u < 0 or u > 1:
+        return None
+    qvec = cross(tvec, edge1)
+    v = dot(direction, qvec) / det
+    if v < 0 or u + v > 1:
+        return None
+    t = dot(edge2, qvec) / det
+    if t < 0:
+        return None
+    return t
+
+def intersectAllFaces(obj, origin, direction):
+    """
+    Nearest hit of a ray on the quads of obj, testing every face, as
+    (face index, distance).
+    """
+    coord = obj.coord.astype(np.float64).tolist()
+    origin = origin.tolist()
+    direction = direction.tolist()
+    nearest = None
+    for face, fverts in enumerate(obj.fvert.tolist()):
+        for i0, i1, i2 in [(0, 1, 2), (0, 2, 3)]:
+            t = intersectTriangle(origin, direction, coord[fverts[i0]], coord[fverts[i1]], coord[fverts[i2]])
+            if t is not None and (nearest is None or t < nearest[1]):
+                nearest = (face, t)
+    return nearest
+
+
+class FaceBVHTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rand = np.random.RandomState(3)
+        self.size = 24
+        self.obj = createTerrain(self.size, self.rand)
+
+    def createRays(self, count):
+        """
+        Rays from above the terrain, downwards at various angles. Some of them
+        miss the terrain.
+        """
+        origins = np.column_stack((self.rand.uniform(-2, self.size + 2, (count, 2)), 5 * np.ones(count)))
+        directions = np.column_stack((self.rand.uniform(-1, 1, (count, 2)), -np.ones(count)))
+        return zip(origins, directions)
+
+    def assertSameHits(self, bvh, rays):
+        nHits = 0
+        for origin, direction in rays:
+            expected = intersectAllFaces(self.obj, origin, direction)
+            hit = bvh.intersect(origin, direction)
+            if expected is None:
+                self.assertTrue(hit is None)
+                continue
+            nHits += 1
+            self.assertFalse(hit is None)
+            face, t, point = hit
+            self.assertEqual(face, expected[0])
+            self.assertAlmostEqual(t, expected[1], places=5)
+            self.assertTrue(np.allclose(point, origin + expected[1] * direction, atol=1e-5))
+        # Most rays hit the terrain, some do not
+        self.assertTrue(len(rays) / 2 < nHits < len(rays))
+
+    def testIntersect(self):
+        bvh = self.obj.getFaceBVH()
+        self.assertTrue(self.obj.getFaceBVH() is bvh)
+        self.assertTrue(bvh.isLeaf.sum() > 1)
+        self.assertSameHits(bvh, self.createRays(40))
+
+    def testRefit(self):
+        bvh = self.obj.getFaceBVH()
+        rays = self.createRays(40)
+        self.assertSameHits(bvh, rays)
+
+        # Raise part of the terrain, only the boxes of its faces are refitted
+        verts = np.flatnonzero((self.obj.coord[:,0] < 8) & (self.obj.coord[:,1] > 12))
+        coords = self.obj.coord[verts].copy()
+        coords[:,2] += self.rand.uniform(1, 3, len(verts))
+        self.obj.changeCoords(coords, verts)
+        self.assertTrue(self.obj.getFaceBVH() is bvh)
+        nodeMin = bvh.nodeMin.copy()
+        bvh.refit()
+        changed = np.any(bvh.nodeMin != nodeMin, axis=1)
+        self.assertTrue(0 < changed.sum() < len(changed))
+        self.assertSameHits(bvh, rays + self.createRays(40))
+
+        # The boxes of the leaves are those of their faces
+        coords = self.obj.coord[self.obj.fvert]
+        self.assertTrue(np.array_equal(bvh.faceMin, coords.min(axis=1)))
+        self.assertTrue(np.array_equal(bvh.faceMax, coords.max(axis=1)))
+        leafMin = np.zeros_like(bvh.nodeMin)
+        leafMax = np.zeros_like(bvh.nodeMax)
+        for node in np.flatnonzero(bvh.isLeaf):
+            faces = bvh.faceOrder[bvh.leafStart[node]:bvh.leafStart[node]+bvh.leafCount[node]]
+            leafMin[node] = bvh.faceMin[faces].min(axis=0)
+            leafMax[node] = bvh.faceMax[faces].max(axis=0)
+        self.assertTrue(np.array_equal(bvh.nodeMin[bvh.isLeaf], leafMin[bvh.isLeaf]))
+        self.assertTrue(np.array_equal(bvh.nodeMax[bvh.isLeaf], leafMax[bvh.isLeaf]))
+
+        # Rebuilding the BVH gives the same hits
+        self.assertSameHits(picking.FaceBVH(self.obj), rays)
+
+
+if __name__ == '__main__':
+    unittest.main()
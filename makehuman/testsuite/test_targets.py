@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Target tests
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Tests of loading and applying targets and of the target buffer, that run
+without GUI. Run from the makehuman folder:
+
+    python -m unittest testsuite.test_targets
+"""
+
+import sys
+import os
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import module3d
+import algos3d
+
+
+def createGrid(size = 3):
+    """
+    A flat mesh of size x size quads.
+    """
+    obj = module3d.Object3D('grid')
+    n = size + 1
+    x, y = np.mgrid[0:n,0:n]
+    obj.setCoords(np.column_stack((x.ravel(), y.ravel(), np.zeros(n*n))).astype(np.float32))
+    obj.setUVs(np.column_stack((x.ravel(), y.ravel())).astype(np.float32) / size)
+    corners = (x[:-1,:-1] * n + y[:-1,:-1]).ravel()
+    fverts = np.column_stack((corners, corners + n, corners + n + 1, corners + 1))
+    obj.setFaces(fverts, fverts)
+    return obj
+
+
+class TargetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = createGrid()
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, 'test.target')
+        with open(self.path, 'w') as fp:
+            fp.write('0 0.0 0.0 1.0\n5 0.0 0.5 0.0\n')
+
+    def tearDown(self):
+        path = algos3d.canonicalPath(self.path)
+        if path in algos3d._targetBuffer:
+            del algos3d._targetBuffer[path]
+        shutil.rmtree(self.folder)
+
+    def testApplyWithoutNormals(self):
+        # Loading without recalculating normals does not compute the faces
+        algos3d.loadTranslationTarget(self.obj, self.path, 1.0, None, 0, 0)
+        target = algos3d.getTarget(self.obj, self.path)
+        self.assertTrue(target._faces is None)
+        self.assertTrue(np.allclose(self.obj.coord[0], [0, 0, 1]))
+
+        algos3d.loadTranslationTarget(self.obj, self.path, 0.0, None, 1, 0)
+        self.assertTrue(target._faces is None)
+
+    def testApplyWithNormals(self):
+        algos3d.loadTranslationTarget(self.obj, self.path, 1.0, None, 0, 1)
+        target = algos3d.getTarget(self.obj, self.path)
+        self.assertEqual(sorted(target._faces), [0, 1, 3, 4])
+
+    def testBuffer(self):
+        path = algos3d.canonicalPath(self.path)
+        count = len(algos3d._targetBuffer)
+        target = algos3d.getTarget(self.obj, self.path)
+        self.assertEqual(len(algos3d._targetBuffer), count + 1)
+        self.assertTrue(algos3d._targetBuffer)
+        self.assertTrue(path in algos3d._targetBuffer)
+        self.assertTrue(algos3d._targetBuffer[path] is target)
+
+    def testBufferCountsFaces(self):
+        # Faces computed after the target is buffered are added to its size
+        target = algos3d.getTarget(self.obj, self.path)
+        before = algos3d.getTargetBufferStats()['bytes']
+        target.faces
+        after = algos3d.getTargetBufferStats()['bytes']
+        self.assertEqual(after - before, target._faces.nbytes)
+
+    def testBufferCountsSharedFaces(self):
+        # Targets with the same vertices share their faces, which are counted
+        # once, for as long as any of these targets is buffered
+        otherPath = os.path.join(self.folder, 'other.target')
+        with open(otherPath, 'w') as fp:
+            fp.write('0 1.0 0.0 0.0\n5 0.0 0.0 0.5\n')
+        paths = [algos3d.canonicalPath(path) for path in (self.path, otherPath)]
+        targets = [algos3d.getTarget(self.obj, path) for path in paths]
+        before = algos3d.getTargetBufferStats()['bytes']
+        targets[0].faces
+        targets[1].faces
+        self.assertTrue(targets[0]._faces is targets[1]._faces)
+        facesSize = targets[0]._faces.nbytes
+        self.assertEqual(algos3d.getTargetBufferStats()['bytes'] - before, facesSize)
+
+        targetSize = algos3d.TargetBuffer.getTargetBytes(targets[1])
+        del algos3d._targetBuffer[paths[1]]
+        self.assertEqual(algos3d.getTargetBufferStats()['bytes'] - before, facesSize - targetSize)
+        del algos3d._targetBuffer[paths[0]]
+        self.assertEqual(algos3d.getTargetBufferStats()['bytes'] - before, -2 * targetSize)
+
+
+class TargetMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.obj = createGrid()
+        self.folder = tempfile.mkdtemp()
+        self.paths = []
+        for n, vert in enumerate([0, 5, 10]):
+            path = algos3d.canonicalPath(os.path.join(self.folder, 'test%d.target' % n))
+            with open(path, 'w') as fp:
+                fp.write('%d 0.0 0.0 1.0\n%d 1.0 0.0 0.0\n' % (vert, vert + 1))
+            self.paths.append(path)
+
+    def tearDown(self):
+        algos3d.setTargetBufferBudget(0)
+        for path in self.paths:
+            if path in algos3d._targetBuffer:
+                del algos3d._targetBuffer[path]
+        shutil.rmtree(self.folder)
+
+    def testMorph(self):
+        matrix = algos3d.TargetMatrix(self.obj)
+        morph = matrix.getMorph({self.paths[0]: 1.0, self.paths[2]: 0.5})
+        self.assertTrue(np.allclose(morph[[0, 1, 10, 11]], [[0, 0, 1], [1, 0, 0], [0, 0, 0.5], [0.5, 0, 0]]))
+        self.assertEqual(np.abs(morph).sum(), 3.0)
+
+    def testEvictedTargets(self):
+        # Targets evicted from the buffer are dropped from the matrix, and
+        # loaded again when needed
+        matrix = algos3d.TargetMatrix(self.obj)
+        weights = dict((path, 1.0) for path in self.paths)
+        expected = matrix.getMorph(weights)
+        self.assertEqual(len(matrix.rows), 6)
+
+        # The budget evicts all but the last used target, loading the first
+        # one again evicts that one, which is dropped from the matrix when it
+        # is next used
+        for path in self.paths:
+            algos3d.getTarget(self.obj, path)
+        algos3d.setTargetBufferBudget(1)
+        matrix.getMorph({self.paths[0]: 1.0})
+        self.assertEqual(len(matrix), 2)
+        matrix.getMorph({self.paths[0]: 1.0})
+        self.assertEqual(len(matrix), 1)
+        self.assertEqual(len(matrix.rows), 2)
+
+        self.assertTrue(np.allclose(matrix.getMorph(weights), expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Vertex weights tests
+
+**Project Name:**      MakeHuman
+
+**Product Home Page:** http://www.makehuman.org/
+
+**Code Home Page:**    http://code.google.com/p/makehuman/
+
+**Authors:**           MakeHuman Team
+
+**Copyright(c):**      MakeHuman Team 2001-2014
+
+**Licensing:**         AGPL3 (see also http://www.makehuman.org/node/318)
+
+**Coding Standards:**  See http://www.makehuman.org/node/165
+
+Abstract
+--------
+
+Tests of the vertex weights operations against the dictionaries of
+(vertex, weight) lists they replace. Run from the makehuman folder:
+
+    python -m unittest testsuite.test_vertexweights
+"""
+
+import sys
+sys.path = ["./", "./core", "./lib", "./apps", "./shared"] + sys.path
+
+import unittest
+from collections import OrderedDict
+import numpy as np
+
+from vertexweights import VertexWeights
+
+
+NVERTS = 20
+
+def createGroups():
+    """
+    Groups as lists of (vertex, weight) items. Vertices 16 to 19 are not
+    weighted, vertex 15 has a total weight below 0.1.
+    """
+    rand = np.random.RandomState(42)
+    groups = OrderedDict()
+    for name in ['root', 'spine', 'neck', 'head', 'arm']:
+        verts = np.sort(rand.choice(15, rand.randint(3, 10), replace=False))
+        weights = rand.uniform(0.1, 1.0, len(verts)).astype(np.float32)
+        groups[name] = zip(verts.tolist(), weights.tolist())
+    groups['arm'].append((15, 0.05))
+    return groups
+
+def toDict(groups):
+    """
+    Groups of (vertex, weight) lists or (verts, weights) arrays as a dict of
+    {vertex: weight} dicts.
+    """
+    result = OrderedDict()
+    for name, group in groups.items():
+        if isinstance(group, tuple):
+            group = zip(np.asarray(group[0]).tolist(), np.asarray(group[1]).tolist())
+        result[name] = dict(group)
+    return result
+
+
+# Reference implementations on dictionaries of (vertex, weight) lists
+
+def normalizeWeights(groups, nVerts, threshold):
+    sums = np.zeros(nVerts, float)
+    for group in groups.values():
+        for vn,w in group:
+            sums[vn] += w
+
+    factors = np.zeros(nVerts, float)
+    for vn in range(nVerts):
+        if sums[vn] > threshold:
+            factors[vn] = 1.0/sums[vn]
+
+    normWeights = OrderedDict()
+    for gname,group in groups.items():
+        normGroup = normWeights[gname] = []
+        for vn,w in group:
+            normGroup.append((vn,w*factors[vn]))
+    return normWeights
+
+def filterWeights(groups, keepVerts):
+    newVerts = np.cumsum(keepVerts) - 1
+    weights = OrderedDict()
+    for (b, wts1) in groups.items():
+        weights[b] = [(newVerts[v1], w) for v1,w in wts1 if keepVerts[v1]]
+    return weights
+
+def mergeWeights(vgroup):
+    merged = OrderedDict()
+    for vn,w in sorted(vgroup):
+        merged[vn] = merged.get(vn, 0) + w
+    return merged.items()
+
+def transferWeights(groups, refVerts, refWeights):
+    vertWeights = {}
+    for pv in range(len(refVerts)):
+        for v, w in zip(refVerts[pv], refWeights[pv]):
+            if w:
+                vertWeights.setdefault(v, []).append((pv, w))
+
+    weights = OrderedDict()
+    for key in groups.keys():
+        vgroup = []
+        for (v,wt) in groups[key]:
+            for (pv, w) in vertWeights.get(v, []):
+                pw = w*wt
+                if (pw > 1e-4):
+                    vgroup.append((pv, pw))
+        if vgroup:
+            weights[key] = [(pv, w) for pv,w in mergeWeights(vgroup) if w > 1e-4]
+    return weights
+
+
+class VertexWeightsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.groups = createGroups()
+        self.weights = VertexWeights(self.groups)
+
+    def assertWeightsEqual(self, weights, expected):
+        weights = toDict(weights)
+        expected = toDict(expected)
+        self.assertEqual(weights.keys(), expected.keys())
+        for name in expected:
+            self.assertEqual(sorted(weights[name].keys()), sorted(expected[name].keys()))
+            for vn, w in expected[name].items():
+                self.assertAlmostEqual(weights[name][vn], w, places=6)
+
+    def testGroups(self):
+        self.assertWeightsEqual(self.weights, self.groups)
+        names, offsets, verts, weights = self.weights.compile()
+        self.assertEqual(names, self.groups.keys())
+        self.assertEqual(offsets[-1], sum([len(group) for group in self.groups.values()]))
+        self.assertEqual(verts.dtype, np.int32)
+        self.assertEqual(weights.dtype, np.float32)
+
+    def testNormalized(self):
+        for threshold in [0.0, 0.1]:
+            normalized = self.weights.normalized(NVERTS, threshold)
+            self.assertWeightsEqual(normalized, normalizeWeights(self.groups, NVERTS, threshold))
+            self.assertTrue(np.all(np.isfinite(normalized.compile()[3])))
+
+        # Vertices with a total weight below threshold, and unweighted
+        # vertices, end up with a total of 0
+        before = self.weights.getVertexTotals(NVERTS)
+        totals = self.weights.normalized(NVERTS, 0.1).getVertexTotals(NVERTS)
+        self.assertTrue(np.allclose(totals[before > 0.1], 1))
+        self.assertTrue(np.all(totals[before <= 0.1] == 0))
+        self.assertTrue(np.all(before[16:] == 0))
+        self.assertTrue(0 < before[15] <= 0.1)
+
+    def testRemapped(self):
+        keepVerts = np.ones(NVERTS, bool)
+        keepVerts[[0, 3, 4, 10, 17]] = False
+        vertexMap = np.where(keepVerts, np.cumsum(keepVerts) - 1, -1)
+        remapped = self.weights.remapped(vertexMap)
+        self.assertWeightsEqual(remapped, filterWeights(self.groups, keepVerts))
+        self.assertEqual(remapped.keys(), self.weights.keys())
+
+        # Groups of removed vertices only are kept, empty
+        remapped = self.weights.remapped(-np.ones(NVERTS, np.int32))
+        self.assertEqual(remapped.keys(), self.weights.keys())
+        self.assertEqual(len(remapped.compile()[2]), 0)
+
+    def testMerge(self):
+        self.weights.add('neck', [(0, 0.25), (1, 0.5)])
+        self.groups['neck'] = self.groups['neck'] + [(0, 0.25), (1, 0.5)]
+        self.assertWeightsEqual(self.weights, self.groups)
+
+        self.weights.merge('spine', ['neck', 'head'])
+        verts = self.weights['spine'][0]
+        self.assertTrue(np.all(np.diff(verts) > 0))
+        expected = OrderedDict(self.groups)
+        expected['spine'] = mergeWeights(self.groups['spine'] + self.groups['neck'] + self.groups['head'])
+        del expected['neck']
+        del expected['head']
+        self.assertWeightsEqual(self.weights, expected)
+
+    def testVertexView(self):
+        counts, entries = self.weights.getVertexView(NVERTS)
+        names, offsets, verts, weights = self.weights.compile()
+        groupIdxs = self.weights.getGroupIndices()
+        self.assertEqual(len(counts), NVERTS)
+
+        start = 0
+        for vn in range(NVERTS):
+            expected = [(name, w) for name, group in self.groups.items() for v, w in group if v == vn]
+            vertEntries = entries[start:start+counts[vn]]
+            self.assertTrue(np.all(verts[vertEntries] == vn))
+            self.assertEqual([names[g] for g in groupIdxs[vertEntries]], [name for name, _ in expected])
+            self.assertTrue(np.allclose(weights[vertEntries], [w for _, w in expected]))
+            start += counts[vn]
+        self.assertTrue(np.all(counts[16:] == 0))
+
+    def testTransferred(self):
+        rand = np.random.RandomState(7)
+        nProxyVerts = 12
+        refVerts = rand.randint(0, NVERTS, (nProxyVerts, 3))
+        refWeights = rand.uniform(0, 1, (nProxyVerts, 3))
+        refWeights[:,2] = 0
+        refWeights[0] = [1e-5, 0, 0]
+        refWeights /= np.maximum(refWeights.sum(axis=1), 1e-3)[:,None]
+
+        # A group with contributions below threshold only is dropped
+        self.groups['tiny'] = [(refVerts[0,0], 1e-4)]
+        self.weights = VertexWeights(self.groups)
+
+        transferred = self.weights.transferred(refVerts, refWeights)
+        expected = transferWeights(self.groups, refVerts.tolist(), refWeights.tolist())
+        self.assertTrue('tiny' not in transferred)
+        self.assertWeightsEqual(transferred, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()